@@ -0,0 +1,109 @@
+"""Pairwise SKU × SKU average price index (API) matrix.
+
+API(A, B) = PPW(A) / PPW(B). The full matrix grows with the square of the
+SKU count, so it is produced in row blocks of bounded size and can be
+streamed straight to CSV instead of being held in memory.
+"""
+import io
+
+import numpy as np
+import pandas as pd
+
+
+DEFAULT_BLOCK_ROWS = 1024
+# Largest matrix built in memory (as a frame or as CSV bytes); bigger ones
+# go to a file with write_api_matrix_csv(target=...)
+MAX_CELLS = 2_000_000
+
+
+def select_skus(full_df, classifications=None, tiers=None, is_competitor=None, brands=None):
+    """SKU / PPW / segment columns for the SKUs matching every filter given."""
+    mask = np.ones(len(full_df), dtype=bool)
+    if classifications:
+        mask &= full_df["Classification"].isin(list(classifications)).to_numpy()
+    if tiers:
+        mask &= full_df["Calculated Price Tier"].isin(list(tiers)).to_numpy()
+    if is_competitor is not None:
+        mask &= (full_df["Is Competitor"] == is_competitor).to_numpy()
+    if brands:
+        mask &= full_df["Parent Brand"].isin(list(brands)).to_numpy()
+    cols = ["SKU", "Price per Wash", "Parent Brand", "Classification", "Calculated Price Tier", "Is Competitor"]
+    return full_df.loc[mask, cols].reset_index(drop=True)
+
+
+def _ratio(row_ppw, col_ppw):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        block = row_ppw[:, None] / col_ppw[None, :]
+    block[:, col_ppw == 0] = np.nan
+    return block
+
+
+def iter_api_blocks(rows_df, cols_df, block_rows=DEFAULT_BLOCK_ROWS):
+    """Wide API blocks: index = row SKUs, columns = column SKUs."""
+    col_ppw = cols_df["Price per Wash"].to_numpy(dtype="float64")
+    col_skus = cols_df["SKU"].to_numpy()
+    row_ppw = rows_df["Price per Wash"].to_numpy(dtype="float64")
+    row_skus = rows_df["SKU"].to_numpy()
+    for start in range(0, len(rows_df), block_rows):
+        stop = start + block_rows
+        yield pd.DataFrame(_ratio(row_ppw[start:stop], col_ppw), index=row_skus[start:stop], columns=col_skus)
+
+
+def _check_size(rows_df, cols_df, max_cells, instead):
+    if len(rows_df) * len(cols_df) > max_cells:
+        raise ValueError(
+            f"{len(rows_df):,} × {len(cols_df):,} API matrix is too large to build at once; "
+            f"narrow the filters or {instead}"
+        )
+
+
+def api_matrix(rows_df, cols_df, max_cells=MAX_CELLS):
+    """The whole matrix as one frame, refusing sizes that would not fit comfortably."""
+    _check_size(rows_df, cols_df, max_cells, "use write_api_matrix_csv")
+    return pd.concat(list(iter_api_blocks(rows_df, cols_df)) or [pd.DataFrame()])
+
+
+def iter_api_pairs(rows_df, cols_df, cross_brand_only=True, block_rows=DEFAULT_BLOCK_ROWS):
+    """Long-format blocks (SKU A, SKU B, PPWs, API), optionally only across brands."""
+    col_ppw = cols_df["Price per Wash"].to_numpy(dtype="float64")
+    col_brand = cols_df["Parent Brand"].to_numpy()
+    col_skus = cols_df["SKU"].to_numpy()
+    for start in range(0, len(rows_df), block_rows):
+        rows = rows_df.iloc[start:start + block_rows]
+        row_ppw = rows["Price per Wash"].to_numpy(dtype="float64")
+        block = _ratio(row_ppw, col_ppw)
+        keep = rows["SKU"].to_numpy()[:, None] != col_skus[None, :]
+        if cross_brand_only:
+            keep &= rows["Parent Brand"].to_numpy()[:, None] != col_brand[None, :]
+        r, c = np.nonzero(keep)
+        yield pd.DataFrame({
+            "SKU A": rows["SKU"].to_numpy()[r],
+            "Brand A": rows["Parent Brand"].to_numpy()[r],
+            "PPW A": row_ppw[r],
+            "SKU B": col_skus[c],
+            "Brand B": col_brand[c],
+            "PPW B": col_ppw[c],
+            "API (A / B)": block[r, c],
+        })
+
+
+def write_api_matrix_csv(rows_df, cols_df, target=None, long=False, cross_brand_only=True,
+                         block_rows=DEFAULT_BLOCK_ROWS, max_cells=MAX_CELLS):
+    """Stream the matrix to ``target`` (path or text file) block by block.
+
+    With no target the CSV is returned as bytes, for download buttons; like
+    api_matrix this refuses matrices over ``max_cells``.
+    """
+    if target is None:
+        _check_size(rows_df, cols_df, max_cells, "write it to a file")
+    buffer = io.StringIO() if target is None else None
+    handle = buffer if buffer is not None else (open(target, "w", newline="") if isinstance(target, str) else target)
+    try:
+        blocks = (iter_api_pairs(rows_df, cols_df, cross_brand_only, block_rows) if long
+                  else iter_api_blocks(rows_df, cols_df, block_rows))
+        for i, block in enumerate(blocks):
+            block.to_csv(handle, header=(i == 0), index=not long, float_format="%.4f")
+    finally:
+        if isinstance(target, str):
+            handle.close()
+    return buffer.getvalue().encode() if buffer is not None else None
@@ -1,7 +1,20 @@
 import streamlit as st
 import pandas as pd
 import io
-import matplotlib.pyplot as plt
+import numpy as np
+
+import api_matrix
+import assortment
+import delta
+import engine
+import ingest
+import matrix_view
+import profiler
+import result_cache
+import sections
+import threshold_sweep
+import tier_index
+import validation
 
 
 # Define template headers
@@ -24,6 +37,17 @@ def generate_excel_download(df: pd.DataFrame):
     buffer.seek(0)
     return buffer
 
+@st.cache_resource(show_spinner=False)
+def template_bytes(cols):
+    # Templates never change: build them once per server process, not per rerun
+    return generate_excel_download(pd.DataFrame(columns=list(cols))).getvalue()
+
+def format_pct_columns(df: pd.DataFrame, cols):
+    df = df.copy()
+    for col in cols:
+        df[col] = df[col].map(matrix_view.fmt_pct)
+    return df
+
 # --- UI Starts ---
 st.title("📦 Price Pack Architecture Tool")
 
@@ -32,7 +56,7 @@ st.markdown("Before uploading, please use the templates below to prepare your da
 col1, col2 = st.columns(2)
 
 with col1:
-    company_buffer = generate_excel_download(pd.DataFrame(columns=company_template_cols))
+    company_buffer = template_bytes(tuple(company_template_cols))
     st.download_button(
         label="📥 Download Company Template",
         data=company_buffer,
@@ -41,7 +65,7 @@ with col1:
     )
 
 with col2:
-    competitor_buffer = generate_excel_download(pd.DataFrame(columns=competitor_template_cols))
+    competitor_buffer = template_bytes(tuple(competitor_template_cols))
     st.download_button(
         label="📥 Download Competitor Template",
         data=competitor_buffer,
@@ -53,578 +77,491 @@ with col2:
 
 
 st.header("Upload Your Data")
-company_file = st.file_uploader("Upload Your Company Data (CSV)", type="csv")
-competitor_file = st.file_uploader("Upload Competitor Data (CSV)", type="csv")
-
-company_cols = ["SKU", "Pack Size", "Price", "Number of Washes", 
-                "Classification", "Price Tier", "Parent Brand", 
-                "Previous Volume", "Present Volume", 
-                "Previous Net Sales", "Present Net Sales"]
-
-competitor_cols = ["SKU", "Pack Size", "Price", "Number of Washes", 
-                   "Classification", "Price Tier", "Parent Brand"]
-
-def assign_tier(ppw, thresholds):
-    if ppw <= thresholds['Value'][1]:
-        return 'Value'
-    elif ppw <= thresholds['Mainstream'][1]:
-        return 'Mainstream'
-    elif ppw <= thresholds['Premium'][1]:
-        return 'Premium'
-    else:
-        return 'Others'
-
-# ✅ Moved outside assign_tier()
-def generate_dynamic_html(sku_matrix, classification_metrics, tier_metrics, classifications, tiers):
-    html = """
-    <style>
-        table {
-            border-collapse: collapse;
-            width: 100%;
-            font-family: Arial, sans-serif;
-            font-size: 13px;
-        }
-        th, td {
-            border: 1px solid #ccc;
-            padding: 10px 12px; /* Increased padding */
-            text-align: center;
-            vertical-align: middle;
-        }
-        th {
-            font-weight: bold;
-        }
-        td[colspan="3"] {
-            min-width: 180px; /* Adjust to fit 20 characters easily */
-        }
-    </style>
-
+company_file = st.file_uploader("Upload Your Company Data (CSV, Parquet or Arrow)", type=ingest.UPLOAD_TYPES)
+competitor_file = st.file_uploader("Upload Competitor Data (CSV, Parquet or Arrow)", type=ingest.UPLOAD_TYPES)
 
-    <table>
-        <tr>
-            <th>Classification</th>
-    """
-    for cls in classifications:
-        html += f'<th colspan="3">{cls}</th>'
-    html += '<th rowspan="3">Avg PP CPW</th>'
-    html += '<th rowspan="3">Value Weight</th>'
-    html += '<th rowspan="3">Growth</th></tr>'
-
-    html += "<tr><td>Net Sales Growth %</td>"
-    for cls in classifications:
-        html += f'<td colspan="3">{classification_metrics[cls]["Growth"]}</td>'
-    html += '</tr>'
-
-    html += "<tr><td>Value Share %</td>"
-    for cls in classifications:
-        html += f'<td colspan="3">{classification_metrics[cls]["Value"]}</td>'
-    html += '</tr>'
+if 'classified' not in st.session_state:
+    st.session_state.classified = False
 
-    html += "<tr><td>PPW Range</td>"
-    for cls in classifications:
-        html += f'<td colspan="3">{classification_metrics[cls]["PPW"]}</td>'
-    html += '<td></td><td></td><td></td></tr>'
+debug_profile = st.sidebar.checkbox("🐞 Debug: profile this run")
+track_memory = debug_profile and st.sidebar.checkbox("Track memory (slower)")
+prof = profiler.Profiler(enabled=debug_profile, track_memory=track_memory,
+                         run_id=st.session_state.setdefault('run_count', 0))
+if track_memory and not prof.track_memory:
+    st.sidebar.caption("Another session is tracking memory; this run records times only.")
+st.session_state['run_count'] += 1
 
-    for tier in tiers:
-        html += f'<tr><td>{tier}</td>'
-        for cls in classifications:
-            skus = sku_matrix[tier][cls]
-            html += f'<td colspan="3">{"<br>".join(skus) if skus else "-"}</td>'
-        html += f'<td>{tier_metrics[tier]["PPW"]}</td>'
-        html += f'<td>{tier_metrics[tier]["Share"]}</td>'
-        html += f'<td>{tier_metrics[tier]["Growth"]}</td></tr>'
-    html += "</table>"
-    return html
 
+def finish_profile():
+    """Close the run's profile (releasing its memory slot) and show it in the sidebar."""
+    prof.close()
+    if prof.enabled:
+        with st.sidebar.expander("⏱️ Run profile", expanded=True):
+            st.write(f"Total: {prof.total_ms():.0f} ms")
+            st.dataframe(prof.table())
+            st.download_button("📥 Profile JSON", prof.to_json(), file_name="ppa_profile.json",
+                               mime="application/json")
 
 
-
-
-if 'classified' not in st.session_state:
-    st.session_state.classified = False
+def stop_run():
+    """st.stop() for this page: the profile is finished first, as at the end of a full run."""
+    finish_profile()
+    st.stop()
 
 
 if company_file and competitor_file:
     st.subheader("Shelf Configuration")
     shelf_rows = st.number_input("Enter number of shelf rows:", min_value=1, value=3)
-    effective_sku_capacity = shelf_rows * 3 * 0.75
+    effective_sku_capacity = assortment.effective_capacity(shelf_rows)
     st.markdown(f"**Effective SKU Capacity (3 SKUs/row × 0.75):** {effective_sku_capacity:.1f}")
 
     st.subheader("Currency Settings")
     currency_symbol = st.text_input("Enter your currency symbol (e.g. ₹, $, €, etc.):", value="₹")
-    company_df = pd.read_csv(company_file)
-    competitor_df = pd.read_csv(competitor_file)
-
-    if company_df["Classification"].nunique() > 4:
-        st.error("You have more than 4 classifications in your company data.")
-    else:
-                # Clean numeric fields
-                # Clean numeric columns (company)
-        company_numeric_cols = [
-            "Price", "Number of Washes", "Previous Volume", "Present Volume", 
-            "Previous Net Sales", "Present Net Sales", "Shelf Row"
-        ]
-        company_df[company_numeric_cols] = company_df[company_numeric_cols].apply(pd.to_numeric, errors="coerce")
-        
-        # Clean numeric columns (competitor)
-        competitor_numeric_cols = ["Price", "Number of Washes", "Previous Volume", "Present Volume", "Previous Net Sales", "Present Net Sales", "Shelf Row"]
-        competitor_df[competitor_numeric_cols] = competitor_df[competitor_numeric_cols].apply(pd.to_numeric, errors="coerce")
-
-
-        
-        # Calculate Price per Wash
-        company_df["Price per Wash"] = company_df["Price"] / company_df["Number of Washes"]
-                # Filter for valid SKUs (for growth only)
-        valid_company_df = company_df[
-            ~((company_df['Previous Volume'].fillna(0) == 0) & (company_df['Previous Net Sales'].fillna(0) == 0))
-        ].copy()
-
-        competitor_df["Price per Wash"] = competitor_df["Price"] / competitor_df["Number of Washes"]
-
-
-        st.subheader("Price per Wash Range")
-        st.write(f"Company: {currency_symbol}{company_df['Price per Wash'].min():.2f} – {currency_symbol}{company_df['Price per Wash'].max():.2f}")
-        st.write(f"Competitor: {currency_symbol}{competitor_df['Price per Wash'].min():.2f} – {currency_symbol}{competitor_df['Price per Wash'].max():.2f}")
-        
-        st.subheader(f"Set Price Tier Thresholds ({currency_symbol})")
-        with st.form("thresholds"):
-            col1, col2, col3 = st.columns(3)
+    with st.expander("🩹 Corrections (delta upload)"):
+        st.caption("Upload only the SKU rows that changed since the files above, in the template columns, "
+                   "with an optional Action column: insert, update, upsert (default) or delete. "
+                   "The analysis is patched with them instead of re-reading the full files.")
+        company_delta_file = st.file_uploader("Company corrections", type=ingest.UPLOAD_TYPES, key="company_delta")
+        competitor_delta_file = st.file_uploader("Competitor corrections", type=ingest.UPLOAD_TYPES,
+                                                 key="competitor_delta")
+
+    # Parsed, validated and Price per Wash added once per file content, not per rerun
+    prof.begin("Ingest")
+    company_df, company_problems = ingest.load_uploaded(company_file, "company")
+    competitor_df, competitor_problems = ingest.load_uploaded(competitor_file, "competitor")
+    reports = {"Company": company_problems, "Competitor": competitor_problems}
+    deltas = {}
+    for label, kind, delta_file in (("Company", "company", company_delta_file),
+                                    ("Competitor", "competitor", competitor_delta_file)):
+        if delta_file:
+            deltas[kind], reports[f"{label} corrections"] = delta.load_uploaded(delta_file, kind)
+    prof.end(rows=len(company_df) + len(competitor_df))
+    cache_stats = ingest.cache.stats()
+    st.caption(f"Ingest cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses, "
+               f"{cache_stats['entries']}/{cache_stats['max_entries']} files cached")
+
+    # Stop before any analysis if either file has errors; warnings only get listed
+    problems = validation.combine_reports(reports)
+    problem_errors = validation.errors(problems)
+    if len(problems):
+        if len(problem_errors):
+            st.error(f"Your files have {len(problem_errors):,} problem(s) to fix before the analysis can run.")
+        else:
+            st.warning(f"{len(problems):,} warning(s) in your files; the analysis below still uses these rows.")
+        with st.expander("🧾 Data problems", expanded=bool(len(problem_errors))):
+            st.dataframe(validation.summary(problems), hide_index=True)
+            st.dataframe(problems.head(1000), hide_index=True)
+            st.download_button(
+                label="📥 Download row-level problem report (CSV)",
+                data=validation.report_csv(problems),
+                file_name="data_problems.csv",
+                mime="text/csv",
+            )
+    if len(problem_errors):
+        stop_run()
+
+    # One compact combined frame and PPW index per dataset, shared by every section
+    # and every session on this server (same files = same content hash)
+    index_key = (ingest.upload_key(company_file), ingest.upload_key(competitor_file))
+
+    def build_index():
+        prof.begin("Combine + PPW index", rows=len(company_df) + len(competitor_df))
+        combined = engine.combine(company_df, competitor_df)
+        index = tier_index.PPWIndex(combined)
+        prof.end()
+        return combined, index
+
+    combined_df, ppw_index = result_cache.cache.get_or_compute(("ppw_index", index_key), build_index)
+
+    if deltas:
+        # Corrections patch the base dataset's index; the patched one is cached under its own key
+        base_index = (combined_df, ppw_index)
+        index_key += tuple(ingest.upload_key(f) if f else None for f in (company_delta_file, competitor_delta_file))
+
+        def build_patched():
+            prof.begin("Delta patch", rows=sum(len(d) for d in deltas.values()))
+            patched = delta.Patched(company_df, competitor_df, *base_index,
+                                    deltas.get("company"), deltas.get("competitor"))
+            prof.end()
+            return patched
+
+        try:
+            patched = result_cache.cache.get_or_compute(("delta", index_key), build_patched)
+        except validation.ValidationError as e:
+            st.error(f"Corrections could not be applied: {e}")
+            st.dataframe(e.problems.head(1000), hide_index=True)
+            stop_run()
+        company_df, competitor_df = patched.company_df, patched.competitor_df
+        combined_df, ppw_index = result_cache.cache.get_or_compute(
+            ("ppw_index", index_key), lambda: (patched.combined_df, patched.index))
+        counts = patched.changes.groupby(["File", "Change"]).size()
+        applied = ", ".join(f"{file} {change} {count:,}" for (file, change), count in counts.items())
+        st.success(f"Corrections applied: {applied or 'nothing changed'}.")
+        with st.expander("🩹 Changed SKUs"):
+            st.dataframe(patched.changes, hide_index=True)
+
+    st.subheader("Price per Wash Range")
+    st.write(f"Company: {currency_symbol}{company_df['Price per Wash'].min():.2f} – {currency_symbol}{company_df['Price per Wash'].max():.2f}")
+    st.write(f"Competitor: {currency_symbol}{competitor_df['Price per Wash'].min():.2f} – {currency_symbol}{competitor_df['Price per Wash'].max():.2f}")
+    
+    st.subheader(f"Set Price Tier Thresholds ({currency_symbol})")
+    # Live inputs: the PPW index answers any threshold set without re-tiering rows
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        value_max = st.number_input(f"Value: Max {currency_symbol}", value=.13)
+    with col2:
+        mainstream_max = st.number_input(f"Mainstream: Max {currency_symbol}", value=.17)
+    with col3:
+        premium_max = st.number_input(f"Premium: Max {currency_symbol}", value=1)
+    thresholds = engine.default_thresholds(value_max, mainstream_max, premium_max)
+
+    live_tier_metrics = ppw_index.tier_metrics(thresholds)
+    st.dataframe(format_pct_columns(live_tier_metrics, ["Growth", "Share"]))
+
+    with st.expander("🔎 Threshold Sweep"):
+        st.caption("Scores every increasing (Value, Mainstream, Premium) combination on the grid and keeps the Pareto-best.")
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            sweep_min = st.number_input(f"Lowest cut {currency_symbol}", value=.05)
+        with col2:
+            sweep_max = st.number_input(f"Highest cut {currency_symbol}", value=1.0)
+        with col3:
+            sweep_step = st.number_input(f"Step {currency_symbol}", value=.01, min_value=.001, format="%.3f")
+        sweep_objectives = st.multiselect(
+            "Objectives", list(threshold_sweep.OBJECTIVES), default=["Balance", "Others Share %"]
+        )
+        if st.button("Run Sweep"):
+            axis = np.arange(sweep_min, sweep_max + sweep_step / 2, sweep_step)
+            try:
+                candidates = threshold_sweep.candidate_grid(axis, axis, axis)
+            except ValueError as e:
+                st.info(str(e))
+            else:
+                prof.begin("Threshold sweep", rows=len(candidates))
+                sweep_df = threshold_sweep.sweep(ppw_index, candidates)
+                front = threshold_sweep.pareto_front(
+                    sweep_df, {name: threshold_sweep.OBJECTIVES[name] for name in sweep_objectives}
+                )
+                st.write(f"{len(candidates):,} candidates evaluated, {len(front):,} on the Pareto front")
+                st.dataframe(front)
+                prof.end()
+
+    if st.button("Classify SKUs"):
+        st.session_state['classified'] = True  # 🔒 Locks the view to analysis mode
+
+    if st.session_state['classified']:
+        # Tiering and segment aggregates first (fast, straight from the PPW index);
+        # every table below is built from this context independently. Both are
+        # shared across sessions: analysts opening the same files with the same
+        # thresholds reuse one computation.
+        analysis_key = (index_key, result_cache.thresholds_key(thresholds))
+        prof.begin("Classify", rows=len(combined_df))
+        context = result_cache.cache.get_or_compute(
+            ("context", analysis_key),
+            lambda: engine.summary_context(engine.classify(combined_df, thresholds), ppw_index.segments(thresholds),
+                                           thresholds, sketch=ppw_index.sketch),
+        )
+        full_df = context["full_df"]
+        tiers = context["tiers"]
+        classifications = context["classifications"]
+        prof.end()
+
+        def table(name):
+            return result_cache.cache.get_or_compute(("table", analysis_key, name),
+                                                     lambda: engine.SUMMARY_TABLES[name](context))
+
+        # --- Section builders: run on the worker pool, no Streamlit calls in here ---
+        def build_sku_matrix(run):
+            metrics = {"classification_metrics": table("classification_metrics"), "tier_metrics": table("tier_metrics")}
+            run.check_cancelled()
+            classification_metrics, tier_metrics = matrix_view.format_segment_metrics(metrics, currency_symbol)
+            matrix = table("sku_matrix")
+            run.check_cancelled()
+            return result_cache.cache.get_or_compute(
+                ("html", "sku_matrix", analysis_key, currency_symbol, page_key, cell_limit),
+                lambda: matrix_view.generate_dynamic_html(matrix, classification_metrics, tier_metrics,
+                                                          visible_classes, visible_tiers, cell_limit),
+            )
+
+        def build_tier_class_matrix(run):
+            cells = table("tier_class_matrix")
+            run.check_cancelled()
+            return result_cache.cache.get_or_compute(
+                ("html", "tier_class_matrix", analysis_key, currency_symbol, page_key),
+                lambda: matrix_view.tier_class_matrix_html(cells, visible_classes, visible_tiers, currency_symbol),
+            )
+
+        def build_brand_bps(run):
+            brand_summary_df = format_pct_columns(table("brand_summary"), ["Previous Share %", "Current Share %"])
+            brand_summary_df["BPS Change"] = brand_summary_df["BPS Change"].map(lambda v: f"{v:.0f} BPS")
+            return brand_summary_df
+
+        # --- Layout in page order; each section shows a placeholder until its result arrives ---
+        slots = {}
+
+        def placeholder(name):
+            slots[name] = st.empty()
+            slots[name].caption("⏳ Computing…")
+
+        # Only the visible page of classifications / tiers is built and sent to the browser
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            classes_per_page = st.number_input("Classifications per page", min_value=1, max_value=50,
+                                               value=matrix_view.CLASSIFICATIONS_PER_PAGE)
+        with col2:
+            class_pages = matrix_view.page_count(len(classifications), classes_per_page)
+            class_page = st.number_input(f"Classification page (of {class_pages})", min_value=1,
+                                         max_value=class_pages, value=1)
+        with col3:
+            tier_pages = matrix_view.page_count(len(tiers), matrix_view.TIERS_PER_PAGE)
+            tier_page = st.number_input(f"Tier page (of {tier_pages})", min_value=1, max_value=tier_pages, value=1)
+        with col4:
+            cell_limit = st.number_input("SKUs shown per cell", min_value=1, max_value=500,
+                                         value=matrix_view.CELL_SKU_LIMIT)
+        visible_classes = matrix_view.paginate(classifications, class_page, classes_per_page)
+        visible_tiers = matrix_view.paginate(tiers, tier_page, matrix_view.TIERS_PER_PAGE)
+        page_key = (tuple(visible_classes), tuple(visible_tiers))
+
+        placeholder("sku_matrix")
+        if st.checkbox("🔍 Show every SKU in one cell"):
+            col1, col2 = st.columns(2)
             with col1:
-                value_max = st.number_input(f"Value: Max {currency_symbol}", value=.13)
+                cell_tier = st.selectbox("Tier", visible_tiers)
             with col2:
-                mainstream_max = st.number_input(f"Mainstream: Max {currency_symbol}", value=.17)
-            with col3:
-                premium_max = st.number_input(f"Premium: Max {currency_symbol}", value=1)
-            submit_btn = st.form_submit_button("Classify SKUs")
-            if submit_btn:
-                st.session_state['classified'] = True
+                cell_class = st.selectbox("Classification", visible_classes)
+            cell_skus = table("sku_matrix").get(cell_tier, {}).get(cell_class, [])
+            st.write(f"{len(cell_skus):,} SKUs")
+            st.dataframe(pd.DataFrame({"SKU": cell_skus}), hide_index=True)
+        cache_stats = result_cache.cache.stats()
+        st.caption(f"Shared result cache: {cache_stats['hits'] + cache_stats['coalesced']} reused / "
+                   f"{cache_stats['misses']} computed across all sessions")
 
 
 
-        if submit_btn:
-            st.session_state['classified'] = True  # 🔒 Locks the view to analysis mode
-            st.rerun()  # 🔁 Reruns the app to jump into analysis block
-    
-        if st.session_state['classified']:
-            thresholds = {
-                'Value': (0.0, value_max),
-                'Mainstream': (value_max, mainstream_max),
-                'Premium': (mainstream_max, premium_max)
-            }
-   
-
-
-            company_df['Calculated Price Tier'] = company_df["Price per Wash"].apply(lambda x: assign_tier(x, thresholds))
-            competitor_df['Calculated Price Tier'] = competitor_df["Price per Wash"].apply(lambda x: assign_tier(x, thresholds))
-            company_df['Is Competitor'] = False
-            competitor_df['Is Competitor'] = True
-
-            full_df = pd.concat([company_df, competitor_df], ignore_index=True)
-# ----- ✅ Corrected Metrics Calculation -----
-
-            tiers = ['Premium', 'Mainstream', 'Value']
-            classifications = sorted(full_df['Classification'].unique())
-            
-            sku_matrix = {tier: {cls: [] for cls in classifications} for tier in tiers}
-            classification_metrics = {}
-            tier_metrics = {}
-            
-            total_present_sales = full_df['Present Net Sales'].sum()
-            
-            # --- Classification-level metrics
-            for cls in classifications:
-                cls_df = full_df[full_df['Classification'] == cls]
-                prev_rev = valid_company_df[valid_company_df['Classification'] == cls]['Previous Net Sales'].sum()
-                curr_rev = cls_df['Present Net Sales'].sum()
-                
-                growth = ((curr_rev - prev_rev) / prev_rev * 100) if prev_rev else 0
-                share = (curr_rev / total_present_sales * 100) if total_present_sales else 0
-                ppw_range = f"{cls_df['Price per Wash'].min():.2f} – {cls_df['Price per Wash'].max():.2f}" if not cls_df.empty else "-"
-                
-                classification_metrics[cls] = {
-                    "Growth": f"{growth:.1f}%",
-                    "Value": f"{share:.1f}%",
-                    "PPW": ppw_range
-                }
-            
-            # --- Tier-level metrics
-            for tier in tiers:
-                tier_df = full_df[full_df["Calculated Price Tier"] == tier]
-                prev_rev = valid_company_df[valid_company_df["Calculated Price Tier"] == tier]["Previous Net Sales"].sum()
-                curr_rev = tier_df["Present Net Sales"].sum()
-                
-                growth = ((curr_rev - prev_rev) / prev_rev * 100) if prev_rev else 0
-                share = (curr_rev / total_present_sales * 100) if total_present_sales else 0
-                
-                min_ppw = tier_df["Price per Wash"].min()
-                max_ppw = tier_df["Price per Wash"].max()
-                ppw_range = f"{currency_symbol}{min_ppw:.2f} – {currency_symbol}{max_ppw:.2f}" if not tier_df.empty else "-"
-                
-                tier_metrics[tier] = {
-                    "PPW": ppw_range,
-                    "Growth": f"{growth:.1f}%",
-                    "Share": f"{share:.1f}%"
-                }
-            
-            # --- Also rebuild SKU matrix (this is fine, no change needed)
-            for _, row in company_df.iterrows():
-
-                tier = row["Calculated Price Tier"]
-                cls = row["Classification"]
-                sku = row["SKU"]
-                if tier in sku_matrix and cls in sku_matrix[tier]:
-                    sku_matrix[tier][cls].append(sku)
-
-
-            # After HTML render
-            # Store dynamic HTML once on submit
-           # Always regenerate and show latest updated matrix (no cache)
-            dynamic_html = generate_dynamic_html(sku_matrix, classification_metrics, tier_metrics, classifications, tiers)
-            st.markdown(dynamic_html, unsafe_allow_html=True)
-
-
-
-          # ----- SKU GROWTH SUMMARY -----
-            st.subheader("📈 SKU-Level Growth Summary (Our Company Only)")
-            
-            sku_growth_summary = []
-            
-            for _, row in company_df.iterrows():
-                sku = row['SKU']
-                prev_vol = row['Previous Volume']
-                curr_vol = row['Present Volume']
-                prev_rev = row['Previous Net Sales']
-                curr_rev = row['Present Net Sales']
-            
-                volume_growth = ((curr_vol - prev_vol) / prev_vol * 100) if prev_vol else 0
-                Net_Sales_growth = ((curr_rev - prev_rev) / prev_rev * 100) if prev_rev else 0
-            
-                sku_growth_summary.append({
-                    "SKU": sku,
-                    "Previous Volume": prev_vol,
-                    "Present Volume": curr_vol,
-                    "Volume Growth %": f"{volume_growth:.1f}%",
-                    "Previous Net Sales": prev_rev,
-                    "Present Net Sales": curr_rev,
-                    "Net Sales Growth %": f"{Net_Sales_growth:.1f}%"
-                })
-            
-            # Show as table
-            st.dataframe(pd.DataFrame(sku_growth_summary))
-
-
-          # SCATTER PLOT: Retail Price vs. Price Per Wash
-            from adjustText import adjust_text
-            import numpy as np
-            
-            st.subheader("📈 Scatter Plot: Retail Price vs. Price Per Wash")
-            
-            # Combine company and competitor for plot
-            plot_df = pd.concat([company_df, competitor_df], ignore_index=True).copy()
-            
-            # Add small jitter to overlapping points
-            plot_df['Jittered PPW'] = plot_df['Price per Wash'] + np.random.normal(0, 0.002, size=len(plot_df))
-            plot_df['Jittered Price'] = plot_df['Price'] + np.random.normal(0, 0.3, size=len(plot_df))
-            
-            # Define colors
-            plot_df['Color'] = plot_df['Is Competitor'].apply(lambda x: 'green' if x else 'navy')
-            
-            # Axis ranges
-            x_min = plot_df['Jittered PPW'].min() - 0.03
-            x_max = plot_df['Jittered PPW'].max() + 0.03
-            y_min = plot_df['Jittered Price'].min() - 2
-            y_max = plot_df['Jittered Price'].max() + 2
-            
-            # Matplotlib Plot
-            fig, ax = plt.subplots(figsize=(12, 7))
-            
-            # Plot each point with its color
-            ax.scatter(plot_df['Jittered PPW'], plot_df['Jittered Price'], c=plot_df['Color'], s=70, alpha=0.8)
-            
-            # Add labels with adjustText
-            texts = [
-                ax.text(row['Jittered PPW'], row['Jittered Price'], row['SKU'], fontsize=8)
-                for _, row in plot_df.iterrows()
-            ]
-            
-            adjust_text(
-                texts,
-                ax=ax,
-                arrowprops=dict(arrowstyle="-", color='gray', lw=0.5),
-                expand_points=(1.2, 1.4),
-                expand_text=(1.2, 1.4),
-                force_text=0.5,
-                force_points=0.4,
-                only_move={'points': 'y', 'text': 'xy'},
-            )
-            
-            ax.set_xlabel("Price Per Wash")
-            ax.set_ylabel("Retail Price")
-            ax.set_title("Scatter Plot of SKUs")
-            ax.set_xlim(x_min, x_max)
-            ax.set_ylim(y_min, y_max)
-            ax.grid(True, linestyle='--', alpha=0.5)
-            
-            st.pyplot(fig)
-
-            
-
-            st.subheader("📊 API Comparison: Our SKUs vs Competitors (By Classification & Tier)")
-
-            
-
-            api_rows = []
-            
-            # Loop through all classification × tier segments
-            for classification in classifications:
-                for tier in tiers:
-                    segment_df = full_df[
-                        (full_df["Classification"] == classification) &
-                        (full_df["Calculated Price Tier"] == tier)
-                    ]
-                    our_skus = segment_df[segment_df["Is Competitor"] == False]
-                    comp_skus = segment_df[segment_df["Is Competitor"] == True]
-            
-                    if not comp_skus.empty:
-                        avg_comp_ppw = comp_skus["Price per Wash"].mean()
-            
-                        for _, our_row in our_skus.iterrows():
-                            our_ppw = our_row["Price per Wash"]
-                            api = our_ppw / avg_comp_ppw if avg_comp_ppw else float('nan')
-            
-                            api_rows.append({
-                                "Classification": classification,
-                                "Price Tier": tier,
-                                "Our SKU": our_row["SKU"],
-                                "Our PPW": round(our_ppw, 2),
-                                "Avg Competitor PPW": round(avg_comp_ppw, 2),
-                                "API (Our / Comp)": round(api, 2)
-                            })
-            
-            if api_rows:
-                api_df = pd.DataFrame(api_rows)
-                st.dataframe(api_df)
-            else:
-                st.info("No competitor SKUs found in any classification-tier segment.")
+      # ----- SKU GROWTH SUMMARY -----
+        st.subheader("📈 SKU-Level Growth Summary (Our Company Only)")
+        placeholder("sku_growth")
 
-            
-            if api_rows:
-                api_df = pd.DataFrame(api_rows)
-                st.dataframe(api_df)
-            else:
-                st.info("No matching competitor SKUs found in any classification-tier combination.")
 
-            st.subheader("🔁 Compare API Between Two SKUs")
+      # SCATTER PLOT: Retail Price vs. Price Per Wash
+        st.subheader("📈 Scatter Plot: Retail Price vs. Price Per Wash")
+        import plotting  # matplotlib only loads once a chart is actually shown
+
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            label_mode = st.selectbox("Label", list(plotting.LABEL_MODES), format_func=plotting.LABEL_MODES.get)
+        with col2:
+            top_n = st.number_input("Top N labels", min_value=1, value=30)
+        with col3:
+            budget_ms = st.number_input("Latency budget (ms)", min_value=50, value=500, step=50)
+        selected_skus = []
+        if label_mode == "selected":
+            selected_skus = st.multiselect("SKUs to label", sorted(full_df["SKU"].astype(str).unique()))
+        placeholder("scatter")
+
+
+
+        st.subheader("📊 API Comparison: Our SKUs vs Competitors (By Classification & Tier)")
+        placeholder("api")
+
+        st.subheader("🔁 Compare API Between Two SKUs")
 # Combine company and competitor for dropdowns
-            sku_ppw_map = full_df.set_index("SKU")["Price per Wash"].to_dict()
-            sku_list = sorted(sku_ppw_map.keys())
-            
+        sku_ppw_map = full_df.set_index("SKU")["Price per Wash"].to_dict()
+        sku_list = sorted(sku_ppw_map.keys())
+
+        col1, col2 = st.columns(2)
+        with col1:
+            sku_a = st.selectbox("Select SKU A", sku_list)
+        with col2:
+            sku_b = st.selectbox("Select SKU B", sku_list, index=1)
+
+        if sku_a and sku_b and sku_a != sku_b:
+            ppw_a = sku_ppw_map[sku_a]
+            ppw_b = sku_ppw_map[sku_b]
+
+            api = ppw_a / ppw_b if ppw_b else float('nan')
+
+            st.markdown(f"""
+            **SKU A:** `{sku_a}` — PPW = {currency_symbol}{ppw_a:.2f}  
+            **SKU B:** `{sku_b}` — PPW = {currency_symbol}{ppw_b:.2f}  
+
+            📊 **API (A vs B)** = {ppw_a:.2f} / {ppw_b:.2f} = **{api:.2f}**
+            """)
+        else:
+            st.info("Please select two different SKUs.")
+
+        with st.expander("🧮 SKU × SKU API Matrix"):
             col1, col2 = st.columns(2)
             with col1:
-                sku_a = st.selectbox("Select SKU A", sku_list)
+                matrix_classes = st.multiselect("Classifications", classifications)
             with col2:
-                sku_b = st.selectbox("Select SKU B", sku_list, index=1)
-            
-            if sku_a and sku_b and sku_a != sku_b:
-                ppw_a = sku_ppw_map[sku_a]
-                ppw_b = sku_ppw_map[sku_b]
-            
-                api = ppw_a / ppw_b if ppw_b else float('nan')
-                
-                st.markdown(f"""
-                **SKU A:** `{sku_a}` — PPW = {currency_symbol}{ppw_a:.2f}  
-                **SKU B:** `{sku_b}` — PPW = {currency_symbol}{ppw_b:.2f}  
-                
-                📊 **API (A vs B)** = {ppw_a:.2f} / {ppw_b:.2f} = **{api:.2f}**
-                """)
-            else:
-                st.info("Please select two different SKUs.")
+                matrix_tiers = st.multiselect("Price Tiers", tiers)
+            col1, col2 = st.columns(2)
+            with col1:
+                row_scope = st.radio("Rows", ["Our SKUs", "All SKUs"], horizontal=True)
+            with col2:
+                col_scope = st.radio("Columns", ["Competitor SKUs", "All SKUs"], horizontal=True)
+            matrix_rows = api_matrix.select_skus(full_df, matrix_classes, matrix_tiers,
+                                                 is_competitor=False if row_scope == "Our SKUs" else None)
+            matrix_cols = api_matrix.select_skus(full_df, matrix_classes, matrix_tiers,
+                                                 is_competitor=True if col_scope == "Competitor SKUs" else None)
+            st.write(f"{len(matrix_rows):,} × {len(matrix_cols):,} SKUs")
+            try:
+                st.dataframe(api_matrix.api_matrix(matrix_rows, matrix_cols).round(2))
+            except ValueError as e:
+                st.info(str(e))
+            if st.button("Prepare CSV export"):
+                try:
+                    st.download_button(
+                        label="📥 Download API Pairs (cross-brand)",
+                        data=api_matrix.write_api_matrix_csv(matrix_rows, matrix_cols, long=True),
+                        file_name="api_matrix.csv",
+                        mime="text/csv"
+                    )
+                except ValueError as e:
+                    st.info(str(e))
 
 # --- 📊 New Section: Classification and Price Tier Growth and Share Analysis ---
 
-            st.header("📊 Classification and Price Tier: Value Growth and Share")
-            
-            # Full dataset: company + competitor
-            full_df_for_analysis = pd.concat([company_df, competitor_df], ignore_index=True)
-            
-            # --- 📂 1. Classification Level Analysis ---
-            classification_summary = []
-            
-            total_prev_sales = full_df_for_analysis["Previous Net Sales"].sum()
-            total_curr_sales = full_df_for_analysis["Present Net Sales"].sum()
-            
-            for cls in sorted(full_df_for_analysis["Classification"].unique()):
-                cls_df = full_df_for_analysis[full_df_for_analysis["Classification"] == cls]
-                
-                prev_sales = cls_df["Previous Net Sales"].sum()
-                curr_sales = cls_df["Present Net Sales"].sum()
-                
-                growth = ((curr_sales - prev_sales) / prev_sales * 100) if prev_sales else 0
-                share = (curr_sales / total_curr_sales * 100) if total_curr_sales else 0
-                
-                classification_summary.append({
-                    "Classification": cls,
-                    "Sales Value Growth %": f"{growth:.1f}%",
-                    "Value Share %": f"{share:.1f}%"
-                })
-            
-            classification_df = pd.DataFrame(classification_summary)
-            
-            st.subheader("📂 Classification Summary")
-            st.dataframe(classification_df)
-            
-            # --- 📂 2. Price Tier Level Analysis ---
-            tier_summary = []
-            
-            for tier in ['Premium', 'Mainstream', 'Value']:  # Ensure order
-                tier_df = full_df_for_analysis[full_df_for_analysis["Calculated Price Tier"] == tier]
-                
-                prev_sales = tier_df["Previous Net Sales"].sum()
-                curr_sales = tier_df["Present Net Sales"].sum()
-                
-                growth = ((curr_sales - prev_sales) / prev_sales * 100) if prev_sales else 0
-                share = (curr_sales / total_curr_sales * 100) if total_curr_sales else 0
-                
-                tier_summary.append({
-                    "Price Tier": tier,
-                    "Sales Value Growth %": f"{growth:.1f}%",
-                    "Value Share %": f"{share:.1f}%"
-                })
-            
-            tier_df_final = pd.DataFrame(tier_summary)
-            
-            st.subheader("📂 Price Tier Summary")
-            st.dataframe(tier_df_final)
+        st.header("📊 Classification and Price Tier: Value Growth and Share")
+
+        st.subheader("📂 Classification Summary")
+        placeholder("classification_summary")
+
+        st.subheader("📂 Price Tier Summary")
+        placeholder("tier_summary")
 
 
 # --- 📊 New Section: Matrix of Price Tier × Classification ---
 
-            # --- 📊 New Section: Refined Price Tier × Classification Matrix ---
-
-            # --- 📊 New Section: Refined Price Tier × Classification Matrix (Horizontal Layout) ---
-
-            st.header("📊 Price Tier vs Classification Matrix (Sales, Share %, Growth %) [Horizontal]")
-            
-            # Full data: company + competitor
-            full_df_for_matrix = pd.concat([company_df, competitor_df], ignore_index=True)
-            
-            tiers = ['Premium', 'Mainstream', 'Value']  # Keep same order
-            classifications = sorted(full_df_for_matrix['Classification'].unique())
-            
-            # Initialize matrix
-            matrix_html = """
-            <style>
-                table.main {
-                    border-collapse: collapse;
-                    width: 100%;
-                    font-family: Arial, sans-serif;
-                    font-size: 12px;
-                }
-                table.main th, table.main td {
-                    border: 1px solid #ddd;
-                    padding: 6px;
-                    text-align: center;
-                    vertical-align: middle;
-                }
-                table.main th {
-                    background-color: #f2f2f2;
-                    font-weight: bold;
-                }
-                table.inner {
-                    width: 100%;
-                    border: none;
-                }
-                table.inner td {
-                    border: none;
-                    padding: 2px 5px;
-                    font-size: 11px;
-                    text-align: center;
-                }
-            </style>
-            
-            <table class="main">
-            <tr>
-                <th>Price Tier \\ Classification</th>
-            """
-            
-            for cls in classifications:
-                matrix_html += f"<th>{cls}</th>"
-            matrix_html += "</tr>"
-            
-            for tier in tiers:
-                matrix_html += f"<tr><td><b>{tier}</b></td>"
-                for cls in classifications:
-                    segment_df = full_df_for_matrix[
-                        (full_df_for_matrix["Calculated Price Tier"] == tier) &
-                        (full_df_for_matrix["Classification"] == cls)
-                    ]
-                    
-                    if not segment_df.empty:
-                        total_present = segment_df["Present Net Sales"].sum()
-                        total_previous = segment_df["Previous Net Sales"].sum()
-                        our_present = segment_df[segment_df["Is Competitor"] == False]["Present Net Sales"].sum()
-            
-                        share_percent = (our_present / total_present * 100) if total_present else 0
-                        growth_percent = ((total_present - total_previous) / total_previous * 100) if total_previous else 0
-            
-                        # Mini table inside each cell (horizontal layout)
-                        cell_text = f"""
-                        <table class="inner">
-                            <tr>
-                                <td><b>{currency_symbol}{total_present:,.0f}</b></td>
-                                <td>{share_percent:.1f}%</td>
-                                <td>{growth_percent:.1f}%</td>
-                            </tr>
-                        </table>
-                        """
-                    else:
-                        cell_text = "-"
-            
-                    matrix_html += f"<td>{cell_text}</td>"
-                matrix_html += "</tr>"
-            
-            matrix_html += "</table>"
-            
-            st.markdown(matrix_html, unsafe_allow_html=True)
+        # --- 📊 New Section: Refined Price Tier × Classification Matrix ---
+
+        # --- 📊 New Section: Refined Price Tier × Classification Matrix (Horizontal Layout) ---
+
+        st.header("📊 Price Tier vs Classification Matrix (Sales, Share %, Growth %) [Horizontal]")
+        placeholder("tier_class_matrix")
 
 
 # --- 📊 Brand-Level Market Share and BPS Change Analysis ---
 
-            st.header("🏷️ Brand Market Share and BPS Change")
-            
-            # Full dataset
-            full_df_for_brands = pd.concat([company_df, competitor_df], ignore_index=True)
-            
-            total_previous_net_sales = full_df_for_brands["Previous Net Sales"].sum()
-            total_present_net_sales = full_df_for_brands["Present Net Sales"].sum()
-            
-            brand_summary = []
-            
-            for brand in sorted(full_df_for_brands["Parent Brand"].dropna().unique()):
-                brand_df = full_df_for_brands[full_df_for_brands["Parent Brand"] == brand]
-                
-                prev_sales = brand_df["Previous Net Sales"].sum()
-                curr_sales = brand_df["Present Net Sales"].sum()
-                
-                prev_share = (prev_sales / total_previous_net_sales * 100) if total_previous_net_sales else 0
-                curr_share = (curr_sales / total_present_net_sales * 100) if total_present_net_sales else 0
-                bps_change = (curr_share - prev_share) * 100  # Basis Points
-                
-                brand_summary.append({
-                    "Parent Brand": brand,
-                    "Previous Share %": f"{prev_share:.1f}%",
-                    "Current Share %": f"{curr_share:.1f}%",
-                    "BPS Change": f"{bps_change:.0f} BPS"
-                })
-            
-            brand_summary_df = pd.DataFrame(brand_summary).sort_values(by="Current Share %", ascending=False)
-            
-            st.dataframe(brand_summary_df)
-
-
-
-
-
-
-
-
-            
+        st.header("🏷️ Brand Market Share and BPS Change")
+        placeholder("brand_bps")
+
+        # --- Compute every section concurrently and fill each slot as soon as it is ready ---
+        def render_scatter(slot, value):
+            scatter_png, scatter_ms = value
+            with slot.container():
+                st.image(scatter_png)
+                st.caption(f"Rendered in {scatter_ms:.0f} ms")
+
+        renderers = {
+            "sku_matrix": lambda slot, html: slot.markdown(html, unsafe_allow_html=True),
+            "sku_growth": lambda slot, df: slot.dataframe(df),
+            "scatter": render_scatter,
+            "api": lambda slot, df: slot.dataframe(df) if not df.empty else slot.info(
+                "No competitor SKUs found in any classification-tier segment."),
+            "classification_summary": lambda slot, df: slot.dataframe(df),
+            "tier_summary": lambda slot, df: slot.dataframe(df),
+            "tier_class_matrix": lambda slot, html: slot.markdown(html, unsafe_allow_html=True),
+            "brand_bps": lambda slot, df: slot.dataframe(df),
+        }
+        prof.begin("Sections (wall time)", rows=len(full_df))
+        with sections.pool.run() as run:
+            run.submit("sku_matrix", build_sku_matrix, run)
+            run.submit("sku_growth", lambda: format_pct_columns(table("sku_growth"), ["Volume Growth %", "Net Sales Growth %"]))
+            run.submit("scatter", lambda: plotting.cached_scatter_png(
+                index_key, full_df,
+                label_mode=label_mode, top_n=int(top_n), selected=sorted(selected_skus), budget_ms=budget_ms,
+            ))
+            run.submit("api", lambda: table("api").round(2))
+            run.submit("classification_summary", lambda: format_pct_columns(table("classification_summary"), ["Sales Value Growth %", "Value Share %"]))
+            run.submit("tier_summary", lambda: format_pct_columns(table("tier_summary"), ["Sales Value Growth %", "Value Share %"]))
+            run.submit("tier_class_matrix", build_tier_class_matrix, run)
+            run.submit("brand_bps", build_brand_bps, run)
+
+            for name, value, error, ms in run.completed():
+                if error is not None:
+                    slots[name].error(f"Could not build this section: {error}")
+                    continue
+                renderers[name](slots[name], value)
+                prof.record(f"Section: {name}", ms, parent="Sections (wall time)")
+        prof.end()
+
+# --- 🛒 Shelf Assortment: which of our SKUs fit the effective SKU capacity ---
+
+        st.header("🛒 Shelf Assortment")
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            shelf_objective = st.selectbox("Objective", list(assortment.OBJECTIVES))
+        with col2:
+            min_per_tier = st.number_input("Minimum SKUs per tier", min_value=0, value=1)
+        with col3:
+            keep_placed = st.checkbox("Keep SKUs already on a shelf row")
+        st.caption(assortment.OBJECTIVES[shelf_objective])
+        company_rows = context["company_rows"]
+        shelf_row = company_rows["Shelf Row"].astype("float64")
+        pinned = company_rows.loc[shelf_row.between(1, shelf_rows), "SKU"] if keep_placed else ()
+        prof.begin("Shelf assortment", rows=len(company_rows))
+        ranked = assortment.rank(company_rows, shelf_objective, int(min_per_tier), pinned, context["segments"])
+        curve = assortment.capacity_curve(
+            ranked, [assortment.effective_capacity(rows) for rows in range(1, max(2 * shelf_rows, 10) + 1)],
+            int(min_per_tier),
+        )
+        prof.end()
+        keep = ranked.head(assortment.sku_slots(effective_sku_capacity))
+        kept_tiers = keep["Calculated Price Tier"].value_counts()
+        short = [tier for tier in ranked["Calculated Price Tier"].unique() if kept_tiers.get(tier, 0) < min_per_tier]
+        st.write(f"Keep {len(keep):,} of {len(ranked):,} SKUs on {shelf_rows} shelf row(s).")
+        if short:
+            st.warning(f"Not enough room for {int(min_per_tier)} SKU(s) in: {', '.join(map(str, short))}")
+        st.dataframe(keep[["Rank", "SKU", "Classification", "Calculated Price Tier", "Parent Brand",
+                           "Present Net Sales", "Score", "Reason", "Shelf Row"]], hide_index=True)
+        with st.expander("📐 Other shelf sizes"):
+            st.dataframe(curve.assign(**{"Shelf Rows": range(1, len(curve) + 1)}).set_index("Shelf Rows"))
+
+# --- 🧪 What-if price scenarios: only the segments touched by staged changes are recomputed ---
+
+        st.header("🧪 What-if Price Scenarios")
+        st.caption("Stage new prices for a few SKUs; rows with the same scenario name form one scenario. "
+                   "Sales and volumes stay as uploaded.")
+        staged = st.data_editor(
+            pd.DataFrame({"Scenario": pd.Series(dtype=str), "SKU": pd.Series(dtype=str),
+                          "New Price": pd.Series(dtype=float)}),
+            num_rows="dynamic", key="scenario_changes", hide_index=True,
+        ).dropna()
+        if len(staged):
+            import scenario
+
+            scenario_base = result_cache.cache.get_or_compute(
+                ("scenario_base", analysis_key), lambda: scenario.ScenarioBase(context, thresholds))
+            prof.begin("Scenarios", rows=len(staged))
+            scenarios = {}
+            for label, changes in staged.groupby("Scenario", sort=False):
+                try:
+                    scenarios[label] = scenario_base.evaluate(dict(zip(changes["SKU"], changes["New Price"])))
+                except (KeyError, ValueError) as e:
+                    st.error(f"Scenario {label}: {e.args[0]}")
+            if scenarios:
+                st.subheader("Tier placement and API of the changed SKUs")
+                st.dataframe(pd.concat({label: s.api_changes() for label, s in scenarios.items()},
+                                       names=["Scenario"]).reset_index(level=0).round(3), hide_index=True)
+                compare_table = st.selectbox("Compare", ["tier_summary", "classification_summary", "brand_summary",
+                                                         "tier_class_matrix", "api"])
+                st.dataframe(scenario.side_by_side(scenario_base, scenarios, compare_table), hide_index=True)
+            prof.end()
+
+        st.header("📥 Export")
+        if st.button("Prepare Excel report"):
+            import report
+            results = {key: value for key, value in context.items() if key != "company_rows"}
+            results.update((name, table(name)) for name in engine.SUMMARY_TABLES)
+            st.download_button(
+                label="📥 Download Full Report (Excel)",
+                data=result_cache.cache.get_or_compute(("xlsx", analysis_key, currency_symbol),
+                                                       lambda: report.workbook_bytes(results, currency_symbol)),
+                file_name="ppa_report.xlsx",
+                mime=report.XLSX_MIME
+            )
+
+
+finish_profile()
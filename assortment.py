@@ -0,0 +1,145 @@
+"""Shelf assortment: which of our SKUs to keep within the shelf's SKU capacity.
+
+Each objective scores every SKU on its own (its sales, its growth, or
+whether it is our best SKU in a tier × classification cell where
+competitors sell), so the best keep-list for capacity k is simply the top
+k of one ranking once the constraints have been placed first:
+
+1. pinned SKUs (e.g. ones already on a shelf row),
+2. the best SKUs of each tier still short of ``min_per_tier``,
+3. everything else, best first.
+
+Ranking is one sort, so the keep-list and objective for every shelf
+configuration come from the same cumulative sums instead of one solve per
+configuration.
+"""
+import numpy as np
+import pandas as pd
+
+
+SKUS_PER_ROW = 3
+SHELF_FILL = 0.75
+
+OBJECTIVES = {
+    "Present Net Sales": "Sum of present net sales of the SKUs kept",
+    "Net Sales Growth": "Sum of present minus previous net sales of the SKUs kept",
+    "Competitive Coverage": "Tier × classification cells with competitor sales where we keep a SKU, "
+                            "biggest competitor cells first",
+}
+
+CELL_KEYS = ["Calculated Price Tier", "Classification"]
+
+
+def effective_capacity(shelf_rows, skus_per_row=SKUS_PER_ROW, fill=SHELF_FILL):
+    """SKUs a shelf holds in practice (the page's effective SKU capacity)."""
+    return shelf_rows * skus_per_row * fill
+
+
+def sku_slots(capacity):
+    """Whole SKUs that fit in a (possibly fractional) capacity."""
+    return max(int(np.floor(capacity + 1e-9)), 0)
+
+
+def competitor_cells(segments):
+    """Present competitor net sales per tier × classification cell that has competitor SKUs."""
+    comp = segments[segments["Is Competitor"] & (segments["SKU Count"] > 0)]
+    return comp.groupby(CELL_KEYS, sort=False, observed=True)["Present Net Sales"].sum().rename(
+        "Competitor Net Sales")
+
+
+def _scores(company_rows, objective, cells):
+    """(primary, secondary) sort keys per SKU, larger is better."""
+    present = np.nan_to_num(company_rows["Present Net Sales"].to_numpy(dtype="float64"))
+    previous = np.nan_to_num(company_rows["Previous Net Sales"].to_numpy(dtype="float64"))
+    if objective == "Present Net Sales":
+        return present, np.zeros(len(present))
+    if objective == "Net Sales Growth":
+        return present - previous, present
+    if objective == "Competitive Coverage":
+        if cells is None:
+            raise ValueError("Competitive Coverage needs the competitor cells (pass segments)")
+        keys = pd.MultiIndex.from_frame(company_rows[CELL_KEYS].astype(object))
+        weight = cells.reindex(keys).to_numpy(dtype="float64")
+        contested = ~np.isnan(weight)
+        # Only our best-selling SKU per contested cell adds coverage; the rest rank by sales
+        best = pd.Series(np.where(contested, present, -np.inf)).groupby(
+            [keys.get_level_values(0), keys.get_level_values(1)], sort=False, dropna=False
+        ).transform("idxmax").to_numpy()
+        covers = contested & (best == np.arange(len(present)))
+        return np.where(covers, weight, -np.inf), present
+    raise ValueError(f"objective must be one of {list(OBJECTIVES)}")
+
+
+def rank(company_rows, objective="Present Net Sales", min_per_tier=1, pinned=(), segments=None):
+    """Our SKUs in keep order: keeping the first k is the plan for a k-SKU shelf.
+
+    ``company_rows`` are our classified rows (engine.summary_context's
+    ``company_rows``); ``pinned`` is a collection of SKUs that must stay.
+    Adds Score, Covers Cell, Reason (Pinned / Tier minimum / Objective) and
+    Rank (1-based) columns.
+    """
+    if objective not in OBJECTIVES:
+        raise ValueError(f"objective must be one of {list(OBJECTIVES)}")
+    rows = company_rows.reset_index(drop=True)
+    cells = competitor_cells(segments) if segments is not None else None
+    primary, secondary = _scores(rows, objective, cells)
+
+    is_pinned = rows["SKU"].isin(list(pinned)).to_numpy()
+    tier = rows["Calculated Price Tier"].astype(object).to_numpy()
+    best_first = np.lexsort((-secondary, -primary))
+
+    # Within each tier, the position of every unpinned SKU in best-first order
+    ordered = pd.DataFrame({"tier": tier[best_first], "pinned": is_pinned[best_first]})
+    pinned_in_tier = ordered.groupby("tier", dropna=False)["pinned"].transform("sum").to_numpy()
+    unpinned_pos = ordered.assign(free=~ordered["pinned"]).groupby("tier", dropna=False)["free"].cumsum().to_numpy() - 1
+    tier_minimum = np.zeros(len(rows), dtype=bool)
+    tier_minimum[best_first] = ~ordered["pinned"].to_numpy() & (unpinned_pos < min_per_tier - pinned_in_tier)
+
+    priority = np.where(is_pinned, 0, np.where(tier_minimum, 1, 2))
+    order = np.lexsort((-secondary, -primary, priority))
+
+    ranked = rows.iloc[order].reset_index(drop=True)
+    ranked["Score"] = np.where(np.isfinite(primary[order]), primary[order], 0.0)
+    ranked["Covers Cell"] = np.isfinite(primary[order]) if objective == "Competitive Coverage" else False
+    ranked["Reason"] = np.array(["Pinned", "Tier minimum", "Objective"])[priority[order]]
+    ranked["Rank"] = np.arange(1, len(ranked) + 1)
+    return ranked
+
+
+def optimize(company_rows, capacity, objective="Present Net Sales", min_per_tier=1, pinned=(), segments=None):
+    """The SKUs to keep on a shelf of ``capacity`` SKUs, best first."""
+    ranked = rank(company_rows, objective, min_per_tier, pinned, segments)
+    return ranked.head(sku_slots(capacity))
+
+
+def capacity_curve(ranked, capacities, min_per_tier=1):
+    """Objective and constraint status for many shelf sizes from one ranking.
+
+    ``capacities`` are SKU capacities (possibly fractional, as from
+    effective_capacity). Each row reports what the top-k keep-list achieves.
+    """
+    capacities = np.asarray(capacities, dtype="float64")
+    slots = np.minimum(np.floor(capacities + 1e-9).astype(np.int64).clip(min=0), len(ranked))
+
+    present = np.concatenate([[0.0], np.cumsum(np.nan_to_num(ranked["Present Net Sales"].to_numpy(dtype="float64")))])
+    score = np.concatenate([[0.0], np.cumsum(ranked["Score"].to_numpy(dtype="float64"))])
+    covered = np.concatenate([[0], np.cumsum(ranked["Covers Cell"].to_numpy())])
+    # Tiers reaching the minimum: the k at which each tier's min_per_tier-th SKU arrives
+    tier_rank = ranked.groupby("Calculated Price Tier", dropna=False, observed=True).cumcount().to_numpy()
+    tiers_total = ranked["Calculated Price Tier"].nunique(dropna=False)
+    arrivals = np.sort(ranked["Rank"].to_numpy()[tier_rank == min_per_tier - 1]) if min_per_tier > 0 else np.zeros(tiers_total)
+    total_present = present[-1]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        kept_share = np.where(total_present != 0, present[slots] / total_present * 100, 0.0)
+    return pd.DataFrame({
+        "Capacity": capacities,
+        "SKUs Kept": slots,
+        "SKUs Dropped": len(ranked) - slots,
+        "Objective": score[slots],
+        "Present Net Sales Kept": present[slots],
+        "Our Sales Kept %": kept_share,
+        "Contested Cells Covered": covered[slots],
+        "Tiers Meeting Minimum": np.searchsorted(arrivals, slots, side="right"),
+        "Tiers": tiers_total,
+    })
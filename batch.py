@@ -0,0 +1,216 @@
+"""Headless batch runner: the full PPA pipeline for many markets at once.
+
+    python batch.py manifest.json --out reports --workers 4 [--format xlsx]
+
+The manifest lists one company / competitor file pair per market, plus
+thresholds, currency symbol and shelf rows (any of which can be set once
+under "defaults")::
+
+    {
+      "defaults": {"thresholds": {"Value": 0.13, "Mainstream": 0.17, "Premium": 1},
+                   "currency": "₹", "shelf_rows": 3},
+      "markets": [
+        {"name": "IN-RetailerA", "company": "in_a/company.csv", "competitor": "in_a/competitor.parquet"},
+        {"name": "ID-RetailerB", "company": "id_b/company.csv", "competitor": "id_b/scan.csv",
+         "stream_competitor": true, "thresholds": {"Value": 900, "Mainstream": 1400, "Premium": 4000}}
+      ]
+    }
+
+Markets run in a process pool. Each writes its own report directory; a
+failing market is recorded in batch_summary.json and does not stop the
+others. Report contents depend only on the inputs, never on timing or
+worker order.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import assortment
+import engine
+import ingest
+import report
+import validation
+
+
+DEFAULTS = {
+    "thresholds": {"Value": .13, "Mainstream": .17, "Premium": 1},
+    "currency": "₹",
+    "shelf_rows": 3,
+    "stream_competitor": False,
+}
+
+# Tables written for every market, in this order
+REPORT_TABLES = [
+    "classification_metrics", "tier_metrics", "sku_growth", "api",
+    "classification_summary", "tier_summary", "tier_class_matrix", "brand_summary",
+]
+
+
+def load_manifest(path):
+    with open(path, encoding="utf-8") as f:
+        manifest = json.load(f)
+    base = os.path.dirname(os.path.abspath(path))
+    defaults = {**DEFAULTS, **manifest.get("defaults", {})}
+    markets = []
+    for market in manifest["markets"]:
+        market = {**defaults, **market}
+        for key in ("company", "competitor"):
+            market[key] = os.path.join(base, market[key])
+        markets.append(market)
+    names = [safe_name(m["name"]) for m in markets]
+    if len(set(names)) != len(names):
+        raise ValueError("Market names in the manifest must be unique (after making them file-safe)")
+    return markets
+
+
+def safe_name(name):
+    return re.sub(r"[^A-Za-z0-9._-]+", "_", name).strip("_") or "market"
+
+
+def write_csv_report(results, directory):
+    os.makedirs(directory, exist_ok=True)
+    for name in REPORT_TABLES:
+        table = results[name]
+        table.to_csv(os.path.join(directory, f"{name}.csv"), index=table.index.name is not None)
+    report.sku_matrix_table(results["sku_matrix"]).to_csv(os.path.join(directory, "sku_matrix.csv"), index=False)
+
+
+def run_market(market, out_dir, report_format="csv"):
+    """Run one market end to end; never raises, failures come back as data."""
+    timings = {}
+    start = time.perf_counter()
+    try:
+        thresholds = engine.thresholds_from_cuts(market["thresholds"])
+        tier_names = list(market["thresholds"])
+
+        t = time.perf_counter()
+        company_df = ingest.load_file(market["company"], "company", tier_names=tier_names)
+        if market["stream_competitor"]:
+            # Reading the file is the streaming pass; only the aggregates are left to compute on
+            competitor_aggregates = ingest.stream_aggregates(market["competitor"], thresholds)
+        else:
+            competitor_df = ingest.load_file(market["competitor"], "competitor", tier_names=tier_names)
+        timings["ingest"] = time.perf_counter() - t
+
+        t = time.perf_counter()
+        if market["stream_competitor"]:
+            results = ingest.ppa_from_aggregates(company_df, competitor_aggregates, thresholds)
+        else:
+            results = engine.compute_ppa(company_df, competitor_df, thresholds)
+        timings["compute"] = time.perf_counter() - t
+
+        t = time.perf_counter()
+        report_dir = os.path.join(out_dir, safe_name(market["name"]))
+        if report_format == "xlsx":
+            os.makedirs(report_dir, exist_ok=True)
+            report.write_workbook(results, os.path.join(report_dir, "report.xlsx"), market["currency"])
+        else:
+            write_csv_report(results, report_dir)
+        with open(os.path.join(report_dir, "market.json"), "w", encoding="utf-8") as f:
+            json.dump({
+                "name": market["name"],
+                "thresholds": market["thresholds"],
+                "currency": market["currency"],
+                "shelf_rows": market["shelf_rows"],
+                "effective_sku_capacity": assortment.effective_capacity(market["shelf_rows"]),
+                "company_skus": int((~results["full_df"]["Is Competitor"]).sum()),
+                "total_present_sales": results["total_present_sales"],
+            }, f, indent=2, ensure_ascii=False, sort_keys=True)
+        timings["report"] = time.perf_counter() - t
+
+        status = {"name": market["name"], "status": "ok", "report": report_dir}
+    except validation.ValidationError as e:
+        # Bad input data: leave the row-level report where the market's report would be
+        report_dir = os.path.join(out_dir, safe_name(market["name"]))
+        os.makedirs(report_dir, exist_ok=True)
+        problems_path = os.path.join(report_dir, "data_problems.csv")
+        e.problems.to_csv(problems_path, index=False)
+        status = {"name": market["name"], "status": "failed", "error": f"invalid input: {e}",
+                  "problems": problems_path}
+    except Exception as e:
+        status = {
+            "name": market["name"],
+            "status": "failed",
+            "error": f"{type(e).__name__}: {e}",
+            "traceback": traceback.format_exc(),
+        }
+    timings["total"] = time.perf_counter() - start
+    status["seconds"] = {stage: round(seconds, 4) for stage, seconds in timings.items()}
+    return status
+
+
+def _died(market, error):
+    # The worker process itself died (e.g. out of memory)
+    return {"name": market["name"], "status": "failed", "error": f"{type(error).__name__}: {error}"}
+
+
+def _run_isolated(market, out_dir, report_format):
+    """run_market in a process of its own, so a crash takes down only this market."""
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        try:
+            return pool.submit(run_market, market, out_dir, report_format).result()
+        except Exception as e:
+            return _died(market, e)
+
+
+def run_batch(markets, out_dir, workers=None, report_format="csv"):
+    """Run all markets in a process pool; statuses come back in manifest order.
+
+    A worker that dies breaks the whole pool, failing every market still
+    pending in it. Those markets are rerun one process each, so only the
+    market that crashed is recorded as failed.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    if workers == 1:
+        return [run_market(market, out_dir, report_format) for market in markets]
+    statuses = [None] * len(markets)
+    interrupted = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(run_market, market, out_dir, report_format) for market in markets]
+        for i, future in enumerate(futures):
+            try:
+                statuses[i] = future.result()
+            except BrokenProcessPool:
+                interrupted.append(i)
+            except Exception as e:
+                statuses[i] = _died(markets[i], e)
+    if interrupted:
+        with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as threads:
+            reruns = threads.map(lambda i: _run_isolated(markets[i], out_dir, report_format), interrupted)
+            for i, status in zip(interrupted, reruns):
+                statuses[i] = status
+    return statuses
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the PPA analysis for every market in a manifest.")
+    parser.add_argument("manifest", help="JSON manifest of markets")
+    parser.add_argument("--out", default="reports", help="Output directory (one sub-directory per market)")
+    parser.add_argument("--format", choices=["csv", "xlsx"], default="csv",
+                        help="One CSV per table, or a single multi-sheet workbook per market")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    args = parser.parse_args(argv)
+
+    markets = load_manifest(args.manifest)
+    start = time.perf_counter()
+    statuses = run_batch(markets, args.out, args.workers, args.format)
+    elapsed = time.perf_counter() - start
+
+    with open(os.path.join(args.out, "batch_summary.json"), "w", encoding="utf-8") as f:
+        json.dump(statuses, f, indent=2, ensure_ascii=False)
+    failed = [s for s in statuses if s["status"] != "ok"]
+    for s in statuses:
+        line = f"{s['status']:>6}  {s['name']}  {s.get('seconds', {}).get('total', 0):.2f}s"
+        print(line if s["status"] == "ok" else f"{line}  {s['error']}")
+    print(f"{len(statuses) - len(failed)}/{len(statuses)} markets ok in {elapsed:.1f}s")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
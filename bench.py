@@ -0,0 +1,213 @@
+"""Stage-by-stage benchmark of the PPA pipeline on synthetic data.
+
+    python bench.py --rows 1000 100000 1000000 --repeat 3
+    python bench.py --compare                  # last two runs in bench_results.jsonl
+    python bench.py --compare RUN_A RUN_B --fail-over 1.2
+
+Each size gets a fresh synthetic dataset (see synthetic.py) written as CSV
+and Parquet, then every stage the page runs is timed, from ingest through
+tiering, segment metrics, API, scatter, the HTML matrices, brand BPS and
+the shelf assortment.
+The best of ``--repeat`` runs is kept per stage. Every run is appended to
+a JSONL file with the git commit and library versions, so runs from
+different days and machines can be compared.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import uuid
+
+import numpy as np
+import pandas as pd
+
+import assortment
+import engine
+import ingest
+import matrix_view
+import profiler
+import synthetic
+import tier_index
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+DEFAULT_ROWS = [1_000, 100_000]
+DEFAULT_RESULTS = "bench_results.jsonl"
+STAGES = [
+    "ingest_csv", "ingest_parquet", "combine", "ppw_index", "tiering", "segment_metrics",
+    "summarize", "api", "scatter", "html_matrix", "brand_bps", "assortment",
+]
+# Scatter is skipped above this many rows: a PNG of millions of points
+# measures matplotlib's hexbin, not this code
+SCATTER_MAX_ROWS = 2_000_000
+
+
+def run_metadata():
+    def _git(*args):
+        try:
+            return subprocess.run(["git", *args], cwd=HERE, capture_output=True, text=True,
+                                  check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    return {
+        "run_id": uuid.uuid4().hex[:12],
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "git_commit": _git("rev-parse", "--short", "HEAD"),
+        "git_dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def run_once(paths, thresholds, stages, currency_symbol="₹"):
+    """One pass over every stage; returns {stage: ms}."""
+    prof = profiler.Profiler(enabled=True)
+    wanted = set(stages)
+
+    with prof.stage("ingest_csv"):
+        company_df = ingest.load_file(paths["csv"]["company"])
+        competitor_df = ingest.load_file(paths["csv"]["competitor"], "competitor")
+    if "ingest_parquet" in wanted:
+        with prof.stage("ingest_parquet"):
+            ingest.load_file(paths["parquet"]["company"])
+            ingest.load_file(paths["parquet"]["competitor"], "competitor")
+
+    with prof.stage("combine"):
+        combined_df = engine.combine(company_df, competitor_df)
+    with prof.stage("ppw_index"):
+        index = tier_index.PPWIndex(combined_df)
+    with prof.stage("tiering"):
+        full_df = engine.classify(combined_df, thresholds)
+    with prof.stage("segment_metrics"):
+        segments = index.segments(thresholds)
+        index.tier_metrics(thresholds)
+    with prof.stage("summarize"):
+        results = engine.summarize(full_df, segments, thresholds, sketch=index.sketch)
+
+    tiers, classifications = results["tiers"], results["classifications"]
+    with prof.stage("api"):
+        engine.api_table(full_df[~full_df["Is Competitor"]], segments, classifications, tiers)
+    if "scatter" in wanted:
+        import plotting
+
+        with prof.stage("scatter"):
+            plotting.render_png(plotting.scatter_figure(full_df))
+    with prof.stage("html_matrix"):
+        classification_metrics, tier_metrics = matrix_view.format_segment_metrics(results, currency_symbol)
+        matrix_view.generate_dynamic_html(results["sku_matrix"], classification_metrics, tier_metrics,
+                                          classifications, tiers)
+        matrix_view.tier_class_matrix_html(results["tier_class_matrix"], classifications, tiers, currency_symbol)
+    with prof.stage("brand_bps"):
+        engine.brand_summary(segments, results["total_previous_sales"], results["total_present_sales"])
+    with prof.stage("assortment"):
+        ranked = assortment.rank(full_df[~full_df["Is Competitor"]], "Competitive Coverage", segments=segments)
+        assortment.capacity_curve(ranked, [assortment.effective_capacity(rows) for rows in range(1, 101)])
+
+    prof.close()
+    return {record["stage"]: record["ms"] for record in prof.records if record["stage"] in wanted}
+
+
+def bench_size(rows, repeat, stages, seed=0, classifications=4):
+    """Best and median ms per stage for one dataset size."""
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = {fmt: synthetic.write_dataset(os.path.join(tmp, fmt), rows, fmt, seed=seed,
+                                              classifications=classifications)
+                 for fmt in ("csv", "parquet")}
+        thresholds = engine.default_thresholds()
+        timings = [run_once(paths, thresholds, stages) for _ in range(repeat)]
+
+    company_rows = synthetic.company_rows_for(rows)
+    return [{
+        "rows": rows,
+        "company_rows": company_rows,
+        "stage": stage,
+        "best_ms": round(min(t[stage] for t in timings), 3),
+        "median_ms": round(statistics.median(t[stage] for t in timings), 3),
+    } for stage in STAGES if stage in timings[0]]
+
+
+def run(rows_list, repeat=3, stages=STAGES, seed=0, classifications=4, results_path=DEFAULT_RESULTS):
+    run_info = {**run_metadata(), "repeat": repeat, "seed": seed, "classifications": classifications, "results": []}
+    for rows in rows_list:
+        size_stages = [s for s in stages if s != "scatter" or rows <= SCATTER_MAX_ROWS]
+        size_results = bench_size(rows, repeat, size_stages, seed, classifications)
+        run_info["results"].extend(size_results)
+        for result in size_results:
+            print(f"{rows:>10,}  {result['stage']:<16} {result['best_ms']:>10.1f} ms")
+    with open(results_path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(run_info) + "\n")
+    print(f"run {run_info['run_id']} appended to {results_path}")
+    return run_info
+
+
+def load_runs(results_path=DEFAULT_RESULTS):
+    with open(results_path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def compare(old, new):
+    """Best-time ratio (new / old) for every stage and size both runs measured."""
+    old_ms = {(r["rows"], r["stage"]): r["best_ms"] for r in old["results"]}
+    rows = []
+    for r in new["results"]:
+        key = (r["rows"], r["stage"])
+        if key in old_ms:
+            ratio = r["best_ms"] / old_ms[key] if old_ms[key] else float("inf")
+            rows.append({"rows": r["rows"], "stage": r["stage"], "old_ms": old_ms[key],
+                         "new_ms": r["best_ms"], "ratio": round(ratio, 3)})
+    return pd.DataFrame(rows, columns=["rows", "stage", "old_ms", "new_ms", "ratio"])
+
+
+def _find_run(runs, run_id):
+    for run_info in runs:
+        if run_info["run_id"] == run_id:
+            return run_info
+    raise SystemExit(f"No run {run_id!r} in the results file")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark each PPA stage on synthetic data.")
+    parser.add_argument("--rows", type=int, nargs="+", default=DEFAULT_ROWS, help="Competitor rows per size")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--classifications", type=int, default=4)
+    parser.add_argument("--results", default=DEFAULT_RESULTS, help="JSONL file runs are appended to")
+    parser.add_argument("--compare", nargs="*", metavar="RUN_ID",
+                        help="Compare two runs (default: the last two) instead of benchmarking")
+    parser.add_argument("--fail-over", type=float, default=None,
+                        help="With --compare, exit 1 if any stage got slower by more than this ratio")
+    args = parser.parse_args(argv)
+
+    if args.compare is None:
+        run(args.rows, args.repeat, args.stages, args.seed, args.classifications, args.results)
+        return 0
+
+    runs = load_runs(args.results)
+    if len(args.compare) == 2:
+        old, new = (_find_run(runs, run_id) for run_id in args.compare)
+    elif not args.compare and len(runs) >= 2:
+        old, new = runs[-2], runs[-1]
+    else:
+        raise SystemExit("--compare takes two run ids, or none to compare the last two runs")
+    table = compare(old, new)
+    print(f"{old['run_id']} ({old['git_commit']}) -> {new['run_id']} ({new['git_commit']})")
+    print(table.to_string(index=False))
+    if args.fail_over is not None and (table["ratio"] > args.fail_over).any():
+        print(f"Regression: some stages are more than {args.fail_over}x slower")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
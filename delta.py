@@ -0,0 +1,387 @@
+"""Delta ingest: apply corrected, new or removed SKU rows to an analysed dataset.
+
+    python delta.py --company c.csv --competitor k.csv --competitor-delta fixes.csv --verify
+
+A delta file holds only the rows that changed, in the template columns,
+keyed by SKU, plus an optional Action column: insert, update, upsert (the
+default) or delete; a delete needs only the SKU. Updated rows are replaced
+in place, deleted rows dropped and inserted rows appended to their file,
+so the patched dataset is exactly the corrected file.
+
+Only the delta is parsed, validated and grouped. Columns an update does
+not change are shared with the analysed frames, changed ones are copied
+once, and deletes / inserts join contiguous slices. The PPW index shares
+its sorted arrays and layers the changed rows on top (PPWIndex.patched),
+so segment sums, brand shares and the competitor PPW averages behind the
+API table follow for any thresholds without re-reading, re-validating or
+re-sorting the full files. ``verify`` rebuilds everything from the patched
+rows and compares every table.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import engine
+import ingest
+import ppw_sketch
+import tier_index
+import validation
+
+
+CHANGE_COLS = ["File", "SKU", "Change", "Old Price", "New Price", "Old PPW", "New PPW"]
+
+
+class Delta:
+    """One validated delta file: rows to insert or update and SKUs to delete."""
+
+    def __init__(self, kind, upserts=None, deletes=None):
+        self.kind = kind
+        self.upserts = upserts if upserts is not None else pd.DataFrame(
+            columns=["SKU", validation.DELTA_ACTION_COL])
+        self.deletes = deletes if deletes is not None else pd.DataFrame(columns=["SKU"])
+
+    def __len__(self):
+        return len(self.upserts) + len(self.deletes)
+
+
+def read_delta(data, name=None, kind="company", tier_names=None):
+    """(upserts, deletes, problems) for uploaded delta bytes (CSV, Parquet or Arrow)."""
+    fmt = ingest.detect_format(name, data)
+    if fmt == "csv":
+        raw = ingest.parse_csv(data)
+    else:
+        raw = ingest.read_columnar(data, fmt, ingest.ANALYSIS_COLS + [validation.DELTA_ACTION_COL])
+    return validation.validate_delta(raw, kind, tier_names)
+
+
+def load_uploaded(uploaded_file, kind="company", cache=ingest.cache):
+    """(Delta, problems) for a Streamlit upload, cached on its content like full uploads."""
+    name = getattr(uploaded_file, "name", None)
+    upserts, deletes, problems = cache.get_or_load(
+        uploaded_file.getvalue(), lambda data: read_delta(data, name, kind), tag=("delta", kind))
+    return Delta(kind, upserts, deletes), problems
+
+
+def load_delta(path, kind="company", tier_names=None):
+    """Delta for a local file; raises validation.ValidationError on any error."""
+    with open(path, "rb") as f:
+        upserts, deletes, problems = read_delta(f.read(), os.path.basename(str(path)), kind, tier_names)
+    bad = validation.errors(problems)
+    if len(bad):
+        raise validation.ValidationError(
+            f"{os.path.basename(str(path))} has {len(bad):,} problem(s), first: row {bad['Row'].iloc[0]} "
+            f"{bad['Column'].iloc[0]}: {bad['Problem'].iloc[0]}", problems)
+    return Delta(kind, upserts, deletes)
+
+
+def _problem_rows(rows, skus, problem):
+    return pd.DataFrame({"Row": rows + 1, "SKU": skus, "Column": "SKU", "Value": skus,
+                         "Problem": problem, "Severity": "error"}, columns=validation.REPORT_COLS)
+
+
+def _plan(frame, delta, label):
+    """Where the delta lands in ``frame``, plus the change log.
+
+    Returns ``(upsert_at, delete_at, changes)``: the ``frame`` row each
+    upsert replaces (-1 for an insert) and the rows deleted. Raises validation.ValidationError if an insert names a SKU already in
+    ``frame`` or an update / delete one that is not.
+    """
+    upserts, deletes = delta.upserts, delta.deletes
+    wanted = set(upserts["SKU"].astype(str)) | set(deletes["SKU"].astype(str))
+    hits = np.flatnonzero(frame["SKU"].isin(list(wanted)).to_numpy()) if wanted else np.empty(0, np.int64)
+    found = dict(zip(frame["SKU"].iloc[hits].astype(str), hits))
+    upsert_at = np.array([found.get(sku, -1) for sku in upserts["SKU"].astype(str)], dtype=np.int64)
+    delete_at = np.array([found.get(sku, -1) for sku in deletes["SKU"].astype(str)], dtype=np.int64)
+
+    action = upserts[validation.DELTA_ACTION_COL].to_numpy(dtype=object)
+    problems = pd.concat([
+        _problem_rows(upserts.index[(action == "insert") & (upsert_at >= 0)].to_numpy(),
+                      upserts["SKU"][(action == "insert") & (upsert_at >= 0)].to_numpy(),
+                      "SKU is already in the dataset"),
+        _problem_rows(upserts.index[(action == "update") & (upsert_at < 0)].to_numpy(),
+                      upserts["SKU"][(action == "update") & (upsert_at < 0)].to_numpy(),
+                      "SKU is not in the dataset"),
+        _problem_rows(deletes.index[delete_at < 0].to_numpy(), deletes["SKU"][delete_at < 0].to_numpy(),
+                      "SKU is not in the dataset"),
+    ], ignore_index=True).sort_values("Row", kind="stable", ignore_index=True)
+    if len(problems):
+        raise validation.ValidationError(
+            f"{label} has {len(problems):,} problem(s), first: row {problems['Row'].iloc[0]} "
+            f"SKU {problems['SKU'].iloc[0]!r}: {problems['Problem'].iloc[0]}", problems)
+
+    updating = upsert_at >= 0
+    # Old values for updates and deletes, new ones for inserts and updates
+    old = frame.iloc[np.concatenate([upsert_at[updating], delete_at])][["Price", "Price per Wash"]]
+    before = np.full((len(upserts) + len(deletes), 2), np.nan)
+    before[np.concatenate([np.flatnonzero(updating), len(upserts) + np.arange(len(deletes))])] = old.to_numpy(
+        dtype="float64")
+    after = np.full_like(before, np.nan)
+    if len(upserts):
+        after[:len(upserts)] = upserts[["Price", "Price per Wash"]].to_numpy(dtype="float64")
+    changes = pd.DataFrame({
+        "File": label,
+        "SKU": np.concatenate([upserts["SKU"].to_numpy(dtype=object), deletes["SKU"].to_numpy(dtype=object)]),
+        "Change": np.concatenate([np.where(updating, "update", "insert"), np.full(len(deletes), "delete")]),
+        "Old Price": before[:, 0], "New Price": after[:, 0], "Old PPW": before[:, 1], "New PPW": after[:, 1],
+    }, columns=CHANGE_COLS)
+    return upsert_at, delete_at, changes
+
+
+def _lossless(values, dtype):
+    """``values`` in ``dtype`` when nothing is lost, so patched columns keep their compact dtype."""
+    try:
+        cast = values.astype(dtype)
+    except (TypeError, ValueError):
+        return values
+    same = np.array_equal(cast.to_numpy(dtype="float64"), values.to_numpy(dtype="float64"), equal_nan=True)
+    return cast if same else values
+
+
+def _conform(values, dtype):
+    """``values`` in a column's numeric ``dtype`` when nothing is lost; anything else as it is."""
+    if values.dtype == dtype or not (pd.api.types.is_numeric_dtype(dtype)
+                                     and pd.api.types.is_numeric_dtype(values.dtype)):
+        return values
+    return _lossless(values, dtype)
+
+
+def _codes(dtype, values):
+    """Codes of ``values`` in categorical ``dtype``, -1 for missing or unknown ones."""
+    # One isin scan of the categories, rather than building their hash table
+    # (seconds for a million SKUs) to look up a few values
+    values = pd.Index(values).astype(dtype.categories.dtype)
+    found = np.flatnonzero(dtype.categories.isin(values))
+    at = dtype.categories[found].get_indexer(values)
+    return np.append(found, -1)[at]
+
+
+def _with_categories(dtype, values):
+    """Categorical ``dtype`` plus any new categories in ``values``, appended so existing codes stay valid."""
+    values = pd.Index(values)
+    new = values[(_codes(dtype, values) < 0) & values.notna()].unique()
+    if not len(new):
+        return dtype
+    return pd.CategoricalDtype(dtype.categories.append(pd.Index(new, dtype=dtype.categories.dtype)), dtype.ordered)
+
+
+def _same(old, new):
+    old, new = old.to_numpy(dtype=object), new.to_numpy(dtype=object)
+    return bool(np.all((old == new) | (pd.isna(old) & pd.isna(new))))
+
+
+def _replaced(column, at, new, dtype=None):
+    """A copy of ``column`` with rows ``at`` set to ``new``; ``dtype`` is the (extended) categorical dtype."""
+    if dtype is not None:
+        codes = column.cat.codes.to_numpy().copy()
+        codes[at] = _codes(dtype, new)
+        return pd.Categorical.from_codes(codes, dtype=dtype)
+    values = column.array.astype(pd.concat([column.iloc[:0], new]).dtype, copy=True)  # widened like concat would
+    values[at] = new.array
+    return values
+
+
+def _splice(frame, at, rows, drop, inserts):
+    """``frame`` with rows ``at`` replaced by ``rows``, rows ``drop`` removed and, for each
+    ``(position, rows)`` of ``inserts`` (ascending), those rows put before that position.
+
+    Columns an update leaves unchanged stay shared with ``frame`` and a
+    changed column is copied once; rows are dropped or inserted by joining
+    contiguous slices, never by gathering every row. Categoricals are
+    spliced as codes; only new categories (inserted SKUs) make pandas
+    re-validate the category set.
+    """
+    inserts = [(position, new) for position, new in inserts if len(new)]
+    categorical = {col: frame[col].dtype for col in frame.columns if isinstance(frame[col].dtype, pd.CategoricalDtype)}
+    changed = {}
+    for col in frame.columns if len(at) else []:
+        new = rows[col].reset_index(drop=True)
+        if col not in categorical:
+            new = _conform(new, frame[col].dtype)
+        if not _same(frame[col].iloc[at], new):
+            changed[col] = new
+    # Only categoricals that take new values are looked up (SKU is never, on an update)
+    for col, dtype in categorical.items():
+        values = ([changed[col]] if col in changed else []) + [new[col] for _, new in inserts]
+        if values:
+            categorical[col] = _with_categories(dtype, pd.concat(values))
+    changed = {col: _replaced(frame[col], at, new, categorical.get(col)) for col, new in changed.items()}
+    if changed:
+        frame = frame.assign(**changed)
+    if not len(drop) and not inserts:
+        return frame
+
+    # Contiguous kept slices, with the inserted rows between them
+    drop = np.sort(np.asarray(drop, dtype=np.int64))
+    positions = np.array([position for position, _ in inserts], dtype=np.int64)
+    cuts = np.unique(np.concatenate([[0, len(frame)], drop, drop + 1, positions]))
+    dropped, pending, pieces = set(drop.tolist()), list(inserts), []
+    for start, stop in zip(cuts[:-1], cuts[1:]):
+        while pending and pending[0][0] == start:
+            pieces.append(pending.pop(0)[1])
+        if start not in dropped:
+            pieces.append((start, stop))
+    pieces.extend(new for _, new in pending)
+
+    plain = frame.drop(columns=list(categorical)) if categorical else frame
+    spliced = pd.concat([plain.iloc[piece[0]:piece[1]] if isinstance(piece, tuple) else
+                         piece[plain.columns].apply(lambda values: _conform(values, plain[values.name].dtype))
+                         for piece in pieces], ignore_index=True)
+    for col, dtype in categorical.items():
+        codes = frame[col].cat.codes.to_numpy()
+        spliced[col] = pd.Categorical.from_codes(np.concatenate([
+            codes[piece[0]:piece[1]] if isinstance(piece, tuple) else _codes(dtype, piece[col])
+            for piece in pieces]).astype(codes.dtype), dtype=dtype)
+    return spliced[list(frame.columns)]
+
+
+def _combined_rows(combined_df, rows, is_competitor):
+    return rows.assign(**{"Is Competitor": is_competitor}).reindex(columns=combined_df.columns)
+
+
+class Patched:
+    """A dataset after one company and / or competitor delta.
+
+    ``company_df`` / ``competitor_df`` are the patched validated frames,
+    ``combined_df`` and ``index`` their engine.combine frame and PPW index,
+    ``changes`` one row per inserted, updated or deleted SKU.
+    """
+
+    def __init__(self, company_df, competitor_df, combined_df, index, company_delta=None, competitor_delta=None):
+        company_delta = company_delta or Delta("company")
+        competitor_delta = competitor_delta or Delta("competitor")
+        company_at, company_drop, company_changes = _plan(company_df, company_delta, "Company")
+        competitor_at, competitor_drop, competitor_changes = _plan(competitor_df, competitor_delta, "Competitor")
+        self.changes = pd.concat([company_changes, competitor_changes], ignore_index=True)
+
+        def split(delta, upsert_at):
+            """(rows replaced, their new values, inserted rows)."""
+            upserts = delta.upserts.drop(columns=[validation.DELTA_ACTION_COL])
+            updating = upsert_at >= 0
+            return upsert_at[updating], upserts[updating], upserts[~updating]
+
+        company_at, company_rows, company_new = split(company_delta, company_at)
+        competitor_at, competitor_rows, competitor_new = split(competitor_delta, competitor_at)
+        self.company_df = _splice(company_df, company_at, company_rows.reindex(columns=company_df.columns),
+                                  company_drop, [(len(company_df), company_new.reindex(columns=company_df.columns))])
+        self.competitor_df = _splice(competitor_df, competitor_at, competitor_rows.reindex(columns=competitor_df.columns),
+                                     competitor_drop,
+                                     [(len(competitor_df), competitor_new.reindex(columns=competitor_df.columns))])
+
+        # The combined frame is company rows then competitor rows; new company rows go between the two
+        n_company = len(company_df)
+        at = np.concatenate([company_at, n_company + competitor_at])
+        drop = np.concatenate([company_drop, n_company + competitor_drop])
+        rows = pd.concat([_combined_rows(combined_df, company_rows, False),
+                          _combined_rows(combined_df, competitor_rows, True)], ignore_index=True)
+        company_new = _combined_rows(combined_df, company_new, False)
+        competitor_new = _combined_rows(combined_df, competitor_new, True)
+        self.combined_df = _splice(combined_df, at, rows, drop,
+                                   [(n_company, company_new), (len(combined_df), competitor_new)])
+
+        # The index trades the old versions of replaced and deleted rows for the new rows
+        self.index = index.patched(combined_df.iloc[np.concatenate([at, drop])],
+                                   pd.concat([rows, company_new, competitor_new], ignore_index=True))
+
+    def context(self, thresholds, tiers=None):
+        """engine.summary_context at ``thresholds``, straight from the patched index."""
+        return engine.summary_context(engine.classify(self.combined_df, thresholds), self.index.segments(thresholds),
+                                      thresholds, tiers, self.index.sketch)
+
+
+def apply(company_df, competitor_df, combined_df=None, index=None, company_delta=None, competitor_delta=None):
+    """Patched for the deltas; ``combined_df`` / ``index`` are built if not given. Inputs are never modified."""
+    if combined_df is None:
+        combined_df = engine.combine(company_df, competitor_df)
+    if index is None:
+        index = tier_index.PPWIndex(combined_df)
+    return Patched(company_df, competitor_df, combined_df, index, company_delta, competitor_delta)
+
+
+def _plain(frame):
+    frame = frame.reset_index() if frame.index.name is not None else frame
+    return frame.assign(**{col: frame[col].astype(object) for col in frame.columns
+                           if isinstance(frame[col].dtype, pd.CategoricalDtype)})
+
+
+def verify(patched, thresholds, rtol=1e-9):
+    """Every SUMMARY_TABLES table from ``patched`` against a full recompute of its rows.
+
+    Returns {table: difference}; empty means identical. Labels, counts and
+    row order must match exactly; sums may differ by float rounding
+    (``rtol``) because additions happen in a different order.
+    """
+    full_df = engine.classify(engine.combine(patched.company_df, patched.competitor_df), thresholds)
+    fresh = engine.summary_context(full_df, engine.segment_table(full_df), thresholds,
+                                   sketch=ppw_sketch.build(full_df))
+    context = patched.context(thresholds)
+    differences = {}
+    for name, build in engine.SUMMARY_TABLES.items():
+        expected, actual = build(fresh), build(context)
+        try:
+            if isinstance(expected, dict):
+                assert actual == expected, "cells differ"
+            else:
+                pd.testing.assert_frame_equal(_plain(actual), _plain(expected), check_dtype=False,
+                                              check_exact=False, rtol=rtol)
+        except AssertionError as e:
+            differences[name] = str(e)
+    return differences
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Apply company / competitor delta files to a dataset.")
+    parser.add_argument("--company", required=True, help="Full company file the deltas apply to")
+    parser.add_argument("--competitor", required=True, help="Full competitor file the deltas apply to")
+    parser.add_argument("--company-delta", help="Inserted / updated / deleted company SKU rows")
+    parser.add_argument("--competitor-delta", help="Inserted / updated / deleted competitor SKU rows")
+    parser.add_argument("--thresholds", help='JSON of upper cuts, e.g. {"Value": 0.13, "Mainstream": 0.17, "Premium": 1}')
+    parser.add_argument("--verify", action="store_true", help="Compare every table with a full recompute")
+    parser.add_argument("--out", help="Directory to write the patched company.csv / competitor.csv to")
+    args = parser.parse_args(argv)
+    thresholds = (engine.thresholds_from_cuts(json.loads(args.thresholds)) if args.thresholds
+                  else engine.default_thresholds())
+    tier_names = list(thresholds)
+
+    try:
+        t = time.perf_counter()
+        company_df = ingest.load_file(args.company, "company", tier_names=tier_names)
+        competitor_df = ingest.load_file(args.competitor, "competitor", tier_names=tier_names)
+        combined_df = engine.combine(company_df, competitor_df)
+        index = tier_index.PPWIndex(combined_df)
+        full_ms = (time.perf_counter() - t) * 1000
+
+        t = time.perf_counter()
+        company_delta = load_delta(args.company_delta, "company", tier_names) if args.company_delta else None
+        competitor_delta = (load_delta(args.competitor_delta, "competitor", tier_names)
+                            if args.competitor_delta else None)
+        patched = Patched(company_df, competitor_df, combined_df, index, company_delta, competitor_delta)
+        delta_ms = (time.perf_counter() - t) * 1000
+    except validation.ValidationError as e:
+        print(e, file=sys.stderr)
+        print(e.problems.head(20).to_string(index=False), file=sys.stderr)
+        return 1
+
+    counts = patched.changes.groupby(["File", "Change"]).size()
+    print(", ".join(f"{file} {change}: {count:,}" for (file, change), count in counts.items()) or "no changes")
+    print(f"full ingest {full_ms:,.0f} ms, delta {delta_ms:,.0f} ms")
+    if args.out:
+        os.makedirs(args.out, exist_ok=True)
+        patched.company_df.to_csv(os.path.join(args.out, "company.csv"), index=False)
+        patched.competitor_df.to_csv(os.path.join(args.out, "competitor.csv"), index=False)
+    if args.verify:
+        differences = verify(patched, thresholds)
+        for name in engine.SUMMARY_TABLES:
+            print(f"{name:<24} {'DIFFERS' if name in differences else 'identical'}")
+        for name, difference in differences.items():
+            print(f"\n{name}:\n{difference}", file=sys.stderr)
+        return 1 if differences else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,421 @@
+"""UI-free Price Pack Architecture compute engine.
+
+Everything the Streamlit page shows is derived here from a single grouped
+aggregation over (Classification, Calculated Price Tier, Is Competitor,
+Parent Brand), so the page only has to render the returned tables.
+"""
+import numpy as np
+import pandas as pd
+
+import ppw_sketch
+
+
+NUMERIC_COLS = [
+    "Price", "Number of Washes", "Previous Volume", "Present Volume",
+    "Previous Net Sales", "Present Net Sales", "Shelf Row"
+]
+
+CATEGORICAL_COLS = ["SKU", "Classification", "Parent Brand", "Price Tier", "Pack Size"]
+# Columns that hold small whole numbers in practice
+DOWNCAST_COLS = ["Number of Washes", "Shelf Row"]
+
+SEGMENT_KEYS = ["Classification", "Calculated Price Tier", "Is Competitor", "Parent Brand"]
+
+def default_thresholds(value_max=.13, mainstream_max=.17, premium_max=1):
+    return {
+        'Value': (0.0, value_max),
+        'Mainstream': (value_max, mainstream_max),
+        'Premium': (mainstream_max, premium_max)
+    }
+
+
+def thresholds_from_cuts(cuts):
+    """{tier: upper cut} (cheapest first) to the (lower, upper) thresholds dict."""
+    thresholds = {}
+    lower = 0.0
+    for name, upper in cuts.items():
+        thresholds[name] = (lower, float(upper))
+        lower = float(upper)
+    return thresholds
+
+
+OVERFLOW_TIER = 'Others'
+
+
+def tier_ladder(thresholds):
+    """Split a thresholds dict into (tier names, upper cut points), cheapest first.
+
+    Any number of tiers works; dict order is the order tiers are tested in.
+    """
+    names = list(thresholds)
+    cuts = [float(thresholds[name][1]) for name in names]
+    return names, cuts
+
+
+def assign_tiers(ppw, tier_names, cut_points, overflow=OVERFLOW_TIER, invalid=None):
+    """Vectorized tier binning for a whole PPW column in one call.
+
+    A value falls in the first tier whose cut point it does not exceed
+    (``ppw <= cut``), anything above the last cut goes to ``overflow``.
+    Cut points are tested in order like an if/elif chain, so a cut lower than
+    an earlier one can never be reached. NaN and ±inf PPW (missing price or
+    zero "Number of Washes") go to ``invalid``, which defaults to ``overflow``.
+    Returns a categorical with the ladder order as its categories.
+    """
+    tier_names = list(tier_names)
+    if len(tier_names) != len(cut_points):
+        raise ValueError("Need exactly one cut point per tier")
+    invalid = overflow if invalid is None else invalid
+
+    categories = tier_names + [t for t in dict.fromkeys([overflow, invalid]) if t not in tier_names]
+    values = np.asarray(ppw, dtype="float64")
+    # Running max turns first-match-wins into a sorted array for searchsorted
+    bounds = np.maximum.accumulate(np.asarray(cut_points, dtype="float64")) if tier_names else np.empty(0)
+    codes = np.searchsorted(bounds, values, side="left")
+    codes = np.where(codes < len(tier_names), codes, categories.index(overflow))
+    codes = np.where(np.isfinite(values), codes, categories.index(invalid))
+
+    tiers = pd.Categorical.from_codes(codes, categories=categories)
+    if isinstance(ppw, pd.Series):
+        return pd.Series(tiers, index=ppw.index, name="Calculated Price Tier")
+    return tiers
+
+
+def pct_change(curr, prev):
+    """Growth % with the app's convention of 0 when there is no base."""
+    curr = np.asarray(curr, dtype="float64")
+    prev = np.asarray(prev, dtype="float64")
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(prev != 0, (curr - prev) / prev * 100, 0.0)
+
+
+def pct_share(part, total):
+    part = np.asarray(part, dtype="float64")
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return part / total * 100 if total else np.zeros_like(part)
+
+
+def clean_numeric(df: pd.DataFrame) -> pd.DataFrame:
+    """Coerce the numeric template columns present and add Price per Wash."""
+    df = df.copy()
+    numeric_cols = [col for col in NUMERIC_COLS if col in df.columns]
+    df[numeric_cols] = df[numeric_cols].apply(pd.to_numeric, errors="coerce")
+    df["Price per Wash"] = df["Price"] / df["Number of Washes"]
+    return df
+
+
+def combine(company_df, competitor_df):
+    """The one combined company + competitor frame for a dataset, in compact dtypes.
+
+    Built once per upload pair and shared read-only by every section; text
+    columns become categoricals and small integer-valued columns are
+    downcast. Sales, volumes and Price per Wash stay float64 so sums and
+    tier boundaries are unchanged.
+    """
+    full_df = pd.concat([
+        company_df.assign(**{"Is Competitor": False}),
+        competitor_df.assign(**{"Is Competitor": True}),
+    ], ignore_index=True)
+    for col in CATEGORICAL_COLS:
+        if col in full_df.columns:
+            full_df[col] = full_df[col].astype("category")
+    for col in DOWNCAST_COLS:
+        if col in full_df.columns:
+            full_df[col] = _downcast(full_df[col])
+    return full_df
+
+
+def _downcast(values):
+    if values.isna().any() or not np.all(np.mod(values.to_numpy(dtype="float64"), 1) == 0):
+        return values.astype("float32")
+    return pd.to_numeric(values, downcast="integer")
+
+
+def classify(full_df, thresholds):
+    """Add Calculated Price Tier to a combined frame.
+
+    Only the new column is materialized; with pandas copy-on-write the
+    existing columns are shared with ``full_df``, not copied.
+    """
+    names, cuts = tier_ladder(thresholds)
+    return full_df.assign(**{"Calculated Price Tier": assign_tiers(full_df["Price per Wash"], names, cuts)})
+
+
+def segment_table(full_df: pd.DataFrame) -> pd.DataFrame:
+    """The one grouped pass every other table is rolled up from."""
+    return (
+        full_df.groupby(SEGMENT_KEYS, dropna=False, sort=False, observed=True)
+        .agg(**{
+            "Previous Net Sales": ("Previous Net Sales", "sum"),
+            "Present Net Sales": ("Present Net Sales", "sum"),
+            "Previous Volume": ("Previous Volume", "sum"),
+            "Present Volume": ("Present Volume", "sum"),
+            "PPW Sum": ("Price per Wash", "sum"),
+            "PPW Count": ("Price per Wash", "count"),
+            "PPW Min": ("Price per Wash", "min"),
+            "PPW Max": ("Price per Wash", "max"),
+            "SKU Count": ("Price per Wash", "size"),
+        })
+        .reset_index()
+    )
+
+
+def merge_segments(*tables):
+    """Fold partial segment tables (file chunks, company + competitor) into one.
+
+    Sums and counts add up and min/max stay min/max, so the result matches a
+    single segment_table over the concatenated rows.
+    """
+    tables = [t for t in tables if t is not None and len(t)]
+    if not tables:
+        return None
+    if len(tables) == 1:
+        return tables[0]
+    return (
+        pd.concat(tables, ignore_index=True)
+        .groupby(SEGMENT_KEYS, dropna=False, sort=False, observed=True)
+        .agg(**{
+            "Previous Net Sales": ("Previous Net Sales", "sum"),
+            "Present Net Sales": ("Present Net Sales", "sum"),
+            "Previous Volume": ("Previous Volume", "sum"),
+            "Present Volume": ("Present Volume", "sum"),
+            "PPW Sum": ("PPW Sum", "sum"),
+            "PPW Count": ("PPW Count", "sum"),
+            "PPW Min": ("PPW Min", "min"),
+            "PPW Max": ("PPW Max", "max"),
+            "SKU Count": ("SKU Count", "sum"),
+        })
+        .reset_index()
+    )
+
+
+def _rollup(segments, keys):
+    return segments.groupby(keys, sort=False, observed=True).agg(**{
+        "Previous Net Sales": ("Previous Net Sales", "sum"),
+        "Present Net Sales": ("Present Net Sales", "sum"),
+        "PPW Sum": ("PPW Sum", "sum"),
+        "PPW Count": ("PPW Count", "sum"),
+        "PPW Min": ("PPW Min", "min"),
+        "PPW Max": ("PPW Max", "max"),
+        "SKU Count": ("SKU Count", "sum"),
+    })
+
+
+def _metrics(segments, key, order, total_present, quantiles=None):
+    """Growth / share / PPW range per classification or tier.
+
+    Growth compares the segment's total present sales with our previous
+    sales; SKUs with no previous volume or sales contribute nothing to the
+    base either way. ``quantiles`` (from ppw_quantiles, indexed by ``key``)
+    adds the PPW P10 / Median / P90 columns.
+    """
+    total = _rollup(segments, [key]).reindex(order)
+    ours = _rollup(segments[~segments["Is Competitor"]], [key]).reindex(order)
+    prev = ours["Previous Net Sales"].fillna(0)
+    curr = total["Present Net Sales"].fillna(0)
+    columns = {
+        "Growth": pct_change(curr, prev),
+        "Share": pct_share(curr, total_present),
+        "PPW Min": total["PPW Min"],
+        "PPW Max": total["PPW Max"],
+    }
+    if quantiles is not None:
+        quantiles = quantiles.reindex(order)
+        columns.update((label, quantiles[label].to_numpy(dtype="float64")) for label in ppw_sketch.QUANTILES)
+    columns["SKU Count"] = total["SKU Count"].fillna(0).astype(int)
+    return pd.DataFrame(columns, index=pd.Index(order, name=key))
+
+
+def tier_metrics(segments, tiers, total_present, quantiles=None):
+    return _metrics(segments, "Calculated Price Tier", tiers, total_present, quantiles)
+
+
+def ppw_quantiles(sketch, thresholds, by):
+    """PPW P10 / Median / P90 per ``by`` keys from a ppw_sketch sketch.
+
+    ``by`` may include Calculated Price Tier: each bucket is tiered by the
+    PPW it stands for, so no row is re-read for a new threshold set.
+    """
+    names, cuts = tier_ladder(thresholds)
+    tiered = sketch.assign(**{
+        "Calculated Price Tier": assign_tiers(ppw_sketch.bucket_values(sketch["Bucket"]), names, cuts)
+    })
+    return ppw_sketch.quantiles(tiered, by)
+
+
+def _context_quantiles(context, key):
+    if context.get("ppw_sketch") is None:
+        return None
+    return ppw_quantiles(context["ppw_sketch"], context["thresholds"], [key])
+
+
+def _sales_summary(segments, key, order, total_present):
+    rolled = _rollup(segments, [key]).reindex(order)
+    prev = rolled["Previous Net Sales"].fillna(0)
+    curr = rolled["Present Net Sales"].fillna(0)
+    return pd.DataFrame({
+        key: order,
+        "Sales Value Growth %": pct_change(curr, prev),
+        "Value Share %": pct_share(curr, total_present),
+    })
+
+
+def sku_matrix(company_df, classifications, tiers):
+    """Our SKUs per tier × classification cell, in upload order.
+
+    Sparse: {tier: {classification: [SKU, ...]}} holding only cells that
+    have SKUs, tiers and classifications in the given order.
+    """
+    cells = company_df[
+        company_df["Calculated Price Tier"].isin(tiers) & company_df["Classification"].isin(classifications)
+    ]
+    found = {key: skus.tolist() for key, skus in
+             cells.groupby(["Calculated Price Tier", "Classification"], sort=False, observed=True)["SKU"]}
+    tier_pos = {tier: i for i, tier in enumerate(tiers)}
+    cls_pos = {cls: i for i, cls in enumerate(classifications)}
+    matrix = {}
+    for tier, cls in sorted(found, key=lambda key: (tier_pos[key[0]], cls_pos[key[1]])):
+        matrix.setdefault(tier, {})[cls] = found[(tier, cls)]
+    return matrix
+
+
+def sku_growth(company_df: pd.DataFrame) -> pd.DataFrame:
+    return pd.DataFrame({
+        "SKU": company_df["SKU"].to_numpy(),
+        "Previous Volume": company_df["Previous Volume"].to_numpy(),
+        "Present Volume": company_df["Present Volume"].to_numpy(),
+        "Volume Growth %": pct_change(company_df["Present Volume"], company_df["Previous Volume"]),
+        "Previous Net Sales": company_df["Previous Net Sales"].to_numpy(),
+        "Present Net Sales": company_df["Present Net Sales"].to_numpy(),
+        "Net Sales Growth %": pct_change(company_df["Present Net Sales"], company_df["Previous Net Sales"]),
+    })
+
+
+def api_table(company_rows, segments, classifications, tiers):
+    """Each of our SKUs against the average competitor PPW of its segment."""
+    comp = _rollup(segments[segments["Is Competitor"]], ["Classification", "Calculated Price Tier"])
+    comp = comp[comp["SKU Count"] > 0]
+    comp_avg = (comp["PPW Sum"] / comp["PPW Count"]).rename("Avg Competitor PPW").reset_index()
+
+    ours = company_rows[["Classification", "Calculated Price Tier", "SKU", "Price per Wash"]]
+    ours = ours.reset_index(drop=True).rename_axis("_row").reset_index()
+    api = ours.merge(comp_avg, on=["Classification", "Calculated Price Tier"], how="inner")
+    api = api[api["Classification"].isin(classifications) & api["Calculated Price Tier"].isin(tiers)].copy()
+
+    # Same ordering as the page always used: classification, tier, upload order
+    api["_cls"] = pd.Categorical(api["Classification"], categories=classifications).codes
+    api["_tier"] = pd.Categorical(api["Calculated Price Tier"], categories=tiers).codes
+    api = api.sort_values(["_cls", "_tier", "_row"])
+
+    avg = api["Avg Competitor PPW"].to_numpy(dtype="float64")
+    ppw = api["Price per Wash"].to_numpy(dtype="float64")
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = np.where(avg != 0, ppw / avg, np.nan)
+    return pd.DataFrame({
+        "Classification": api["Classification"].to_numpy(),
+        "Price Tier": api["Calculated Price Tier"].to_numpy(),
+        "Our SKU": api["SKU"].to_numpy(),
+        "Our PPW": ppw,
+        "Avg Competitor PPW": avg,
+        "API (Our / Comp)": ratio,
+    })
+
+
+def tier_class_matrix(segments, classifications, tiers):
+    """Total sales, our share and growth for each tier × classification cell."""
+    keys = ["Calculated Price Tier", "Classification"]
+    total = _rollup(segments, keys)
+    ours = _rollup(segments[~segments["Is Competitor"]], keys)["Present Net Sales"]
+    cells = pd.MultiIndex.from_product([tiers, classifications], names=keys)
+    total = total.reindex(cells)
+    our_present = ours.reindex(cells).fillna(0)
+    present = total["Present Net Sales"]
+    previous = total["Previous Net Sales"]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        share = np.where(present.fillna(0) != 0, our_present / present * 100, 0.0)
+    return pd.DataFrame({
+        "Present Net Sales": present,
+        "Previous Net Sales": previous,
+        "Our Present Net Sales": our_present,
+        "Share %": share,
+        "Growth %": pct_change(present.fillna(0), previous.fillna(0)),
+        "Has SKUs": total["SKU Count"].fillna(0) > 0,
+    }, index=cells).reset_index()
+
+
+def brand_summary(segments, total_previous, total_present):
+    brands = _rollup(segments.dropna(subset=["Parent Brand"]), ["Parent Brand"]).sort_index()
+    prev_share = pct_share(brands["Previous Net Sales"], total_previous)
+    curr_share = pct_share(brands["Present Net Sales"], total_present)
+    summary = pd.DataFrame({
+        "Parent Brand": brands.index.to_numpy(),
+        "Previous Share %": prev_share,
+        "Current Share %": curr_share,
+        "BPS Change": (curr_share - prev_share) * 100,  # Basis Points
+    })
+    return summary.sort_values(by="Current Share %", ascending=False, kind="stable").reset_index(drop=True)
+
+
+def compute_ppa(company_df, competitor_df, thresholds, tiers=None):
+    """Run the whole analysis for cleaned company / competitor frames.
+
+    ``thresholds`` may hold any number of tiers; by default they are shown
+    most expensive first. Returns a dict of plain pandas objects; nothing
+    here touches Streamlit.
+    """
+    full_df = classify(combine(company_df, competitor_df), thresholds)
+    return summarize(full_df, segment_table(full_df), thresholds, tiers, ppw_sketch.build(full_df))
+
+
+def summary_context(full_df, segments, thresholds, tiers=None, sketch=None):
+    """The shared inputs every table in SUMMARY_TABLES is built from.
+
+    ``sketch`` (ppw_sketch.build over every row) adds PPW quantiles to the
+    classification and tier metrics.
+    """
+    tiers = list(tiers or reversed(tier_ladder(thresholds)[0]))
+    return {
+        "full_df": full_df,
+        "segments": segments,
+        "ppw_sketch": sketch,
+        "thresholds": thresholds,
+        "classifications": sorted(segments["Classification"].dropna().unique()),
+        "tiers": tiers,
+        "total_previous_sales": float(segments["Previous Net Sales"].sum()),
+        "total_present_sales": float(segments["Present Net Sales"].sum()),
+        "company_rows": full_df[~full_df["Is Competitor"]],
+    }
+
+
+# Every table is independent of the others given the context, so callers
+# can build any subset, in any order or concurrently
+SUMMARY_TABLES = {
+    "classification_metrics": lambda c: _metrics(
+        c["segments"], "Classification", c["classifications"], c["total_present_sales"],
+        _context_quantiles(c, "Classification")),
+    "tier_metrics": lambda c: tier_metrics(
+        c["segments"], c["tiers"], c["total_present_sales"], _context_quantiles(c, "Calculated Price Tier")),
+    "sku_matrix": lambda c: sku_matrix(c["company_rows"], c["classifications"], c["tiers"]),
+    "sku_growth": lambda c: sku_growth(c["company_rows"]),
+    "api": lambda c: api_table(c["company_rows"], c["segments"], c["classifications"], c["tiers"]),
+    "classification_summary": lambda c: _sales_summary(
+        c["segments"], "Classification", c["classifications"], c["total_present_sales"]),
+    "tier_summary": lambda c: _sales_summary(
+        c["segments"], "Calculated Price Tier", c["tiers"], c["total_present_sales"]
+    ).rename(columns={"Calculated Price Tier": "Price Tier"}),
+    "tier_class_matrix": lambda c: tier_class_matrix(c["segments"], c["classifications"], c["tiers"]),
+    "brand_summary": lambda c: brand_summary(c["segments"], c["total_previous_sales"], c["total_present_sales"]),
+}
+
+
+def summarize(full_df, segments, thresholds, tiers=None, sketch=None):
+    """Build every table from the segment aggregates plus our own SKU rows.
+
+    ``full_df`` only needs our (non-competitor) rows, which is what lets
+    competitor data arrive pre-aggregated from a streamed ingest (with
+    ``sketch`` covering the competitor rows too).
+    """
+    context = summary_context(full_df, segments, thresholds, tiers, sketch)
+    results = {key: value for key, value in context.items() if key != "company_rows"}
+    results.update((name, build(context)) for name, build in SUMMARY_TABLES.items())
+    return results
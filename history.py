@@ -0,0 +1,356 @@
+"""Append-only, file-based history of monthly company / competitor files.
+
+    python history.py append STORE --period 2025-01 --company c.csv --competitor k.csv
+    python history.py series STORE --by "Parent Brand" --start 2023-01 --end 2025-12
+    python history.py compare STORE 2024-01:2024-03 2025-01:2025-03 --by Classification
+    python history.py ppw STORE --start 2025-01 --end 2025-03 --by Classification "Calculated Price Tier"
+
+Each append writes three immutable Parquet parts under the period and adds
+one line to ``manifest.jsonl``; nothing is ever rewritten. Re-appending a
+period (a corrected file) supersedes the earlier part for that period.
+
+- ``segments/``: the period's segment table (engine.segment_table:
+  Classification × tier × competitor flag × Parent Brand sums), a few
+  thousand rows per month. Brand, classification and tier series, shares
+  and BPS changes are answered from these alone.
+- ``rows/``: the period's SKU rows sorted by SKU, so a SKU lookup reads
+  only the row groups whose SKU range can match.
+- ``sketches/``: the period's PPW sketch (ppw_sketch.build). Sketches of
+  any months merge into PPW quantiles for the whole range, tiered with
+  whatever thresholds the query asks for.
+
+Each period's values are its file's "Present" sales and volume. Tiers are
+assigned with the thresholds given at append time, which the manifest
+records per part.
+"""
+import argparse
+import datetime
+import json
+import os
+import sys
+import threading
+import uuid
+
+import numpy as np
+import pandas as pd
+
+import engine
+import ingest
+import ppw_sketch
+
+
+MANIFEST = "manifest.jsonl"
+ROW_GROUP_SIZE = 64_000
+
+ROW_COLS = ["SKU", "Classification", "Parent Brand", "Is Competitor", "Calculated Price Tier", "Price per Wash",
+            "Previous Net Sales", "Present Net Sales", "Previous Volume", "Present Volume"]
+GROUP_COLS = ["Classification", "Calculated Price Tier", "Is Competitor", "Parent Brand"]
+MEASURES = {"Net Sales": "Present Net Sales", "Volume": "Present Volume"}
+
+
+def _plain_text(frame):
+    # Categoricals would be stored per part with their own dictionaries; plain text concatenates cleanly
+    frame = frame.copy()
+    for col in ["SKU", "Classification", "Parent Brand", "Calculated Price Tier"]:
+        if col in frame.columns:
+            frame[col] = frame[col].astype(object).where(frame[col].notna(), None)
+    return frame
+
+
+def period_key(period):
+    """'YYYY-MM' for anything pandas reads as a month ('2025-1', '2025-01-31', a Timestamp)."""
+    return str(pd.Period(period, freq="M"))
+
+
+def period_range(spec):
+    """(start, end) period keys from 'YYYY-MM', 'YYYY-MM:YYYY-MM' or a (start, end) pair."""
+    if isinstance(spec, str):
+        spec = spec.split(":") if ":" in spec else (spec, spec)
+    start, end = spec
+    return period_key(start), period_key(end)
+
+
+class HistoryStore:
+    """One store directory; cheap to construct, safe to share between threads."""
+
+    def __init__(self, root):
+        self.root = root
+        self._lock = threading.Lock()
+        self._segments = {}  # part file -> frame; parts never change once written
+        self._sketches = {}
+
+    # --- Writing ---
+
+    def append(self, period, company_df, competitor_df, thresholds=None):
+        """Store one period's validated company / competitor frames; returns the manifest entry."""
+        period = period_key(period)
+        thresholds = thresholds or engine.default_thresholds()
+        full_df = engine.classify(engine.combine(company_df, competitor_df), thresholds)
+        segments = _plain_text(engine.segment_table(full_df))
+        rows = _plain_text(full_df[ROW_COLS]).sort_values("SKU", kind="stable", ignore_index=True)
+        sketch = _plain_text(ppw_sketch.build(full_df))
+
+        part = f"{period}/{datetime.datetime.now(datetime.timezone.utc):%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+        entry = {
+            "period": period,
+            "part": part,
+            "segments": f"segments/{part}.parquet",
+            "rows": f"rows/{part}.parquet",
+            "sketch": f"sketches/{part}.parquet",
+            "thresholds": {name: [float(lower), float(upper)] for name, (lower, upper) in thresholds.items()},
+            "company_skus": int((~full_df["Is Competitor"]).sum()),
+            "competitor_skus": int(full_df["Is Competitor"].sum()),
+            "written_at": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        }
+        # Parts first, manifest line last: a crash leaves at most an unreferenced file
+        self._write(segments, entry["segments"])
+        self._write(rows, entry["rows"], row_group_size=ROW_GROUP_SIZE)
+        self._write(sketch, entry["sketch"])
+        with self._lock, open(os.path.join(self.root, MANIFEST), "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, sort_keys=True) + "\n")
+        return entry
+
+    def append_files(self, period, company_path, competitor_path, thresholds=None):
+        tier_names = list(thresholds) if thresholds else None
+        return self.append(period, ingest.load_file(company_path, "company", tier_names=tier_names),
+                           ingest.load_file(competitor_path, "competitor", tier_names=tier_names), thresholds)
+
+    def _write(self, frame, relpath, **kwargs):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        path = os.path.join(self.root, relpath)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.tmp"
+        pq.write_table(pa.Table.from_pandas(frame, preserve_index=False), tmp, **kwargs)
+        os.replace(tmp, path)
+
+    # --- Reading ---
+
+    def manifest(self):
+        """The current part of every period (the latest append wins), oldest period first."""
+        path = os.path.join(self.root, MANIFEST)
+        if not os.path.exists(path):
+            return []
+        latest = {}
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    latest[entry["period"]] = entry
+        return [latest[period] for period in sorted(latest)]
+
+    def periods(self):
+        return [entry["period"] for entry in self.manifest()]
+
+    def _entries(self, start=None, end=None):
+        start = period_key(start) if start is not None else None
+        end = period_key(end) if end is not None else None
+        return [entry for entry in self.manifest()
+                if (start is None or entry["period"] >= start) and (end is None or entry["period"] <= end)]
+
+    def _read_segments(self, entry):
+        import pyarrow.parquet as pq
+
+        relpath = entry["segments"]
+        with self._lock:
+            cached = self._segments.get(relpath)
+        if cached is None:
+            cached = pq.read_table(os.path.join(self.root, relpath)).to_pandas()
+            cached.insert(0, "Period", entry["period"])
+            with self._lock:
+                self._segments[relpath] = cached
+        return cached
+
+    def _read_sketch(self, entry):
+        import pyarrow.parquet as pq
+
+        relpath = entry["sketch"]
+        with self._lock:
+            cached = self._sketches.get(relpath)
+        if cached is None:
+            cached = pq.read_table(os.path.join(self.root, relpath)).to_pandas()
+            with self._lock:
+                self._sketches[relpath] = cached
+        return cached
+
+    def segments(self, start=None, end=None, where=None):
+        """Segment rows for every stored period in [start, end], with a Period column.
+
+        ``where`` is {column: value or list of values}, e.g.
+        {"Is Competitor": False, "Classification": ["Liquid", "Powder"]}.
+        """
+        frames = [self._read_segments(entry) for entry in self._entries(start, end)]
+        if not frames:
+            return pd.DataFrame(columns=["Period"] + GROUP_COLS + list(MEASURES.values()))
+        segments = pd.concat(frames, ignore_index=True)
+        for col, value in (where or {}).items():
+            values = value if isinstance(value, (list, tuple, set)) else [value]
+            segments = segments[segments[col].isin(list(values))]
+        return segments
+
+    def series(self, by="Parent Brand", start=None, end=None, where=None, window=1, measure="Net Sales"):
+        """One row per period × ``by`` key: value, share % of the period and change vs ``window`` periods back.
+
+        With ``window`` > 1 values are rolling sums over that many months, so
+        growth compares e.g. the last three months with the three before.
+        Months missing from the store count as gaps, never as zero sales.
+        """
+        by = [by] if isinstance(by, str) else list(by)
+        segments = self.segments(start, end, where)
+        column = MEASURES[measure]
+        if segments.empty:
+            return pd.DataFrame(columns=["Period"] + by + [measure, "Share %", "Growth %", "BPS Change"])
+
+        wide = segments.pivot_table(index="Period", columns=by, values=column, aggfunc="sum", dropna=False)
+        months = pd.period_range(start or wide.index.min(), end or wide.index.max(), freq="M").astype(str)
+        stored = wide.index
+        wide = wide.reindex(months).fillna(0.0)
+        wide[~wide.index.isin(stored)] = np.nan
+        values = wide.rolling(window, min_periods=window).sum() if window > 1 else wide
+        totals = values.sum(axis=1, min_count=1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            share = values.div(totals, axis=0) * 100
+        before = values.shift(window)
+        growth = pd.DataFrame(engine.pct_change(values, before), index=values.index, columns=values.columns)
+        growth[before.isna() | values.isna()] = np.nan
+
+        out = pd.concat({measure: values, "Share %": share, "Growth %": growth,
+                         "BPS Change": (share - share.shift(window)) * 100}, axis=1)
+        out = out.stack(list(range(1, len(by) + 1))).rename_axis(["Period"] + by).reset_index()
+        return out.dropna(subset=[measure]).reset_index(drop=True)
+
+    def compare(self, before, after, by="Parent Brand", where=None, measure="Net Sales"):
+        """Share and BPS change per ``by`` key between two periods or period ranges.
+
+        ``before`` / ``after`` take 'YYYY-MM', 'YYYY-MM:YYYY-MM' or (start, end);
+        a range adds up its months. Same columns as the page's brand table,
+        plus the two totals and growth.
+        """
+        by = [by] if isinstance(by, str) else list(by)
+        column = MEASURES[measure]
+        totals = {}
+        for label, spec in (("Previous", before), ("Current", after)):
+            start, end = period_range(spec)
+            segments = self.segments(start, end, where)
+            totals[label] = segments.groupby(by, dropna=False)[column].sum()
+        table = pd.concat(totals, axis=1).fillna(0.0)
+        prev_share = engine.pct_share(table["Previous"], table["Previous"].sum())
+        curr_share = engine.pct_share(table["Current"], table["Current"].sum())
+        summary = pd.DataFrame({
+            f"Previous {measure}": table["Previous"].to_numpy(),
+            f"Current {measure}": table["Current"].to_numpy(),
+            "Growth %": engine.pct_change(table["Current"], table["Previous"]),
+            "Previous Share %": prev_share,
+            "Current Share %": curr_share,
+            "BPS Change": (curr_share - prev_share) * 100,  # Basis Points
+        }, index=table.index).reset_index()
+        return summary.sort_values(by="Current Share %", ascending=False, kind="stable").reset_index(drop=True)
+
+    def ppw_sketch(self, start=None, end=None, where=None):
+        """One PPW sketch for every stored period in [start, end]; None when nothing is stored.
+
+        ``where`` filters on Classification / Is Competitor like ``segments``.
+        """
+        sketches = [self._read_sketch(entry) for entry in self._entries(start, end) if "sketch" in entry]
+        sketch = ppw_sketch.merge(*sketches)
+        if sketch is None:
+            return None
+        for col, value in (where or {}).items():
+            values = value if isinstance(value, (list, tuple, set)) else [value]
+            sketch = sketch[sketch[col].isin(list(values))]
+        return sketch
+
+    def ppw_quantiles(self, by=("Classification",), start=None, end=None, where=None, thresholds=None):
+        """PPW P10 / Median / P90 per ``by`` over the whole range, without reading any rows.
+
+        Tiers (when ``by`` includes Calculated Price Tier) use ``thresholds``,
+        not the ones each month was appended with.
+        """
+        by = [by] if isinstance(by, str) else list(by)
+        sketch = self.ppw_sketch(start, end, where)
+        if sketch is None:
+            return pd.DataFrame(columns=by + list(ppw_sketch.QUANTILES) + ["PPW Sketch Count"])
+        return engine.ppw_quantiles(sketch, thresholds or engine.default_thresholds(), by).reset_index()
+
+    def sku_history(self, skus, start=None, end=None):
+        """Every stored row of the given SKUs, one per period; reads only matching row groups."""
+        import pyarrow.dataset as ds
+
+        entries = self._entries(start, end)
+        if not entries:
+            return pd.DataFrame(columns=["Period"] + ROW_COLS)
+        dataset = ds.dataset([os.path.join(self.root, entry["rows"]) for entry in entries], format="parquet")
+        frames = []
+        for entry, fragment in zip(entries, dataset.get_fragments()):
+            frame = fragment.to_table(filter=ds.field("SKU").isin([str(sku) for sku in skus])).to_pandas()
+            frame.insert(0, "Period", entry["period"])
+            frames.append(frame)
+        return pd.concat(frames, ignore_index=True).sort_values(["SKU", "Period"], kind="stable", ignore_index=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Append monthly files to, or query, a PPA history store.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    append = commands.add_parser("append", help="Store one month's company / competitor files")
+    append.add_argument("store")
+    append.add_argument("--period", required=True, help="Month, e.g. 2025-01")
+    append.add_argument("--company", required=True)
+    append.add_argument("--competitor", required=True)
+    append.add_argument("--thresholds", help='JSON of upper cuts, e.g. {"Value": 0.13, "Mainstream": 0.17, "Premium": 1}')
+
+    series = commands.add_parser("series", help="Per-month values, shares and growth")
+    series.add_argument("store")
+    series.add_argument("--by", default="Parent Brand", choices=GROUP_COLS)
+    series.add_argument("--start")
+    series.add_argument("--end")
+    series.add_argument("--window", type=int, default=1, help="Rolling months per value")
+
+    compare = commands.add_parser("compare", help="Share and BPS change between two months or ranges")
+    compare.add_argument("store")
+    compare.add_argument("before", help="YYYY-MM or YYYY-MM:YYYY-MM")
+    compare.add_argument("after", help="YYYY-MM or YYYY-MM:YYYY-MM")
+    compare.add_argument("--by", default="Parent Brand", choices=GROUP_COLS)
+
+    sku = commands.add_parser("sku", help="Stored rows of some SKUs across months")
+    sku.add_argument("store")
+    sku.add_argument("skus", nargs="+")
+
+    ppw = commands.add_parser("ppw", help="PPW P10 / median / P90 over a range of months")
+    ppw.add_argument("store")
+    ppw.add_argument("--by", nargs="+", default=["Classification"],
+                     choices=["Classification", "Calculated Price Tier", "Is Competitor"])
+    ppw.add_argument("--start")
+    ppw.add_argument("--end")
+    ppw.add_argument("--thresholds", help="JSON of upper cuts used to tier the sketch")
+
+    for command in (series, compare, sku, ppw):
+        command.add_argument("--out", help="Write CSV here instead of printing")
+    args = parser.parse_args(argv)
+
+    store = HistoryStore(args.store)
+    if args.command == "append":
+        thresholds = engine.thresholds_from_cuts(json.loads(args.thresholds)) if args.thresholds else None
+        entry = store.append_files(args.period, args.company, args.competitor, thresholds)
+        print(f"stored {entry['period']} as {entry['part']} "
+              f"({entry['company_skus']:,} company / {entry['competitor_skus']:,} competitor SKUs)")
+        return 0
+    if args.command == "series":
+        result = store.series(args.by, args.start, args.end, window=args.window)
+    elif args.command == "compare":
+        result = store.compare(args.before, args.after, args.by)
+    elif args.command == "ppw":
+        thresholds = engine.thresholds_from_cuts(json.loads(args.thresholds)) if args.thresholds else None
+        result = store.ppw_quantiles(args.by, args.start, args.end, thresholds=thresholds)
+    else:
+        result = store.sku_history(args.skus)
+    if args.out:
+        result.to_csv(args.out, index=False)
+    else:
+        print(result.to_string(index=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
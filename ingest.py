@@ -0,0 +1,354 @@
+"""Loading uploaded company / competitor files into cleaned frames.
+
+CSV, Parquet and Arrow IPC (Feather v2) files share the template schema.
+Every file goes through validation.validate, which types the columns and
+reports bad cells row by row. Validated frames are cached on the hash of
+the uploaded bytes plus ``SCHEMA_VERSION`` and the file kind, so a Streamlit rerun triggered by a threshold change or
+a dropdown pick does not re-parse files that have not changed.
+"""
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+import engine
+import ppw_sketch
+import validation
+
+
+# Bump whenever the cleaning below changes what a cached frame looks like
+SCHEMA_VERSION = 2
+
+
+DEFAULT_CHUNKSIZE = 250_000
+
+# Columns the analysis reads, in memory or streamed: what the segments sum plus
+# the uploaded Price Tier, which validation checks against the tier names.
+# Pack Size is never used, so columnar inputs skip it entirely.
+ANALYSIS_COLS = [
+    "SKU", "Price", "Number of Washes", "Classification", "Price Tier", "Parent Brand",
+    "Previous Volume", "Present Volume", "Previous Net Sales", "Present Net Sales", "Shelf Row"
+]
+
+COLUMNAR_SUFFIXES = {".parquet": "parquet", ".pq": "parquet", ".arrow": "arrow", ".feather": "arrow", ".ipc": "arrow"}
+UPLOAD_TYPES = ["csv", "parquet", "pq", "arrow", "feather", "ipc"]
+
+
+def content_key(data: bytes):
+    return hashlib.blake2b(data, digest_size=16).hexdigest(), SCHEMA_VERSION
+
+
+def parse_csv(data: bytes) -> pd.DataFrame:
+    return pd.read_csv(io.BytesIO(data))
+
+
+def _peek(data, size):
+    """First ``size`` bytes of a buffer or a binary handle; handles are left where they were."""
+    if not hasattr(data, "read"):
+        return bytes(data[:size])
+    position = data.tell()
+    try:
+        data.seek(0)
+        return data.read(size)
+    finally:
+        data.seek(position)
+
+
+def detect_format(name=None, data=None):
+    """'csv', 'parquet' or 'arrow' from the file suffix, else the magic bytes.
+
+    ``data`` is the file's bytes or an open binary handle, which is peeked
+    and seeked back rather than consumed.
+    """
+    if name:
+        suffix = os.path.splitext(str(name))[1].lower()
+        if suffix in COLUMNAR_SUFFIXES:
+            return COLUMNAR_SUFFIXES[suffix]
+        if suffix == ".csv":
+            return "csv"
+    if data is not None:
+        head = _peek(data, 6)
+        if head[:4] == b"PAR1":
+            return "parquet"
+        if head == b"ARROW1":
+            return "arrow"
+    return "csv"
+
+
+def _source_format(source):
+    """detect_format for a path, a buffer or an open binary handle."""
+    if isinstance(source, (str, os.PathLike)):
+        return detect_format(source)
+    return detect_format(getattr(source, "name", None), source)
+
+
+def _open_arrow_source(source):
+    import pyarrow as pa
+
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return pa.BufferReader(source)
+    if isinstance(source, (str, os.PathLike)):
+        # Zero-copy: pages are mapped, not read, and only touched columns fault in
+        return pa.memory_map(os.fspath(source), "r")
+    return source
+
+
+def _present(schema_names, columns):
+    return None if columns is None else [col for col in columns if col in schema_names]
+
+
+def read_columnar(source, fmt=None, columns=ANALYSIS_COLS) -> pd.DataFrame:
+    """Read the requested columns of a Parquet or Arrow IPC file, untyped as stored.
+
+    Columns missing from the file are skipped rather than failing here;
+    ``columns=None`` reads everything. Local paths are memory-mapped.
+    """
+    import pyarrow.ipc as ipc
+    import pyarrow.parquet as pq
+
+    if fmt is None:
+        fmt = _source_format(source)
+    handle = _open_arrow_source(source)
+    if fmt == "parquet":
+        parquet_file = pq.ParquetFile(handle)
+        table = parquet_file.read(columns=_present(parquet_file.schema_arrow.names, columns))
+    else:
+        reader = ipc.open_file(handle)
+        table = reader.read_all()
+        if columns is not None:
+            table = table.select(_present(table.schema.names, columns))
+    return table.to_pandas()
+
+
+def read_upload(data: bytes, name=None) -> pd.DataFrame:
+    fmt = detect_format(name, data)
+    if fmt == "csv":
+        return parse_csv(data)
+    return read_columnar(data, fmt)
+
+
+def parse_upload(data: bytes, name=None, kind="company"):
+    """(typed frame, problems report) for one uploaded file."""
+    return validation.validate(read_upload(data, name), kind)
+
+
+class IngestCache:
+    """Bounded LRU of parsed uploads keyed on (content hash, schema version, tag).
+
+    Cached frames are shared between reruns and sessions, so callers must
+    treat them as read-only (the engine always works on copies).
+    """
+
+    def __init__(self, max_entries=8, max_bytes=512 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self._lock = threading.Lock()
+
+    def get_or_load(self, data: bytes, parser=parse_csv, tag=None):
+        key = (*content_key(data), tag)
+        with self._lock:
+            if key in self._entries:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return self._entries[key]
+            self.misses += 1
+
+        df = parser(data)
+        with self._lock:
+            self._entries[key] = df
+            self._entries.move_to_end(key)
+            self._sizes[key] = _nbytes(df)
+            self._evict()
+        return df
+
+    def _evict(self):
+        # Always keep the newest entry, even if it alone is over the byte budget
+        while len(self._entries) > 1 and (
+            len(self._entries) > self.max_entries or sum(self._sizes.values()) > self.max_bytes
+        ):
+            key, _ = self._entries.popitem(last=False)
+            del self._sizes[key]
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "bytes": sum(self._sizes.values()),
+                "max_bytes": self.max_bytes,
+            }
+
+
+def _nbytes(value):
+    if isinstance(value, tuple):
+        return sum(_nbytes(item) for item in value)
+    return int(value.memory_usage(deep=True).sum())
+
+
+# One cache per server process, shared by every rerun
+cache = IngestCache()
+
+
+def load_file(path, kind="company", columns=ANALYSIS_COLS, tier_names=None) -> pd.DataFrame:
+    """Typed frame for a local CSV, Parquet or Arrow file (columnar files are memory-mapped).
+
+    Raises validation.ValidationError, carrying the per-row report, if the
+    file has any errors.
+    """
+    fmt = detect_format(path)
+    raw = pd.read_csv(path) if fmt == "csv" else read_columnar(path, fmt, columns)
+    return validation.check(raw, kind, tier_names, label=os.path.basename(str(path)))
+
+
+def upload_key(uploaded_file):
+    return content_key(uploaded_file.getvalue())
+
+
+def load_uploaded(uploaded_file, kind="company", cache=cache):
+    """(typed frame, problems) for a Streamlit upload (or any object with getvalue())."""
+    name = getattr(uploaded_file, "name", None)
+    return cache.get_or_load(uploaded_file.getvalue(), lambda data: parse_upload(data, name, kind), tag=kind)
+
+
+def _read_batches(source, fmt, chunksize):
+    """Columnar sources as pandas chunks, touching only the streamed columns."""
+    import pyarrow.ipc as ipc
+    import pyarrow.parquet as pq
+
+    handle = _open_arrow_source(source)
+    if fmt == "parquet":
+        parquet_file = pq.ParquetFile(handle)
+        batches = parquet_file.iter_batches(batch_size=chunksize,
+                                            columns=_present(parquet_file.schema_arrow.names, ANALYSIS_COLS))
+    else:
+        reader = ipc.open_file(handle)
+        present = _present(reader.schema.names, ANALYSIS_COLS)
+        batches = (reader.get_batch(i).select(present) for i in range(reader.num_record_batches))
+    for batch in batches:
+        yield batch.to_pandas()
+
+
+def _read_chunks(source, chunksize):
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    elif hasattr(source, "seek"):
+        source.seek(0)
+    # Only the columns the file has; validation reports missing required ones
+    return pd.read_csv(source, usecols=lambda col: col in ANALYSIS_COLS, chunksize=chunksize)
+
+
+def _validated(chunks, kind, tier_names, label):
+    """Chunks checked and typed by validation.validate, as the in-memory path does the whole file.
+
+    Rows are numbered across chunks and duplicate SKUs are caught across
+    chunks too (by 64-bit hash), so the file is rejected exactly when
+    validation.check would reject it; the ValidationError, with the full
+    report, is raised once every chunk has been checked.
+    """
+    reports, seen, start = [], np.empty(0, dtype=np.uint64), 0
+    for chunk in chunks:
+        frame, problems = validation.validate(chunk, kind, tier_names)
+        if problems["Row"].isna().any():
+            validation.raise_for_errors(problems, label)  # a required column is missing
+        hashes = pd.util.hash_array(frame["SKU"].to_numpy(dtype=object))
+        at = np.minimum(np.searchsorted(seen, hashes), max(len(seen) - 1, 0))
+        repeated = (seen[at] == hashes if len(seen) else np.zeros(len(hashes), dtype=bool)) \
+            & frame["SKU"].notna().to_numpy()
+        if repeated.any():
+            problems = pd.concat([problems, validation.duplicate_report(frame, repeated)], ignore_index=True)
+        seen = np.sort(np.concatenate([seen, hashes]), kind="stable")  # merges two sorted runs
+        reports.append(problems.assign(Row=problems["Row"] + start))
+        start += len(chunk)
+        yield frame
+    if reports:
+        validation.raise_for_errors(pd.concat(reports, ignore_index=True), label)
+
+
+def _chunk_aggregates(chunk, names, cuts, is_competitor):
+    chunk["Calculated Price Tier"] = engine.assign_tiers(chunk["Price per Wash"], names, cuts)
+    chunk["Is Competitor"] = is_competitor
+    return engine.segment_table(chunk), ppw_sketch.build(chunk)
+
+
+def stream_segments(source, thresholds, is_competitor=True, chunksize=DEFAULT_CHUNKSIZE):
+    """Segment aggregates for a CSV of any size, read ``chunksize`` rows at a time.
+
+    Each chunk is validated, tiered and grouped on its own and folded into
+    a running segment table, so peak memory is one chunk plus one row per
+    segment (and 8 bytes per SKU for the duplicate check).
+    Counts and min/max PPW match engine.segment_table over the whole file
+    exactly; sums match up to floating point summation order.
+    ``source`` is a path, an open binary file or raw bytes, holding CSV,
+    Parquet (streamed by record batch) or Arrow IPC.
+    """
+    return stream_aggregates(source, thresholds, is_competitor, chunksize)[0]
+
+
+def stream_aggregates(source, thresholds, is_competitor=True, chunksize=DEFAULT_CHUNKSIZE):
+    """(segments, PPW sketch) for a file of any size; see stream_segments.
+
+    The sketch (ppw_sketch.build) is folded chunk by chunk like the
+    segments and equals the one built over the whole file. Every chunk is
+    validated like an in-memory upload; a file with errors raises
+    validation.ValidationError instead of streaming bad cells as blanks.
+    """
+    names, cuts = engine.tier_ladder(thresholds)
+    kind = "competitor" if is_competitor else "company"
+    fmt = _source_format(source)
+    label = os.path.basename(str(source)) if isinstance(source, (str, os.PathLike)) else f"{kind} file"
+    if fmt != "csv":
+        return _fold(_validated(_read_batches(source, fmt, chunksize), kind, names, label), names, cuts,
+                     is_competitor)
+    with _read_chunks(source, chunksize) as reader:
+        return _fold(_validated(reader, kind, names, label), names, cuts, is_competitor)
+
+
+def _fold(chunks, names, cuts, is_competitor):
+    segments = sketch = None
+    for chunk in chunks:
+        chunk_segments, chunk_sketch = _chunk_aggregates(chunk, names, cuts, is_competitor)
+        segments = engine.merge_segments(segments, chunk_segments)
+        sketch = ppw_sketch.merge(sketch, chunk_sketch)
+    return segments, sketch
+
+
+def stream_ppa(company_df, competitor_source, thresholds, tiers=None, chunksize=DEFAULT_CHUNKSIZE):
+    """Full analysis with the competitor feed streamed instead of loaded.
+
+    Our own SKUs stay in memory (the SKU matrix, growth and API tables list
+    them row by row); competitors only contribute segment aggregates.
+    """
+    competitor_aggregates = stream_aggregates(competitor_source, thresholds, is_competitor=True, chunksize=chunksize)
+    return ppa_from_aggregates(company_df, competitor_aggregates, thresholds, tiers)
+
+
+def ppa_from_aggregates(company_df, competitor_aggregates, thresholds, tiers=None):
+    """stream_ppa's analysis, given the (segments, sketch) already streamed from the competitor file."""
+    company_df = company_df.copy()
+    names, cuts = engine.tier_ladder(thresholds)
+    company_df["Calculated Price Tier"] = engine.assign_tiers(company_df["Price per Wash"], names, cuts)
+    company_df["Is Competitor"] = False
+    competitor_segments, competitor_sketch = competitor_aggregates
+    segments = engine.merge_segments(engine.segment_table(company_df), competitor_segments)
+    sketch = ppw_sketch.merge(ppw_sketch.build(company_df), competitor_sketch)
+    return engine.summarize(company_df, segments, thresholds, tiers, sketch)
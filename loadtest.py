@@ -0,0 +1,183 @@
+"""Throughput and latency of the HTTP service under concurrent clients.
+
+    python loadtest.py --rows 100000 --clients 32 --requests 1000 --threshold-sets 8
+    python loadtest.py --url http://127.0.0.1:8765 --clients 64
+
+Without ``--url`` a service is started in this process on a free port.
+A synthetic dataset (see synthetic.py) is uploaded once, then clients
+fire /analysis requests cycling through ``--threshold-sets`` distinct
+threshold sets. Two phases are measured: "cold" (result cache cleared, so
+the first requests per threshold set compute and the identical ones
+arriving meanwhile coalesce) and "warm" (everything served from cache).
+Per phase: requests/s, p50 / p95 / p99 / max latency, status counts and
+how many lookups were coalesced. Runs are appended to a JSONL file with
+the same metadata as bench.py.
+"""
+import argparse
+import json
+import statistics
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import bench
+import result_cache
+import service
+import synthetic
+
+
+DEFAULT_RESULTS = "loadtest_results.jsonl"
+
+
+def _post(url, body, content_type="application/json", timeout=120):
+    request = urllib.request.Request(url, data=body, headers={"Content-Type": content_type}, method="POST")
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return response.status, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read()
+
+
+def _get(url, timeout=30):
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        return json.loads(response.read())
+
+
+def upload_dataset(base_url, rows, seed=0, classifications=4):
+    """Upload one synthetic company / competitor pair; returns their dataset ids."""
+    company_df, competitor_df = synthetic.generate(rows, seed, classifications)
+    ids = {}
+    for kind, frame in (("company", company_df), ("competitor", competitor_df)):
+        status, body = _post(f"{base_url}/datasets?kind={kind}", frame.to_csv(index=False).encode(), "text/csv")
+        if status != 200:
+            raise SystemExit(f"Uploading the {kind} dataset failed ({status}): {body[:500]!r}")
+        ids[kind] = json.loads(body)["dataset_id"]
+    return ids
+
+
+def threshold_sets(count, seed=0):
+    """``count`` distinct increasing (Value, Mainstream, Premium) cut sets around the defaults."""
+    rng = np.random.default_rng(seed)
+    sets = []
+    for i in range(count):
+        value = round(0.10 + 0.005 * i + rng.uniform(0, 0.004), 4)
+        mainstream = round(value + 0.03 + rng.uniform(0, 0.02), 4)
+        sets.append({"Value": value, "Mainstream": mainstream, "Premium": 1.0})
+    return sets
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) if values else float("nan")
+
+
+def run_phase(base_url, ids, thresholds, clients, requests, tables):
+    """Fire ``requests`` /analysis calls from ``clients`` threads; returns the phase summary."""
+    bodies = [json.dumps({**ids, "thresholds": cuts, "tables": tables}).encode() for cuts in thresholds]
+    latencies, statuses = [], Counter()
+    lock = threading.Lock()
+
+    def one(i):
+        start = time.perf_counter()
+        try:
+            status, _ = _post(f"{base_url}/analysis", bodies[i % len(bodies)])
+        except OSError:
+            status = "connection error"
+        elapsed = (time.perf_counter() - start) * 1000
+        with lock:
+            statuses[status] += 1
+            if status == 200:
+                latencies.append(elapsed)
+
+    before = _get(f"{base_url}/health")["cache"]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(clients) as pool:
+        list(pool.map(one, range(requests)))
+    wall = time.perf_counter() - start
+    after = _get(f"{base_url}/health")["cache"]
+    return {
+        "requests": requests,
+        "ok": statuses.get(200, 0),
+        "statuses": {str(status): count for status, count in statuses.items()},
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(requests / wall, 1) if wall else None,
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "max_ms": round(max(latencies), 2) if latencies else None,
+        "mean_ms": round(statistics.fmean(latencies), 2) if latencies else None,
+        "computed": after["misses"] - before["misses"],
+        "coalesced": after["coalesced"] - before["coalesced"],
+    }
+
+
+def start_local(workers, queue):
+    server = service.PPAServer(("127.0.0.1", 0), workers, queue)
+    threading.Thread(target=server.serve_forever, name="ppa-service", daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def run(url=None, rows=100_000, clients=32, requests=1000, sets=8, tables=service.DEFAULT_TABLES,
+        workers=service.DEFAULT_WORKERS, queue=service.DEFAULT_QUEUE, seed=0, classifications=4,
+        results_path=DEFAULT_RESULTS):
+    server = None
+    if url is None:
+        server, url = start_local(workers, queue)
+    try:
+        ids = upload_dataset(url, rows, seed, classifications)
+        thresholds = threshold_sets(sets, seed)
+        phases = {}
+        for phase in ("cold", "warm"):
+            if phase == "cold" and server is not None:
+                # Keep the uploaded datasets, drop every analysis computed from them
+                datasets = {key: result_cache.cache.get(key) for key in
+                            [("dataset", ids["company"], "company"), ("dataset", ids["competitor"], "competitor")]}
+                result_cache.cache.clear()
+                for key, frame in datasets.items():
+                    result_cache.cache.get_or_compute(key, lambda frame=frame: frame)
+            phases[phase] = run_phase(url, ids, thresholds, clients, requests, list(tables))
+            p = phases[phase]
+            print(f"{phase:>5}: {p['throughput_rps']:>8} req/s  p50 {p['p50_ms']:>8.1f} ms  "
+                  f"p95 {p['p95_ms']:>8.1f} ms  p99 {p['p99_ms']:>8.1f} ms  "
+                  f"computed {p['computed']}, coalesced {p['coalesced']}, statuses {p['statuses']}")
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+
+    run_info = {**bench.run_metadata(), "url": None if server is not None else url, "rows": rows,
+                "clients": clients, "threshold_sets": sets, "tables": list(tables),
+                "workers": workers if server is not None else None,
+                "queue": queue if server is not None else None, "phases": phases}
+    with open(results_path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(run_info) + "\n")
+    print(f"run {run_info['run_id']} appended to {results_path}")
+    return run_info
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the PPA HTTP service.")
+    parser.add_argument("--url", help="Running service to test (default: start one in this process)")
+    parser.add_argument("--rows", type=int, default=100_000, help="Competitor rows in the synthetic dataset")
+    parser.add_argument("--clients", type=int, default=32, help="Concurrent client threads")
+    parser.add_argument("--requests", type=int, default=1000, help="Requests per phase")
+    parser.add_argument("--threshold-sets", type=int, default=8, help="Distinct threshold sets requested")
+    parser.add_argument("--tables", nargs="+", default=service.DEFAULT_TABLES)
+    parser.add_argument("--workers", type=int, default=service.DEFAULT_WORKERS, help="Local service only")
+    parser.add_argument("--queue", type=int, default=service.DEFAULT_QUEUE, help="Local service only")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--classifications", type=int, default=4)
+    parser.add_argument("--results", default=DEFAULT_RESULTS, help="JSONL file runs are appended to")
+    args = parser.parse_args(argv)
+    run(args.url, args.rows, args.clients, args.requests, args.threshold_sets, args.tables, args.workers,
+        args.queue, args.seed, args.classifications, args.results)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
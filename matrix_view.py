@@ -0,0 +1,195 @@
+"""HTML tables for the classification × tier views.
+
+Kept free of Streamlit so the same markup can be built (and timed) outside
+the app. Both tables are built for one page of classifications (columns)
+and tiers (rows) at a time, list at most ``cell_limit`` SKUs per cell, and
+are assembled in one pass from escaped parts, so the payload grows with
+what is on screen rather than with the dataset.
+"""
+from html import escape
+
+
+CLASSIFICATIONS_PER_PAGE = 8
+TIERS_PER_PAGE = 10
+CELL_SKU_LIMIT = 12
+
+SKU_MATRIX_STYLE = """
+    <style>
+        table {
+            border-collapse: collapse;
+            width: 100%;
+            font-family: Arial, sans-serif;
+            font-size: 13px;
+        }
+        th, td {
+            border: 1px solid #ccc;
+            padding: 10px 12px; /* Increased padding */
+            text-align: center;
+            vertical-align: middle;
+        }
+        th {
+            font-weight: bold;
+        }
+        td[colspan="3"] {
+            min-width: 180px; /* Adjust to fit 20 characters easily */
+        }
+        td .more {
+            color: #888;
+            font-style: italic;
+        }
+    </style>
+"""
+
+TIER_CLASS_STYLE = """
+    <style>
+        table.main {
+            border-collapse: collapse;
+            width: 100%;
+            font-family: Arial, sans-serif;
+            font-size: 12px;
+        }
+        table.main th, table.main td {
+            border: 1px solid #ddd;
+            padding: 6px;
+            text-align: center;
+            vertical-align: middle;
+        }
+        table.main th {
+            background-color: #f2f2f2;
+            font-weight: bold;
+        }
+        table.inner {
+            width: 100%;
+            border: none;
+        }
+        table.inner td {
+            border: none;
+            padding: 2px 5px;
+            font-size: 11px;
+            text-align: center;
+        }
+    </style>
+"""
+
+
+def fmt_pct(value):
+    return f"{value:.1f}%"
+
+
+def page_count(total, page_size):
+    return max(1, -(-total // page_size))
+
+
+def paginate(items, page, page_size):
+    """Items on ``page`` (1-based); out-of-range pages are clamped."""
+    page = min(max(int(page), 1), page_count(len(items), page_size))
+    start = (page - 1) * page_size
+    return list(items[start:start + page_size])
+
+
+def _ppw_spread(row, currency_symbol=""):
+    """P10 · median · P90 PPW, when the metrics carry sketch quantiles."""
+    median = row.get("PPW Median")
+    if not row["SKU Count"] or median is None or median != median:
+        return "-"
+    return " · ".join(f"{currency_symbol}{row[label]:.2f}" for label in ("PPW P10", "PPW Median", "PPW P90"))
+
+
+def format_segment_metrics(results, currency_symbol):
+    """Display strings per classification and per tier for the SKU matrix header and margin."""
+    classification_metrics = {
+        cls: {
+            "Growth": fmt_pct(row["Growth"]),
+            "Value": fmt_pct(row["Share"]),
+            "PPW": f"{row['PPW Min']:.2f} – {row['PPW Max']:.2f}" if row["SKU Count"] else "-",
+            "Spread": _ppw_spread(row),
+        }
+        for cls, row in results["classification_metrics"].iterrows()
+    }
+    tier_metrics = {
+        tier: {
+            "PPW": f"{currency_symbol}{row['PPW Min']:.2f} – {currency_symbol}{row['PPW Max']:.2f}" if row["SKU Count"] else "-",
+            "Spread": _ppw_spread(row, currency_symbol),
+            "Growth": fmt_pct(row["Growth"]),
+            "Share": fmt_pct(row["Share"])
+        }
+        for tier, row in results["tier_metrics"].iterrows()
+    }
+    return classification_metrics, tier_metrics
+
+
+def _sku_cell(skus, cell_limit):
+    if not skus:
+        return "-"
+    shown = "<br>".join(escape(str(sku)) for sku in skus[:cell_limit])
+    if len(skus) > cell_limit:
+        shown += f'<br><span class="more">+{len(skus) - cell_limit:,} more</span>'
+    return shown
+
+
+def generate_dynamic_html(sku_matrix, classification_metrics, tier_metrics, classifications, tiers,
+                          cell_limit=CELL_SKU_LIMIT):
+    """SKU matrix for the given (visible) classifications and tiers.
+
+    ``sku_matrix`` is sparse, {tier: {classification: [SKU, ...]}} with only
+    non-empty cells, as returned by engine.sku_matrix.
+    """
+    blank = {"Growth": "-", "Value": "-", "PPW": "-", "Spread": "-", "Share": "-"}
+    parts = [SKU_MATRIX_STYLE, "<table><tr><th>Classification</th>"]
+    parts += [f'<th colspan="3">{escape(str(cls))}</th>' for cls in classifications]
+    parts.append('<th rowspan="3">Avg PP CPW</th><th rowspan="3">PPW P10 · Median · P90</th>'
+                 '<th rowspan="3">Value Weight</th><th rowspan="3">Growth</th></tr>')
+
+    for label, field in (("Net Sales Growth %", "Growth"), ("Value Share %", "Value"), ("PPW Range", "PPW"),
+                         ("PPW P10 · Median · P90", "Spread")):
+        parts.append(f"<tr><td>{label}</td>")
+        parts += [f'<td colspan="3">{escape(classification_metrics.get(cls, blank)[field])}</td>'
+                  for cls in classifications]
+        parts.append("<td></td><td></td><td></td><td></td></tr>" if field in ("PPW", "Spread") else "</tr>")
+
+    for tier in tiers:
+        cells = sku_matrix.get(tier, {})
+        metrics = tier_metrics.get(tier, blank)
+        parts.append(f"<tr><td>{escape(str(tier))}</td>")
+        parts += [f'<td colspan="3">{_sku_cell(cells.get(cls), cell_limit)}</td>' for cls in classifications]
+        parts.append(f'<td>{escape(metrics["PPW"])}</td><td>{escape(metrics["Spread"])}</td>'
+                     f'<td>{escape(metrics["Share"])}</td><td>{escape(metrics["Growth"])}</td></tr>')
+    parts.append("</table>")
+    return "".join(parts)
+
+
+def tier_class_matrix_html(tier_class_matrix, classifications, tiers, currency_symbol):
+    """Horizontal tier × classification matrix: sales, share % and growth % per cell.
+
+    Only cells with SKUs are looked up; everything else renders as "-".
+    """
+    filled = tier_class_matrix[tier_class_matrix["Has SKUs"]]
+    cells = {
+        (tier, cls): (present, share, growth)
+        for tier, cls, present, share, growth in zip(
+            filled["Calculated Price Tier"], filled["Classification"],
+            filled["Present Net Sales"], filled["Share %"], filled["Growth %"],
+        )
+    }
+    currency = escape(currency_symbol)
+
+    parts = [TIER_CLASS_STYLE, '<table class="main"><tr><th>Price Tier \\ Classification</th>']
+    parts += [f"<th>{escape(str(cls))}</th>" for cls in classifications]
+    parts.append("</tr>")
+    for tier in tiers:
+        parts.append(f"<tr><td><b>{escape(str(tier))}</b></td>")
+        for cls in classifications:
+            cell = cells.get((tier, cls))
+            if cell is None:
+                parts.append("<td>-</td>")
+                continue
+            # Mini table inside each cell (horizontal layout)
+            present, share, growth = cell
+            parts.append(
+                '<td><table class="inner"><tr>'
+                f"<td><b>{currency}{present:,.0f}</b></td><td>{share:.1f}%</td><td>{growth:.1f}%</td>"
+                "</tr></table></td>"
+            )
+        parts.append("</tr>")
+    parts.append("</table>")
+    return "".join(parts)
@@ -0,0 +1,253 @@
+"""Retail Price vs. Price per Wash scatter that stays fast at any SKU count.
+
+Only a chosen subset of SKUs is labelled, labels are placed greedily on a
+uniform grid (spatial hash) instead of running adjustText over every point,
+large point counts switch to hexbin density, and rendered PNGs are cached
+per dataset and plot options.
+"""
+import io
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+
+LABEL_MODES = {
+    "top_sales": "Top N by present net sales",
+    "ours": "Our SKUs only",
+    "selected": "Selected SKUs",
+    "all": "All SKUs",
+    "none": "No labels",
+}
+
+FONT_SIZE = 8
+DPI = 100
+
+# Per-item label costs used to fit the latency budget, measured on 2k-20k
+# point scatters: adjustText takes ~100 ms for its initial draw plus ~8 ms
+# per label when it converges, but often does not and runs to its time
+# limit, so it is also time-boxed (see _adjust_labels)
+ADJUST_TEXT_MS = 100
+ADJUST_TEXT_MS_PER_LABEL = 8
+# Its overlap arrays grow with labels × points (tens of GB for ~800 labels),
+# so larger label sets always go on the grid, whatever the budget
+ADJUST_TEXT_MAX_LABELS = 50
+# Grid labels cost little to place but ~1-3 ms each to draw; that cost is
+# measured on the first batch and the rest are added while they still fit
+GRID_MS_PER_LABEL = 0.3
+GRID_LABEL_BATCH = 10
+# render_png draws the figure again and encodes it, about twice a bare draw
+SAVE_DRAW_RATIO = 2
+
+
+def pick_labels(plot_df, mode="top_sales", top_n=30, selected=None):
+    """Row positions to label, most important first."""
+    if mode == "none":
+        return np.empty(0, dtype=np.int64)
+    if mode == "selected":
+        return np.flatnonzero(plot_df["SKU"].isin(list(selected or [])).to_numpy())
+    if mode == "ours":
+        candidates = np.flatnonzero(~plot_df["Is Competitor"].to_numpy(dtype=bool))
+    else:
+        candidates = np.arange(len(plot_df))
+    sales = plot_df["Present Net Sales"].to_numpy(dtype="float64")[candidates]
+    candidates = candidates[np.argsort(-np.nan_to_num(sales, nan=-np.inf), kind="stable")]
+    return candidates if mode in ("all", "ours") else candidates[:top_n]
+
+
+def place_labels(xy_px, texts, font_size=FONT_SIZE, dpi=DPI):
+    """Greedy collision-free label placement on a uniform grid.
+
+    Each label tries four corners around its point; the first whose box
+    overlaps no occupied grid cell wins, otherwise the label is dropped.
+    Returns (index, dx, dy, ha, va) for the placed labels, in input order.
+    """
+    char_w = font_size * 0.6 * dpi / 72
+    line_h = font_size * 1.3 * dpi / 72
+    cell = line_h
+    occupied = set()
+    placed = []
+    offsets = [(4, 4, "left", "bottom"), (-4, 4, "right", "bottom"),
+               (4, -4, "left", "top"), (-4, -4, "right", "top")]
+    for i, ((x, y), text) in enumerate(zip(xy_px, texts)):
+        if not np.isfinite(x) or not np.isfinite(y):
+            continue
+        width = len(text) * char_w
+        for dx, dy, ha, va in offsets:
+            x0 = x + dx if ha == "left" else x + dx - width
+            y0 = y + dy if va == "bottom" else y + dy - line_h
+            cells = {
+                (cx, cy)
+                for cx in range(int(x0 // cell), int((x0 + width) // cell) + 1)
+                for cy in range(int(y0 // cell), int((y0 + line_h) // cell) + 1)
+            }
+            if not cells & occupied:
+                occupied |= cells
+                placed.append((i, dx, dy, ha, va))
+                break
+    return placed
+
+
+def _adjust_labels(ax, x, y, texts, budget_ms):
+    """Label with adjustText, time-boxed to ``budget_ms``.
+
+    Returns False, with the labels removed again, when adjustText did not
+    settle in time; the caller then places them on the grid instead.
+    """
+    from adjustText import adjust_text
+
+    started = time.perf_counter()
+    texts = [ax.text(xi, yi, text, fontsize=FONT_SIZE) for xi, yi, text in zip(x, y, texts)]
+    _, arrows = adjust_text(
+        texts,
+        ax=ax,
+        arrowprops=dict(arrowstyle="-", color='gray', lw=0.5),
+        expand_points=(1.2, 1.4),
+        expand_text=(1.2, 1.4),
+        force_text=0.5,
+        force_points=0.4,
+        only_move={'points': 'y', 'text': 'xy'},
+        time_lim=max(budget_ms - ADJUST_TEXT_MS, 0) / 1000,  # ADJUST_TEXT_MS covers the initial draw
+    )
+    if (time.perf_counter() - started) * 1000 <= budget_ms:
+        return True
+    for artist in texts + list(arrows or []):
+        artist.remove()
+    return False
+
+
+def scatter_figure(plot_df, label_mode="top_sales", top_n=30, selected=None,
+                   budget_ms=500, hexbin_above=5000, seed=0):
+    """Build the scatter Figure for company + competitor rows.
+
+    Labels are added only while building plus render_png fits ``budget_ms``.
+    """
+    started = time.perf_counter()
+    rng = np.random.default_rng(seed)
+    ppw = plot_df["Price per Wash"].to_numpy(dtype="float64")
+    price = plot_df["Price"].to_numpy(dtype="float64")
+    # Small, reproducible jitter so overlapping packs stay visible (and cacheable)
+    x = ppw + rng.normal(0, 0.002, size=len(plot_df))
+    y = price + rng.normal(0, 0.3, size=len(plot_df))
+    is_comp = plot_df["Is Competitor"].to_numpy(dtype=bool)
+    finite = np.isfinite(x) & np.isfinite(y)
+
+    fig = Figure(figsize=(12, 7), dpi=DPI)
+    ax = fig.subplots()
+    if finite.sum() > hexbin_above:
+        # Density for the market, our SKUs stay as points on top
+        ax.hexbin(x[finite & is_comp], y[finite & is_comp], gridsize=60, cmap="Greens", mincnt=1, bins="log")
+        ax.scatter(x[~is_comp], y[~is_comp], c="navy", s=30, alpha=0.9)
+    else:
+        ax.scatter(x, y, c=np.where(is_comp, "green", "navy"), s=70, alpha=0.8)
+
+    if finite.any():
+        ax.set_xlim(x[finite].min() - 0.03, x[finite].max() + 0.03)
+        ax.set_ylim(y[finite].min() - 2, y[finite].max() + 2)
+    ax.set_xlabel("Price Per Wash")
+    ax.set_ylabel("Retail Price")
+    ax.set_title("Scatter Plot of SKUs")
+    ax.grid(True, linestyle='--', alpha=0.5)
+
+    labels = pick_labels(plot_df, label_mode, top_n, selected)
+    labels = labels[finite[labels]]
+    skus = plot_df["SKU"].astype(str).to_numpy()
+    # Keep labelling inside the latency budget: most important labels first
+    labels = labels[:max(0, int(budget_ms / GRID_MS_PER_LABEL))]
+
+    # Fix the layout and draw once before any data -> pixel transform, so label
+    # positions are those of the saved PNG; the draw also measures what
+    # render_png will spend on everything but the labels
+    fig.tight_layout()
+    if not len(labels):
+        return fig
+    canvas = FigureCanvasAgg(fig)
+    drawn = time.perf_counter()
+    canvas.draw()
+    reserve_ms = SAVE_DRAW_RATIO * (time.perf_counter() - drawn) * 1000
+
+    adjust_ms = budget_ms / 2
+    if len(labels) > ADJUST_TEXT_MAX_LABELS or ADJUST_TEXT_MS + ADJUST_TEXT_MS_PER_LABEL * len(labels) > adjust_ms \
+            or not _adjust_labels(ax, x[labels], y[labels], skus[labels], adjust_ms):
+        deadline = started + (budget_ms - reserve_ms) / 1000
+        xy_px = ax.transData.transform(np.column_stack([x[labels], y[labels]]))
+        _grid_labels(ax, canvas.get_renderer(), x, y, skus, labels, place_labels(xy_px, skus[labels]), deadline)
+    return fig
+
+
+def _grid_labels(ax, renderer, x, y, skus, labels, placed, deadline):
+    """Annotate the ``placed`` labels in order while their measured cost fits before ``deadline``.
+
+    The first batch is drawn right away to time what each label adds to the
+    final render; later batches only go in if annotating them now plus
+    drawing every label at save time still ends before the deadline.
+    """
+    draw_ms = annotate_ms = None
+    for start in range(0, len(placed), GRID_LABEL_BATCH):
+        batch = placed[start:start + GRID_LABEL_BATCH]
+        if draw_ms is not None:
+            needed_ms = len(batch) * annotate_ms + (start + len(batch)) * draw_ms
+            if time.perf_counter() + needed_ms / 1000 > deadline:
+                break
+        elif time.perf_counter() > deadline:
+            break
+        began = time.perf_counter()
+        texts = [ax.annotate(skus[labels[i]], (x[labels[i]], y[labels[i]]), xytext=(dx, dy),
+                             textcoords="offset pixels", ha=ha, va=va, fontsize=FONT_SIZE)
+                 for i, dx, dy, ha, va in batch]
+        if draw_ms is None:
+            annotated = time.perf_counter()
+            for text in texts:
+                text.draw(renderer)
+            annotate_ms = (annotated - began) * 1000 / len(batch)
+            draw_ms = (time.perf_counter() - annotated) * 1000 / len(batch)
+
+
+def render_png(fig):
+    buffer = io.BytesIO()
+    # The layout is fixed in scatter_figure; cropping here would move the labels it placed
+    fig.savefig(buffer, format="png")
+    return buffer.getvalue()
+
+
+class FigureCache:
+    """LRU of rendered PNG bytes keyed on (dataset key, plot options)."""
+
+    def __init__(self, max_entries=16):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_render(self, key, build):
+        with self._lock:
+            if key in self._entries:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return self._entries[key]
+            self.misses += 1
+        png = render_png(build())
+        with self._lock:
+            self._entries[key] = png
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return png
+
+
+figure_cache = FigureCache()
+
+
+def cached_scatter_png(dataset_key, plot_df, **options):
+    """PNG bytes for the scatter, built at most once per dataset and option set.
+
+    Returns (png, elapsed_ms); elapsed_ms is near zero on a cache hit.
+    """
+    start = time.perf_counter()
+    key = (dataset_key, tuple(sorted((k, tuple(v) if isinstance(v, (list, set)) else v)
+                                     for k, v in options.items())))
+    png = figure_cache.get_or_render(key, lambda: scatter_figure(plot_df, **options))
+    return png, (time.perf_counter() - start) * 1000
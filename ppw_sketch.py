@@ -0,0 +1,113 @@
+"""Mergeable Price per Wash distribution sketches.
+
+A sketch is a small long-format frame with one row per (Classification,
+Is Competitor, Bucket) and a Count. Buckets are logarithmic: bucket ``i``
+holds PPW in (GAMMA ** (i - 1), GAMMA ** i], and the value read back for it
+is within RELATIVE_ACCURACY of every PPW it holds. A few hundred buckets
+cover any realistic PPW range, so a sketch stays tiny however many rows
+went in.
+
+Sketches of file chunks, markets or periods merge by adding the counts of
+equal buckets. Merging is exact: the result is the sketch the concatenated
+rows would have produced, in any order. A sketch with negated counts takes
+rows out again (see ``negate``).
+
+Sketches do not depend on price tier thresholds. Callers add a Calculated
+Price Tier column from ``bucket_values`` (engine.ppw_quantiles does), so
+one sketch answers every threshold set. A SKU whose PPW lies within
+RELATIVE_ACCURACY of a cut point may be counted in the neighbouring tier.
+Only positive, finite PPW is sketched.
+"""
+import numpy as np
+import pandas as pd
+
+
+RELATIVE_ACCURACY = 0.01
+GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+LOG_GAMMA = np.log(GAMMA)
+
+SKETCH_KEYS = ["Classification", "Is Competitor"]
+QUANTILES = {"PPW P10": 0.10, "PPW Median": 0.50, "PPW P90": 0.90}
+
+
+def buckets(ppw):
+    """(bucket per value, mask of the values that can be sketched)."""
+    ppw = np.asarray(ppw, dtype="float64")
+    valid = np.isfinite(ppw) & (ppw > 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        index = np.ceil(np.log(np.where(valid, ppw, 1.0)) / LOG_GAMMA)
+    return index.astype(np.int64), valid
+
+
+def bucket_values(bucket):
+    """The PPW a bucket stands for: within RELATIVE_ACCURACY of anything in it."""
+    return 2 * GAMMA ** np.asarray(bucket, dtype="float64") / (GAMMA + 1)
+
+
+def build(frame, keys=SKETCH_KEYS):
+    """Sketch of ``frame``'s Price per Wash per ``keys``; one grouped pass."""
+    keys = list(keys)
+    index, valid = buckets(frame["Price per Wash"])
+    rows = frame[keys] if valid.all() else frame.loc[valid, keys]
+    return (
+        rows.assign(Bucket=index[valid])
+        .groupby(keys + ["Bucket"], dropna=False, sort=False, observed=True)
+        .size()
+        .rename("Count")
+        .reset_index()
+    )
+
+
+def merge(*sketches):
+    """Fold sketches with the same keys into one; buckets whose counts cancel out are dropped."""
+    sketches = [s for s in sketches if s is not None and len(s)]
+    if not sketches:
+        return None
+    if len(sketches) == 1:
+        return sketches[0]
+    keys = [col for col in sketches[0].columns if col != "Count"]
+    merged = (
+        pd.concat(sketches, ignore_index=True)
+        .groupby(keys, dropna=False, sort=False, observed=True)["Count"]
+        .sum()
+        .reset_index()
+    )
+    return merged[merged["Count"] != 0].reset_index(drop=True)
+
+
+def negate(sketch):
+    """``sketch`` with its counts negated; merging it removes those rows."""
+    return sketch.assign(Count=-sketch["Count"])
+
+
+def quantiles(sketch, by, qs=QUANTILES):
+    """PPW quantiles per ``by`` group from a sketch.
+
+    Returns a frame indexed by ``by`` with one column per ``qs`` label
+    ({label: q}) plus "PPW Sketch Count", the number of sketched values.
+    """
+    by = [by] if isinstance(by, str) else list(by)
+    columns = list(qs) + ["PPW Sketch Count"]
+    counts = sketch.groupby(by + ["Bucket"], dropna=False, observed=True)["Count"].sum()
+    counts = counts[counts > 0]
+    if counts.empty:
+        index = pd.MultiIndex.from_arrays([[]] * len(by), names=by)
+        return pd.DataFrame(columns=columns, index=index if len(by) > 1 else index.get_level_values(0))
+
+    # Sorted by the keys, then bucket: each group is one contiguous, ascending run
+    frame = counts.reset_index()
+    gid = frame.groupby(by, dropna=False, sort=False, observed=True).ngroup().to_numpy()
+    n = frame["Count"].to_numpy(dtype=np.int64)
+    cum = np.cumsum(n)
+    total = np.bincount(gid, weights=n).astype(np.int64)
+    before = cum[np.searchsorted(gid, np.arange(len(total)), side="right") - 1] - total
+    bucket = frame["Bucket"].to_numpy()
+
+    out = {}
+    for label, q in qs.items():
+        # First bucket whose running count passes rank q * (n - 1) within its group
+        out[label] = bucket_values(bucket[np.searchsorted(cum, before + q * (total - 1), side="right")])
+    out["PPW Sketch Count"] = total
+    keys = frame.iloc[np.searchsorted(gid, np.arange(len(total)))][by]
+    index = pd.MultiIndex.from_frame(keys)
+    return pd.DataFrame(out, index=index if len(by) > 1 else index.get_level_values(0))
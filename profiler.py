@@ -0,0 +1,121 @@
+"""Per-stage wall time, rows processed and memory delta for one run.
+
+    prof = Profiler(enabled=True)
+    with prof.stage("ingest", rows=len(df)):
+        ...
+    prof.begin("scatter", rows=n)   # script style: ends the previous stage
+    ...
+    prof.end()
+
+When disabled every call returns immediately, so the instrumentation can
+stay in the hot path. Memory deltas come from tracemalloc and are only
+collected with ``track_memory=True``. tracemalloc is process-wide (one
+trace, one peak), so only one Profiler at a time tracks memory; another
+one created meanwhile times its stages without it (its ``track_memory``
+is False). Allocations other threads make during a stage still count.
+"""
+import json
+import logging
+import threading
+import time
+import tracemalloc
+import weakref
+from contextlib import contextmanager
+
+
+logger = logging.getLogger("ppa.profile")
+
+# Held by the Profiler tracking memory, until it is closed or collected
+_memory_slot = threading.Lock()
+
+
+def _release_memory(started_tracing):
+    if started_tracing:
+        tracemalloc.stop()
+    _memory_slot.release()
+
+
+class Profiler:
+
+    def __init__(self, enabled=False, track_memory=False, run_id=None):
+        self.enabled = enabled
+        self.track_memory = enabled and track_memory and _memory_slot.acquire(blocking=False)
+        self.run_id = run_id
+        self.records = []
+        self._open = None
+        self._release = None
+        if self.track_memory:
+            started_tracing = not tracemalloc.is_tracing()
+            if started_tracing:
+                tracemalloc.start()
+            # Also released on garbage collection, for runs that stop before close()
+            self._release = weakref.finalize(self, _release_memory, started_tracing)
+
+    def begin(self, name, rows=None):
+        """Start a stage, closing the one before it."""
+        if not self.enabled:
+            return
+        self.end()
+        self._open = {"stage": name, "rows": rows, "start": time.perf_counter()}
+        if self.track_memory:
+            tracemalloc.reset_peak()
+            self._open["mem_start"] = tracemalloc.get_traced_memory()[0]
+
+    def end(self, rows=None):
+        if not self.enabled or self._open is None:
+            return
+        record, self._open = self._open, None
+        record["ms"] = (time.perf_counter() - record.pop("start")) * 1000
+        if rows is not None:
+            record["rows"] = rows
+        if self.track_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            start = record.pop("mem_start")
+            record["mem_delta_bytes"] = current - start
+            record["mem_peak_bytes"] = peak - start
+        if self.run_id is not None:
+            record["run_id"] = self.run_id
+        self.records.append(record)
+        logger.info(json.dumps(record, default=str))
+
+    def record(self, name, ms, rows=None, parent=None):
+        """A stage timed elsewhere, e.g. on a worker thread.
+
+        With ``parent``, the time is a breakdown of that (wall-time) stage:
+        it is listed but left out of ``total_ms``, which already counts it.
+        """
+        if not self.enabled:
+            return
+        record = {"stage": name, "rows": rows, "ms": ms}
+        if parent is not None:
+            record["parent"] = parent
+        if self.run_id is not None:
+            record["run_id"] = self.run_id
+        self.records.append(record)
+        logger.info(json.dumps(record, default=str))
+
+    @contextmanager
+    def stage(self, name, rows=None):
+        self.begin(name, rows)
+        try:
+            yield self
+        finally:
+            self.end()
+
+    def close(self):
+        self.end()
+        if self._release is not None:
+            self._release()
+            self.track_memory = False
+
+    def total_ms(self):
+        return sum(record["ms"] for record in self.records if "parent" not in record)
+
+    def table(self):
+        import pandas as pd
+
+        return pd.DataFrame(self.records)
+
+    def to_json(self):
+        return json.dumps({"run_id": self.run_id, "total_ms": self.total_ms(), "stages": self.records},
+                          indent=2, default=str)
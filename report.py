@@ -0,0 +1,132 @@
+"""Multi-sheet Excel export of every computed table.
+
+Rows are streamed with xlsxwriter's constant_memory mode (each row is
+flushed to a temp file as soon as the next one starts), and numbers are
+written as numbers with Excel number formats, so percentages, currency and
+BPS stay sortable in the workbook.
+"""
+import io
+
+import pandas as pd
+import xlsxwriter
+
+
+XLSX_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# Rows converted to Python values at a time; only one chunk is held besides the frame
+WRITE_CHUNK_ROWS = 10_000
+
+# (sheet name, results key, {column: format kind}); percent columns hold
+# 0-100 values in the engine and are scaled to fractions for Excel.
+SECTIONS = [
+    ("SKU Matrix", "sku_matrix", {}),
+    ("SKU Growth", "sku_growth", {
+        "Previous Volume": "number", "Present Volume": "number", "Volume Growth %": "percent",
+        "Previous Net Sales": "currency", "Present Net Sales": "currency", "Net Sales Growth %": "percent",
+    }),
+    ("API", "api", {
+        "Our PPW": "ppw", "Avg Competitor PPW": "ppw", "API (Our / Comp)": "ratio",
+    }),
+    ("Classification Metrics", "classification_metrics", {
+        "Growth": "percent", "Share": "percent", "PPW Min": "ppw", "PPW Max": "ppw",
+        "PPW P10": "ppw", "PPW Median": "ppw", "PPW P90": "ppw", "SKU Count": "integer",
+    }),
+    ("Tier Metrics", "tier_metrics", {
+        "Growth": "percent", "Share": "percent", "PPW Min": "ppw", "PPW Max": "ppw",
+        "PPW P10": "ppw", "PPW Median": "ppw", "PPW P90": "ppw", "SKU Count": "integer",
+    }),
+    ("Classification Summary", "classification_summary", {
+        "Sales Value Growth %": "percent", "Value Share %": "percent",
+    }),
+    ("Tier Summary", "tier_summary", {
+        "Sales Value Growth %": "percent", "Value Share %": "percent",
+    }),
+    ("Tier x Classification", "tier_class_matrix", {
+        "Present Net Sales": "currency", "Previous Net Sales": "currency", "Our Present Net Sales": "currency",
+        "Share %": "percent", "Growth %": "percent",
+    }),
+    ("Brand BPS", "brand_summary", {
+        "Previous Share %": "percent", "Current Share %": "percent", "BPS Change": "bps",
+    }),
+]
+
+
+def sku_matrix_table(sku_matrix):
+    """Tier × classification SKU lists as one row per SKU."""
+    return pd.DataFrame(
+        [(tier, cls, sku) for tier, cells in sku_matrix.items() for cls, skus in cells.items() for sku in skus],
+        columns=["Price Tier", "Classification", "SKU"],
+    )
+
+
+def _number_formats(currency_symbol):
+    currency = currency_symbol.replace('"', '')
+    return {
+        "number": "#,##0.00",
+        "integer": "#,##0",
+        "percent": "0.0%",
+        "currency": f'"{currency}"#,##0',
+        "ppw": f'"{currency}"0.00',
+        "ratio": "0.00",
+        "bps": '0 "BPS"',
+    }
+
+
+def _section_frame(results, key):
+    table = results[key]
+    if key == "sku_matrix":
+        return sku_matrix_table(table)
+    return table.reset_index() if table.index.name is not None else table
+
+
+def _cells(series):
+    """Plain Python values for one column; NaN becomes an empty cell."""
+    if series.dtype.kind in "biuf":
+        values = series.to_numpy().tolist()
+    else:
+        values = [v if isinstance(v, (int, float, str, bool)) else str(v)
+                  for v in series.astype(object).tolist()]
+    return [None if isinstance(v, float) and v != v else v for v in values]
+
+
+def write_workbook(results, target, currency_symbol="₹"):
+    """Write every section of ``results`` (engine.summarize output) to ``target``.
+
+    ``target`` is a path or a binary file object.
+    """
+    workbook = xlsxwriter.Workbook(target, {"constant_memory": True, "nan_inf_to_errors": True})
+    header_format = workbook.add_format({"bold": True, "bg_color": "#f2f2f2", "border": 1})
+    formats = {kind: workbook.add_format({"num_format": spec})
+               for kind, spec in _number_formats(currency_symbol).items()}
+
+    for sheet_name, key, column_kinds in SECTIONS:
+        if key not in results:
+            continue
+        frame = _section_frame(results, key)
+        worksheet = workbook.add_worksheet(sheet_name)
+        columns = list(frame.columns)
+        for col, name in enumerate(columns):
+            kind = column_kinds.get(name)
+            worksheet.set_column(col, col, max(12, len(str(name)) + 2), formats.get(kind))
+        worksheet.write_row(0, 0, columns, header_format)
+        worksheet.freeze_panes(1, 0)
+
+        # Column-wise conversion one chunk at a time, rows go out strictly in order
+        for start in range(0, len(frame), WRITE_CHUNK_ROWS):
+            chunk = frame.iloc[start:start + WRITE_CHUNK_ROWS]
+            values = []
+            for name in columns:
+                series = chunk[name]
+                if column_kinds.get(name) == "percent":
+                    series = series.astype("float64") / 100
+                values.append(_cells(series))
+            for row, cells in enumerate(zip(*values), start=start + 1):
+                worksheet.write_row(row, 0, cells)
+
+    workbook.close()
+
+
+def workbook_bytes(results, currency_symbol="₹"):
+    buffer = io.BytesIO()
+    write_workbook(results, buffer, currency_symbol)
+    return buffer.getvalue()
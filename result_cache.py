@@ -0,0 +1,153 @@
+"""Process-wide cache of computed analyses, shared by every Streamlit session.
+
+Analysts on one server often open the same weekly files with the same
+thresholds; ``st.session_state`` would make each of them pay for the same
+work. Entries here are keyed on the dataset content hash plus whatever
+else the value depends on, evicted least-recently-used under an entry and
+byte budget, and concurrent requests for a key that is still being
+computed wait for that one computation instead of starting their own.
+
+Cached values are shared across sessions, so callers must treat them as
+read-only.
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+
+def nbytes(value):
+    """Rough in-memory size of a cached value (frames, arrays, strings, containers, objects)."""
+    if isinstance(value, (pd.DataFrame, pd.Series, pd.Index)):
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum() if isinstance(value, pd.DataFrame) else usage)
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(nbytes(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(nbytes(v) for v in value)
+    if hasattr(value, "__dict__"):
+        # Plain objects such as tier_index.PPWIndex: the arrays they hold
+        return nbytes(vars(value))
+    return 64
+
+
+def thresholds_key(thresholds):
+    return tuple((name, float(lower), float(upper)) for name, (lower, upper) in thresholds.items())
+
+
+class _InFlight:
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class ResultCache:
+    """Bounded LRU with in-flight coalescing.
+
+    ``get_or_compute(key, compute)`` returns the cached value, waits for a
+    computation of the same key already running on another thread, or runs
+    ``compute()`` itself. A failed computation is not cached; everyone
+    waiting on it gets the same exception.
+    """
+
+    def __init__(self, max_entries=256, max_bytes=1024 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """The cached value for ``key`` without computing anything (counts as a hit or miss)."""
+        with self._lock:
+            if key in self._entries:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return self._entries[key]
+            self.misses += 1
+            return default
+
+    def get_or_compute(self, key, compute, size=nbytes):
+        with self._lock:
+            if key in self._entries:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return self._entries[key]
+            pending = self._in_flight.get(key)
+            if pending is None:
+                self.misses += 1
+                pending = self._in_flight[key] = _InFlight()
+                owner = True
+            else:
+                self.coalesced += 1
+                owner = False
+
+        if not owner:
+            pending.done.wait()
+            if pending.error is not None:
+                raise pending.error
+            return pending.value
+
+        try:
+            value = compute()
+        except BaseException as e:
+            pending.error = e
+            with self._lock:
+                del self._in_flight[key]
+            pending.done.set()
+            raise
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            self._sizes[key] = size(value)
+            del self._in_flight[key]
+            self._evict()
+        pending.value = value
+        pending.done.set()
+        return value
+
+    def _evict(self):
+        # Always keep the newest entry, even if it alone is over the byte budget
+        while len(self._entries) > 1 and (
+            len(self._entries) > self.max_entries or sum(self._sizes.values()) > self.max_bytes
+        ):
+            key, _ = self._entries.popitem(last=False)
+            del self._sizes[key]
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "hit_rate": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "in_flight": len(self._in_flight),
+                "max_entries": self.max_entries,
+                "bytes": sum(self._sizes.values()),
+                "max_bytes": self.max_bytes,
+            }
+
+
+# One cache per server process, shared by every session
+cache = ResultCache()
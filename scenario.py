@@ -0,0 +1,219 @@
+"""What-if price scenarios evaluated against one analysed dataset.
+
+A ScenarioBase is built once per dataset and threshold set: the segment
+table plus, for every segment, which rows it holds. A scenario is a small
+set of staged price changes ({SKU: new price}); evaluating it re-tiers only
+the changed rows and patches only the segments they leave or enter. Sums
+and counts are adjusted in place; PPW min / max of a touched segment are
+recomputed from that segment's own rows; the PPW sketch drops the changed
+rows' old buckets and adds their new ones. Every table in
+engine.SUMMARY_TABLES is then built from the patched segments exactly as
+for an upload, so scenarios compare side by side with the base and with
+each other.
+
+Price changes move SKUs between tiers but leave sales and volume as
+uploaded; there is no demand response.
+"""
+import numpy as np
+import pandas as pd
+
+import engine
+import ppw_sketch
+from tier_index import SUM_COLS
+
+
+PLACEMENT_COLS = ["SKU", "Is Competitor", "Classification", "Parent Brand", "Old Price", "New Price",
+                  "Old PPW", "New PPW", "Old Tier", "New Tier"]
+
+
+def _key(values):
+    # NaN keys (a blank brand) must compare equal inside dict lookups
+    return tuple(None if isinstance(v, float) and np.isnan(v) else v for v in values)
+
+
+def _objects(column):
+    """Plain values of a (possibly categorical) column without materializing every category."""
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        codes = column.cat.codes.to_numpy()
+        values = column.cat.categories.take(np.maximum(codes, 0)).to_numpy(dtype=object)
+        return np.where(codes >= 0, values, None)
+    return column.to_numpy(dtype=object)
+
+
+class ScenarioBase:
+    """One dataset + thresholds, prepared for any number of price scenarios."""
+
+    def __init__(self, context, thresholds):
+        """``context`` is engine.summary_context for ``thresholds``."""
+        self.context = context
+        self.thresholds = thresholds
+        full_df = context["full_df"]
+        self.full_df = full_df
+        self.names, self.cuts = engine.tier_ladder(thresholds)
+
+        grouped = full_df.groupby(engine.SEGMENT_KEYS, dropna=False, sort=False, observed=True)
+        self.row_segment = grouped.ngroup().to_numpy()
+        # Same keys and group order as row_segment (both groupbys run sort=False)
+        self.segments = engine.segment_table(full_df)
+        self.codes = {_key(key): i for i, key in
+                      enumerate(zip(*(self.segments[col].tolist() for col in engine.SEGMENT_KEYS)))}
+        self.segment_order = np.argsort(self.row_segment, kind="stable")
+        bounds = np.searchsorted(self.row_segment[self.segment_order], np.arange(len(self.segments) + 1))
+        self.segment_bounds = bounds
+
+        self.sku_rows = pd.Index(full_df["SKU"].astype(object))
+        self.sku_rows.get_indexer_for([])  # build the hash table now, not on the first scenario
+        self.ppw = full_df["Price per Wash"].to_numpy(dtype="float64")
+        self._tables = {}
+
+    def table(self, name):
+        """Base (unchanged) table, built once."""
+        if name not in self._tables:
+            self._tables[name] = engine.SUMMARY_TABLES[name](self.context)
+        return self._tables[name]
+
+    def segment_rows(self, code):
+        return self.segment_order[self.segment_bounds[code]:self.segment_bounds[code + 1]]
+
+    def rows_for(self, skus):
+        """Positions in full_df of every row with one of ``skus`` (ours and competitors')."""
+        skus = [str(sku) for sku in skus]
+        positions = self.sku_rows.get_indexer_for(skus)
+        unknown = [sku for sku, pos in zip(skus, positions) if pos < 0]
+        if unknown:
+            raise KeyError(f"Unknown SKU(s): {', '.join(unknown[:5])}")
+        return np.unique(positions)
+
+    def evaluate(self, changes):
+        """Scenario for {SKU: new price}; raises KeyError / ValueError on bad input."""
+        return Scenario(self, changes)
+
+
+class Scenario:
+
+    def __init__(self, base, changes):
+        self.base = base
+        self.changes = {str(sku): float(price) for sku, price in changes.items()}
+        bad = [sku for sku, price in self.changes.items() if not np.isfinite(price) or price <= 0]
+        if bad:
+            raise ValueError(f"New price must be greater than zero for: {', '.join(bad[:5])}")
+        self._tables = {}
+
+        full_df = base.full_df
+        rows = base.rows_for(self.changes) if self.changes else np.empty(0, dtype=np.int64)
+        changed = full_df.iloc[rows]
+        new_price = np.array([self.changes[sku] for sku in _objects(changed["SKU"])], dtype="float64")
+        with np.errstate(divide="ignore", invalid="ignore"):
+            new_ppw = new_price / changed["Number of Washes"].to_numpy(dtype="float64")
+        new_tier = np.asarray(engine.assign_tiers(new_ppw, base.names, base.cuts), dtype=object)
+
+        self.placement = pd.DataFrame({
+            "SKU": _objects(changed["SKU"]),
+            "Is Competitor": changed["Is Competitor"].to_numpy(),
+            "Classification": _objects(changed["Classification"]),
+            "Parent Brand": _objects(changed["Parent Brand"]),
+            "Old Price": changed["Price"].to_numpy(dtype="float64"),
+            "New Price": new_price,
+            "Old PPW": base.ppw[rows],
+            "New PPW": new_ppw,
+            "Old Tier": _objects(changed["Calculated Price Tier"]),
+            "New Tier": new_tier,
+        }, columns=PLACEMENT_COLS)
+        self.segments, self.touched = self._patch(rows, changed, new_ppw, new_tier)
+        self.context = self._context(changed, new_price, new_ppw, new_tier)
+
+    def _patch(self, rows, changed, new_ppw, new_tier):
+        """Base segments with the changed rows moved; returns (segments, touched segment codes)."""
+        base = self.base
+        segments = base.segments.copy()
+        sums = segments[SUM_COLS].to_numpy(dtype="float64")
+        values = changed[SUM_COLS].fillna(0).to_numpy(dtype="float64")
+        keys = changed[engine.SEGMENT_KEYS]
+
+        added = []  # keys of segments that did not exist in the base
+        old_codes = base.row_segment[rows]
+        new_codes = np.empty(len(rows), dtype=np.int64)
+        for i, key in enumerate(zip(*(_objects(keys[col]) for col in engine.SEGMENT_KEYS))):
+            new_key = _key((key[0], new_tier[i], key[2], key[3]))
+            code = base.codes.get(new_key)
+            if code is None:
+                if new_key not in added:
+                    added.append(new_key)
+                code = len(segments) + added.index(new_key)
+            new_codes[i] = code
+
+        n = len(segments) + len(added)
+        sums = np.vstack([sums, np.zeros((len(added), len(SUM_COLS)))])
+        np.subtract.at(sums, old_codes, values)
+        np.add.at(sums, new_codes, values)
+        count = np.concatenate([segments["SKU Count"].to_numpy(dtype=np.int64), np.zeros(len(added), np.int64)])
+        np.subtract.at(count, old_codes, 1)
+        np.add.at(count, new_codes, 1)
+
+        # PPW stats of every touched segment from its own remaining + entering rows
+        moved = np.zeros(len(base.full_df), dtype=bool)
+        moved[rows] = True
+        touched = np.unique(np.concatenate([old_codes, new_codes]))
+        ppw_stats = np.full((n, 4), np.nan)
+        ppw_stats[:len(segments)] = segments[["PPW Sum", "PPW Count", "PPW Min", "PPW Max"]].to_numpy(dtype="float64")
+        for code in touched:
+            members = base.segment_rows(code) if code < len(segments) else np.empty(0, dtype=np.int64)
+            ppw = np.concatenate([base.ppw[members[~moved[members]]], new_ppw[new_codes == code]])
+            ppw = ppw[~np.isnan(ppw)]
+            with np.errstate(invalid="ignore"):
+                ppw_stats[code] = [ppw.sum(), len(ppw), ppw.min() if len(ppw) else np.nan,
+                                   ppw.max() if len(ppw) else np.nan]
+
+        if added:
+            tiers = segments["Calculated Price Tier"].dtype
+            segments = pd.concat([segments, pd.DataFrame(
+                [list(key) for key in added], columns=engine.SEGMENT_KEYS)], ignore_index=True)
+            segments["Calculated Price Tier"] = segments["Calculated Price Tier"].astype(tiers)
+        segments[SUM_COLS] = sums
+        segments[["PPW Sum", "PPW Count", "PPW Min", "PPW Max"]] = ppw_stats
+        segments["PPW Count"] = segments["PPW Count"].astype(np.int64)
+        segments["SKU Count"] = count
+        # segment_table never holds empty groups
+        return segments[count > 0].reset_index(drop=True), touched
+
+    def _context(self, changed, new_price, new_ppw, new_tier):
+        context = dict(self.base.context)
+        context["segments"] = self.segments
+        if context.get("ppw_sketch") is not None and len(changed):
+            moved = changed[ppw_sketch.SKETCH_KEYS + ["Price per Wash"]]
+            context["ppw_sketch"] = ppw_sketch.merge(
+                context["ppw_sketch"], ppw_sketch.negate(ppw_sketch.build(moved)),
+                ppw_sketch.build(moved.assign(**{"Price per Wash": new_ppw})))
+        ours = ~changed["Is Competitor"].to_numpy()
+        if ours.any():
+            company_rows = context["company_rows"].copy()
+            labels = changed.index[ours]
+            company_rows.loc[labels, "Price"] = new_price[ours]
+            company_rows.loc[labels, "Price per Wash"] = new_ppw[ours]
+            company_rows.loc[labels, "Calculated Price Tier"] = new_tier[ours]
+            context["company_rows"] = company_rows
+        return context
+
+    def table(self, name):
+        """Any engine.SUMMARY_TABLES table for this scenario (built once)."""
+        if name not in self._tables:
+            self._tables[name] = engine.SUMMARY_TABLES[name](self.context)
+        return self._tables[name]
+
+    def api_changes(self):
+        """Our changed SKUs against their segment's competitor average, before and after."""
+        ours = self.placement[~self.placement["Is Competitor"]]
+        base_api = self.base.table("api").set_index("Our SKU")["API (Our / Comp)"]
+        new_api = self.table("api").set_index("Our SKU")["API (Our / Comp)"]
+        return ours.assign(**{
+            "Old API": base_api.reindex(ours["SKU"]).to_numpy(),
+            "New API": new_api.reindex(ours["SKU"]).to_numpy(),
+        })[["SKU", "Classification", "Old Tier", "New Tier", "Old PPW", "New PPW", "Old API", "New API"]]
+
+
+def side_by_side(base, scenarios, name="tier_summary"):
+    """One table for the base and every scenario ({label: Scenario}), with a leading Scenario column."""
+    tables = {"Base": base.table(name)}
+    tables.update((label, scenario.table(name)) for label, scenario in scenarios.items())
+    tables = {label: table.reset_index() if table.index.name else table for label, table in tables.items()}
+    return pd.concat(tables, names=["Scenario"]).reset_index(level=0).reset_index(drop=True)
@@ -0,0 +1,101 @@
+"""Concurrent computation of independent page sections.
+
+The analysis page is a column of sections (SKU matrix, growth, scatter,
+API, summaries, ...) that only share read-only inputs. A SectionRun
+submits each section's work to a process-wide thread pool and yields the
+sections back as they finish, so the page can fill a placeholder per
+section instead of waiting for the slowest one.
+
+Use a run as a context manager: it is cancelled when the script that
+started it leaves the block for any reason, including Streamlit stopping a
+stale run because a threshold changed. Sections not yet started are
+dropped, and running ones stop at their next ``check_cancelled()``.
+"""
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+DEFAULT_WORKERS = 4
+
+
+class Cancelled(Exception):
+    """Raised inside a section whose run has been cancelled."""
+
+
+class SectionRun:
+
+    def __init__(self, pool):
+        self.pool = pool
+        self._cancelled = threading.Event()
+        self._futures = {}
+
+    def submit(self, name, func, *args, **kwargs):
+        """Queue ``func(*args, **kwargs)``; its result is yielded from ``completed()`` as ``name``."""
+        self._futures[self.pool.submit(self._timed, func, args, kwargs)] = name
+
+    def _timed(self, func, args, kwargs):
+        self.check_cancelled()
+        start = time.perf_counter()
+        value = func(*args, **kwargs)
+        return value, (time.perf_counter() - start) * 1000
+
+    def check_cancelled(self):
+        if self._cancelled.is_set():
+            raise Cancelled()
+
+    def completed(self):
+        """(name, value, error, ms) per section in completion order.
+
+        A section that raised comes back with ``error`` set (and value None)
+        so one broken section does not take down the others.
+        """
+        order = list(self._futures)
+        pending = set(order)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in sorted(done, key=order.index):
+                try:
+                    value, ms = future.result()
+                except Exception as e:
+                    yield self._futures[future], None, e, 0.0
+                else:
+                    yield self._futures[future], value, None, ms
+
+    def cancel(self):
+        self._cancelled.set()
+        for future in self._futures:
+            future.cancel()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        # Normal exit, an error, or Streamlit stopping the script for a rerun
+        self.cancel()
+        return False
+
+
+class SectionPool:
+    """One thread pool per server process, shared by every session's runs."""
+
+    def __init__(self, max_workers=DEFAULT_WORKERS):
+        self.max_workers = max_workers
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def submit(self, func, *args, **kwargs):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix="ppa-section")
+        return self._executor.submit(func, *args, **kwargs)
+
+    def run(self):
+        return SectionRun(self)
+
+
+pool = SectionPool()
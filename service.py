@@ -0,0 +1,363 @@
+"""Local HTTP service for the PPA tables, for tools that cannot use the page.
+
+    python service.py --port 8765 --workers 8 --queue 64
+
+Standard library only (http.server). Endpoints:
+
+``POST /datasets?kind=company|competitor``
+    Body is one CSV, Parquet or Arrow file. Returns its ``dataset_id`` (the
+    content hash), row count and validation summary; files with errors are
+    refused with 422 and the first rows of the problem report.
+``POST /analysis``
+    JSON body::
+
+        {"company": "<dataset_id>", "competitor": "<dataset_id>",
+         "thresholds": {"Value": 0.13, "Mainstream": 0.17, "Premium": 1},
+         "tables": ["tier_class_matrix", "api", "brand_summary"],
+         "format": "json"}
+
+    ``company_csv`` / ``competitor_csv`` may carry CSV text instead of an
+    id. ``format`` "arrow" returns one table as an Arrow IPC stream.
+``GET /health``
+    Pool and cache counters.
+
+Requests run on a bounded thread pool; when every worker is busy and the
+queue is full the server answers 503 at once instead of piling up threads.
+Datasets, analyses and serialized responses go through the process-wide
+result_cache under the same keys the page uses, so identical concurrent
+requests compute once and repeats are served from memory. See loadtest.py
+for throughput and latency measurements.
+"""
+import argparse
+import json
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import engine
+import ingest
+import result_cache
+import tier_index
+import validation
+
+
+DEFAULT_PORT = 8765
+DEFAULT_WORKERS = 8
+DEFAULT_QUEUE = 64
+MAX_BODY_BYTES = 512 * 1024 * 1024
+PROBLEM_ROWS = 100
+# Overload answers: a couple of threads, a bounded backlog, short reads
+REFUSE_WORKERS = 2
+REFUSE_BACKLOG = 256
+REFUSE_READ_SECONDS = 0.5
+MAX_REFUSED_BODY_BYTES = 1024 * 1024
+
+DEFAULT_TABLES = ["tier_class_matrix", "api", "brand_summary"]
+ARROW_MIME = "application/vnd.apache.arrow.stream"
+
+
+class RequestError(Exception):
+    """Bad request; ``status`` is the HTTP status to answer with."""
+
+    def __init__(self, status, message, detail=None):
+        super().__init__(message)
+        self.status = status
+        self.detail = detail
+
+
+# --- Analysis: same cache keys as the page, so both share one computation scheme ---
+
+def register_dataset(data, kind, cache=result_cache.cache):
+    """Parse and validate an uploaded file once per content; returns its dataset id."""
+    if kind not in validation.REQUIRED_NUMERIC_COLS:
+        raise RequestError(400, f"kind must be one of {sorted(validation.REQUIRED_NUMERIC_COLS)}")
+    try:
+        frame, problems = ingest.cache.get_or_load(data, lambda raw: ingest.parse_upload(raw, kind=kind), tag=kind)
+    except Exception as e:
+        raise RequestError(400, f"could not read the file: {e}") from e
+    errors = validation.errors(problems)
+    if len(errors):
+        raise RequestError(422, f"{kind} file has {len(errors):,} problem(s)",
+                           json.loads(errors.head(PROBLEM_ROWS).to_json(orient="records")))
+    dataset_id = ingest.content_key(data)[0]
+    cache.get_or_compute(("dataset", dataset_id, kind), lambda: frame)
+    return {"dataset_id": dataset_id, "kind": kind, "rows": len(frame), "warnings": len(problems)}
+
+
+def _dataset(dataset_id, kind, cache):
+    # A dataset the cache has evicted is simply gone; clients upload it again
+    frame = cache.get(("dataset", dataset_id, kind))
+    if frame is None:
+        raise RequestError(404, f"unknown {kind} dataset {dataset_id!r}; upload it to /datasets first")
+    return frame
+
+
+def context_for(company_id, competitor_id, thresholds, cache=result_cache.cache):
+    """engine.summary_context for two registered datasets, shared across requests."""
+    company_df = _dataset(company_id, "company", cache)
+    competitor_df = _dataset(competitor_id, "competitor", cache)
+    index_key = ((company_id, ingest.SCHEMA_VERSION), (competitor_id, ingest.SCHEMA_VERSION))
+
+    def build_index():
+        combined = engine.combine(company_df, competitor_df)
+        return combined, tier_index.PPWIndex(combined)
+
+    combined_df, ppw_index = cache.get_or_compute(("ppw_index", index_key), build_index)
+    analysis_key = (index_key, result_cache.thresholds_key(thresholds))
+    context = cache.get_or_compute(
+        ("context", analysis_key),
+        lambda: engine.summary_context(engine.classify(combined_df, thresholds), ppw_index.segments(thresholds),
+                                       thresholds, sketch=ppw_index.sketch),
+    )
+    return analysis_key, context
+
+
+def table_json(frame):
+    """One table as {"columns": [...], "data": [[...], ...]}; NaN becomes null."""
+    if frame.index.name is not None:
+        frame = frame.reset_index()
+    return frame.to_json(orient="split", index=False, date_format="iso")
+
+
+def table_arrow(frame):
+    import pyarrow as pa
+
+    if frame.index.name is not None:
+        frame = frame.reset_index()
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def analysis(request, cache=result_cache.cache):
+    """(content type, body bytes) for one /analysis request body (already parsed JSON)."""
+    if not isinstance(request, dict):
+        raise RequestError(400, "request body must be a JSON object")
+    ids = {}
+    for kind in ("company", "competitor"):
+        if request.get(f"{kind}_csv") is not None:
+            ids[kind] = register_dataset(str(request[f"{kind}_csv"]).encode(), kind, cache)["dataset_id"]
+        elif request.get(kind):
+            ids[kind] = str(request[kind])
+        else:
+            raise RequestError(400, f"give either {kind!r} (a dataset id) or {kind + '_csv'!r}")
+    try:
+        cuts = request.get("thresholds") or {name: upper for name, (_, upper) in engine.default_thresholds().items()}
+        thresholds = engine.thresholds_from_cuts(cuts)
+    except (AttributeError, TypeError, ValueError) as e:
+        raise RequestError(400, f"thresholds must map tier names to upper cuts: {e}") from e
+    tables = request.get("tables") or DEFAULT_TABLES
+    tables = [tables] if isinstance(tables, str) else list(tables)
+    unknown = [name for name in tables if name not in engine.SUMMARY_TABLES or name == "sku_matrix"]
+    if unknown:
+        raise RequestError(400, f"unknown table(s) {unknown}; choose from "
+                                f"{[name for name in engine.SUMMARY_TABLES if name != 'sku_matrix']}")
+    fmt = request.get("format", "json")
+    if fmt not in ("json", "arrow"):
+        raise RequestError(400, "format must be 'json' or 'arrow'")
+    if fmt == "arrow" and len(tables) != 1:
+        raise RequestError(400, "format 'arrow' returns exactly one table; ask for one")
+
+    analysis_key, context = context_for(ids["company"], ids["competitor"], thresholds, cache)
+
+    def table(name):
+        return cache.get_or_compute(("table", analysis_key, name), lambda: engine.SUMMARY_TABLES[name](context))
+
+    if fmt == "arrow":
+        body = cache.get_or_compute(("service", "arrow", analysis_key, tables[0]), lambda: table_arrow(table(tables[0])))
+        return ARROW_MIME, body
+
+    def json_part(name):
+        return cache.get_or_compute(("service", "json", analysis_key, name), lambda: table_json(table(name)))
+
+    meta = {"company": ids["company"], "competitor": ids["competitor"], "thresholds": cuts,
+            "tiers": context["tiers"], "classifications": [str(c) for c in context["classifications"]]}
+    tables_json = ", ".join(f"{json.dumps(name)}: {json_part(name)}" for name in tables)
+    return "application/json", f'{{"meta": {json.dumps(meta)}, "tables": {{{tables_json}}}}}'.encode()
+
+
+# --- HTTP plumbing ---
+
+class Handler(BaseHTTPRequestHandler):
+    # HTTP/1.0: one request per connection, so an idle keep-alive client never holds a worker
+    server_version = "PPAService/1"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send(self, status, body, content_type="application/json"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, error):
+        payload = {"error": str(error)}
+        if error.detail is not None:
+            payload["detail"] = error.detail
+        self._send(error.status, json.dumps(payload).encode())
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY_BYTES:
+            raise RequestError(413, f"body larger than {MAX_BODY_BYTES:,} bytes")
+        return self.rfile.read(length)
+
+    def _handle(self, route):
+        start = time.perf_counter()
+        try:
+            route()
+        except RequestError as e:
+            self._send_error(e)
+        except Exception as e:  # never take the worker down with the request
+            self._send_error(RequestError(500, f"{type(e).__name__}: {e}"))
+        finally:
+            self.server.record(time.perf_counter() - start)
+
+    def do_GET(self):
+        def route():
+            if urlparse(self.path).path != "/health":
+                raise RequestError(404, "not found")
+            self._send(200, json.dumps({"status": "ok", **self.server.stats(),
+                                        "cache": result_cache.cache.stats()}).encode())
+        self._handle(route)
+
+    def do_POST(self):
+        def route():
+            url = urlparse(self.path)
+            if url.path == "/datasets":
+                kind = parse_qs(url.query).get("kind", ["company"])[0]
+                self._send(200, json.dumps(register_dataset(self._body(), kind)).encode())
+            elif url.path == "/analysis":
+                try:
+                    request = json.loads(self._body() or b"{}")
+                except ValueError as e:
+                    raise RequestError(400, f"invalid JSON: {e}") from e
+                content_type, body = analysis(request)
+                self._send(200, body, content_type)
+            else:
+                raise RequestError(404, "not found")
+        self._handle(route)
+
+
+class PPAServer(HTTPServer):
+    """HTTPServer with a bounded worker pool and a bounded wait queue.
+
+    A connection is accepted only if a worker or a queue slot is free;
+    otherwise it gets an immediate 503 so overload shows up as fast
+    refusals rather than unbounded threads and memory.
+    """
+
+    # Listen backlog: the socketserver default of 5 drops bursts of connects into 1 s SYN retries
+    request_queue_size = 1024
+
+    def __init__(self, address, workers=DEFAULT_WORKERS, queue=DEFAULT_QUEUE, verbose=False):
+        super().__init__(address, Handler)
+        self.verbose = verbose
+        self.workers = workers
+        self.queue = queue
+        self._pool = ThreadPoolExecutor(workers, thread_name_prefix="ppa-service")
+        self._slots = threading.BoundedSemaphore(workers + queue)
+        self._refusals = ThreadPoolExecutor(REFUSE_WORKERS, thread_name_prefix="ppa-refuse")
+        self._refusal_slots = threading.BoundedSemaphore(REFUSE_BACKLOG)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.rejected = 0
+        self.busy_seconds = 0.0
+
+    def process_request(self, request, client_address):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            # Refusals run on their own small pool so the accept loop never waits on a client
+            if self._refusal_slots.acquire(blocking=False):
+                self._refusals.submit(self._refuse, request)
+            else:
+                self.shutdown_request(request)
+            return
+        self._pool.submit(self._process, request, client_address)
+
+    def _process(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self._slots.release()
+
+    def _refuse(self, request):
+        """Answer 503 after reading the request, so the client sees the status rather than a reset."""
+        try:
+            request.settimeout(REFUSE_READ_SECONDS)
+            received = b""
+            while b"\r\n\r\n" not in received and len(received) < 65536:
+                chunk = request.recv(65536)
+                if not chunk:
+                    break
+                received += chunk
+            head, _, body = received.partition(b"\r\n\r\n")
+            length = next((int(line.split(b":", 1)[1]) for line in head.split(b"\r\n")
+                           if line.lower().startswith(b"content-length:")), 0)
+            while len(body) < min(length, MAX_REFUSED_BODY_BYTES):
+                chunk = request.recv(65536)
+                if not chunk:
+                    break
+                body += chunk
+            payload = b'{"error": "server busy, retry shortly"}'
+            request.sendall(b"HTTP/1.0 503 Service Unavailable\r\nContent-Type: application/json\r\n"
+                            b"Retry-After: 1\r\n" + f"Content-Length: {len(payload)}\r\n\r\n".encode() + payload)
+        except (OSError, ValueError):
+            pass
+        finally:
+            self.shutdown_request(request)
+            self._refusal_slots.release()
+
+    def record(self, seconds):
+        with self._lock:
+            self.requests += 1
+            self.busy_seconds += seconds
+
+    def stats(self):
+        with self._lock:
+            return {"workers": self.workers, "queue": self.queue, "requests": self.requests,
+                    "rejected": self.rejected, "busy_seconds": round(self.busy_seconds, 3)}
+
+    def server_close(self):
+        super().server_close()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        self._refusals.shutdown(wait=False, cancel_futures=True)
+
+
+def serve(host="127.0.0.1", port=DEFAULT_PORT, workers=DEFAULT_WORKERS, queue=DEFAULT_QUEUE, verbose=False):
+    server = PPAServer((host, port), workers, queue, verbose)
+    print(f"PPA service on http://{host}:{server.server_address[1]} ({workers} workers, queue {queue})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the PPA tables over HTTP (JSON or Arrow).")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Requests handled at once")
+    parser.add_argument("--queue", type=int, default=DEFAULT_QUEUE, help="Requests allowed to wait for a worker")
+    parser.add_argument("--verbose", action="store_true", help="Log every request")
+    args = parser.parse_args(argv)
+    serve(args.host, args.port, args.workers, args.queue, args.verbose)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,128 @@
+"""Import-time and first-paint budget check for the Streamlit page.
+
+    python startup_budget.py            # prints timings, exits 1 if over budget
+
+The test suite only checks what does not depend on the machine (heavy
+modules stay lazy, the page runs); the millisecond budgets are checked
+here, where a slow or busy box shows up as a number rather than a flaky test.
+
+Each measurement runs in a fresh interpreter so earlier imports cannot hide
+cold-start cost. "First paint" is a headless run of app.py with no uploads
+(what a new session sees first); "rerun" is the second run of the same
+session. Heavy plotting dependencies must not be imported by either.
+"""
+import ast
+import json
+import os
+import subprocess
+import sys
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Budgets in milliseconds, generous enough for a shared CI box
+IMPORT_BUDGET_MS = 1500
+FIRST_PAINT_BUDGET_MS = 4000
+RERUN_BUDGET_MS = 500
+
+
+
+def app_imports(path=os.path.join(HERE, "app.py")):
+    """Modules app.py imports at module level, in order (imports inside functions are lazy)."""
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read(), filename=path)
+    names = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            names.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            names.append(node.module)
+    return list(dict.fromkeys(names))
+
+
+# Modules app.py imports at the top, before any section is shown; streamlit
+# itself is part of first paint
+EAGER_MODULES = [name for name in app_imports() if name.split(".")[0] != "streamlit"]
+# Chart libraries must wait for a chart; the template writer may load on first paint
+PLOT_MODULES = ["matplotlib", "adjustText", "seaborn"]
+LAZY_MODULES = PLOT_MODULES + ["xlsxwriter"]
+
+_IMPORT_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+for name in {modules!r}:
+    __import__(name)
+elapsed = (time.perf_counter() - start) * 1000
+print(json.dumps({{"import_ms": elapsed, "loaded": sorted(m for m in {lazy!r} if m in sys.modules)}}))
+"""
+
+_PAINT_PROBE = """
+import json, sys, time
+from streamlit.testing.v1 import AppTest
+app = AppTest.from_file("app.py", default_timeout=60)
+start = time.perf_counter()
+app.run()
+first = (time.perf_counter() - start) * 1000
+start = time.perf_counter()
+app.run()
+rerun = (time.perf_counter() - start) * 1000
+print(json.dumps({{
+    "first_paint_ms": first,
+    "rerun_ms": rerun,
+    "errors": [str(e.value) for e in app.exception],
+    "loaded": sorted(m for m in {lazy!r} if m in sys.modules),
+}}))
+"""
+
+
+def _probe(code):
+    out = subprocess.run([sys.executable, "-c", code], cwd=HERE, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def measure():
+    imports = _probe(_IMPORT_PROBE.format(modules=EAGER_MODULES, lazy=LAZY_MODULES))
+    paint = _probe(_PAINT_PROBE.format(lazy=PLOT_MODULES))
+    return {
+        "import_ms": imports["import_ms"],
+        "first_paint_ms": paint["first_paint_ms"],
+        "rerun_ms": paint["rerun_ms"],
+        "app_errors": paint["errors"],
+        "lazy_modules_loaded": sorted(set(imports["loaded"]) | set(paint["loaded"])),
+    }
+
+
+def violations(result, timings=True):
+    """Budget problems in a measure() result; ``timings=False`` keeps only the machine-independent ones."""
+    problems = []
+    if timings:
+        problems += _timing_violations(result)
+    if result["lazy_modules_loaded"]:
+        problems.append(f"heavy modules loaded before any chart: {', '.join(result['lazy_modules_loaded'])}")
+    if result["app_errors"]:
+        problems.append(f"app raised: {result['app_errors']}")
+    return problems
+
+
+def _timing_violations(result):
+    problems = []
+    if result["import_ms"] > IMPORT_BUDGET_MS:
+        problems.append(f"engine imports took {result['import_ms']:.0f} ms (budget {IMPORT_BUDGET_MS} ms)")
+    if result["first_paint_ms"] > FIRST_PAINT_BUDGET_MS:
+        problems.append(f"first paint took {result['first_paint_ms']:.0f} ms (budget {FIRST_PAINT_BUDGET_MS} ms)")
+    if result["rerun_ms"] > RERUN_BUDGET_MS:
+        problems.append(f"rerun took {result['rerun_ms']:.0f} ms (budget {RERUN_BUDGET_MS} ms)")
+    return problems
+
+
+def main():
+    result = measure()
+    print(json.dumps(result, indent=2))
+    problems = violations(result)
+    for problem in problems:
+        print(f"OVER BUDGET: {problem}")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
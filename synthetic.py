@@ -0,0 +1,168 @@
+"""Synthetic company and competitor files in the upload template schema.
+
+    python synthetic.py --rows 1000000 --out data/1m --format parquet
+
+Generated data is meant to behave like real scan data for the expensive
+paths: brand sales follow a Zipf curve (a few brands hold most of the
+market), classifications have uneven sizes, PPW is lognormal around the
+default tier cuts with per-brand and per-classification premiums, and a
+share of SKUs are new launches with zero previous sales. The same seed and
+chunk size always produce the same files.
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+import engine
+
+
+TEMPLATE_COLS = [
+    "SKU", "Pack Size", "Price", "Number of Washes",
+    "Classification", "Price Tier", "Parent Brand",
+    "Previous Volume", "Present Volume", "Previous Net Sales", "Present Net Sales", "Shelf Row",
+]
+
+WASH_COUNTS = np.array([10, 15, 20, 30, 40, 50, 60, 80, 100])
+DEFAULT_CHUNK_ROWS = 1_000_000
+# The file's own "Price Tier" column, as a retailer would have labelled it
+DEFAULT_LADDER = engine.tier_ladder(engine.default_thresholds())
+
+
+def company_rows_for(rows):
+    """Our own range: about 2% of the market, between 20 and 20k SKUs."""
+    return int(min(max(rows // 50, 20), 20_000))
+
+
+class Market:
+    """Fixed brand, classification and price structure for one seed."""
+
+    def __init__(self, seed=0, classifications=4, brands=200, company_brands=3, zero_previous=0.08):
+        rng = np.random.default_rng([seed, 0])
+        self.seed = seed
+        self.zero_previous = zero_previous
+        self.classifications = np.array([f"Class {i + 1:02d}" for i in range(classifications)], dtype=object)
+        self.class_weights = rng.dirichlet(np.full(classifications, 2.0))
+        self.class_premium = rng.normal(0, 0.15, classifications)
+
+        self.brands = np.array([f"Brand {i + 1:03d}" for i in range(brands)], dtype=object)
+        ranks = np.arange(1, brands + 1)
+        self.brand_weights = (1 / ranks ** 1.1) / (1 / ranks ** 1.1).sum()
+        self.brand_premium = rng.normal(0, 0.2, brands)
+        self.brand_scale = brands * self.brand_weights
+
+        self.company_brands = np.array([f"Our Brand {chr(65 + i)}" for i in range(company_brands)], dtype=object)
+        self.company_premium = rng.normal(0.05, 0.1, company_brands)
+
+    def _rows(self, rng, n, brand_names, brand_weights, brand_premium, brand_scale, sku_prefix, sku_start):
+        cls = rng.choice(len(self.classifications), size=n, p=self.class_weights)
+        brand = rng.choice(len(brand_names), size=n, p=brand_weights)
+        washes = rng.choice(WASH_COUNTS, size=n)
+
+        # Lognormal PPW centred between the default Value and Mainstream cuts
+        ppw = rng.lognormal(np.log(0.15) + self.class_premium[cls] + brand_premium[brand], 0.3)
+        price = np.round(ppw * washes, 2)
+        ppw = price / washes
+
+        present_volume = np.round(rng.lognormal(5, 1.2, n) * brand_scale[brand])
+        growth = rng.lognormal(0.03, 0.25, n)
+        previous_volume = np.round(present_volume / growth)
+        previous_volume[rng.random(n) < self.zero_previous] = 0
+        discount = 1 - rng.uniform(0, 0.15, n)
+        previous_discount = 1 - rng.uniform(0, 0.15, n)
+
+        return pd.DataFrame({
+            "SKU": np.char.add(sku_prefix, (np.arange(n) + sku_start).astype(str)).astype(object),
+            "Pack Size": np.char.add((washes * 50).astype(str), "g").astype(object),
+            "Price": price,
+            "Number of Washes": washes,
+            "Classification": self.classifications[cls],
+            "Price Tier": np.asarray(engine.assign_tiers(ppw, *DEFAULT_LADDER), dtype=object),
+            "Parent Brand": brand_names[brand],
+            "Previous Volume": previous_volume,
+            "Present Volume": present_volume,
+            "Previous Net Sales": np.round(previous_volume * price * previous_discount, 2),
+            "Present Net Sales": np.round(present_volume * price * discount, 2),
+            "Shelf Row": rng.integers(1, 7, n),
+        }, columns=TEMPLATE_COLS)
+
+    def company(self, rows):
+        rng = np.random.default_rng([self.seed, 1])
+        weights = np.full(len(self.company_brands), 1 / len(self.company_brands))
+        return self._rows(rng, rows, self.company_brands, weights, self.company_premium,
+                          np.full(len(self.company_brands), 5.0), "OWN-", 1)
+
+    def competitor_chunks(self, rows, chunk_rows=DEFAULT_CHUNK_ROWS):
+        """Competitor rows in chunks, so 10M-row files never sit in memory at once."""
+        for i, start in enumerate(range(0, rows, chunk_rows)):
+            rng = np.random.default_rng([self.seed, 2, i])
+            yield self._rows(rng, min(chunk_rows, rows - start), self.brands, self.brand_weights,
+                             self.brand_premium, self.brand_scale, "CMP-", start + 1)
+
+    def competitor(self, rows, chunk_rows=DEFAULT_CHUNK_ROWS):
+        return pd.concat(list(self.competitor_chunks(rows, chunk_rows)), ignore_index=True)
+
+
+def generate(rows, seed=0, classifications=4, brands=200, company_rows=None, zero_previous=0.08):
+    """(company_df, competitor_df) with ``rows`` competitor rows."""
+    market = Market(seed, classifications, brands, zero_previous=zero_previous)
+    company_rows = company_rows_for(rows) if company_rows is None else company_rows
+    return market.company(company_rows), market.competitor(rows)
+
+
+def write_dataset(out_dir, rows, fmt="csv", seed=0, classifications=4, brands=200, company_rows=None,
+                  zero_previous=0.08, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Write company.<fmt> and competitor.<fmt>, streaming the competitor file chunk by chunk."""
+    os.makedirs(out_dir, exist_ok=True)
+    market = Market(seed, classifications, brands, zero_previous=zero_previous)
+    company_rows = company_rows_for(rows) if company_rows is None else company_rows
+    paths = {name: os.path.join(out_dir, f"{name}.{fmt}") for name in ("company", "competitor")}
+
+    if fmt == "csv":
+        market.company(company_rows).to_csv(paths["company"], index=False)
+        with open(paths["competitor"], "w", newline="", encoding="utf-8") as f:
+            for i, chunk in enumerate(market.competitor_chunks(rows, chunk_rows)):
+                chunk.to_csv(f, index=False, header=(i == 0))
+    elif fmt == "parquet":
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        market.company(company_rows).to_parquet(paths["company"], index=False)
+        writer = None
+        try:
+            for chunk in market.competitor_chunks(rows, chunk_rows):
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(paths["competitor"], table.schema)
+                writer.write_table(table)
+        finally:
+            if writer is not None:
+                writer.close()
+    else:
+        raise ValueError(f"Unsupported format {fmt!r}; use csv or parquet")
+    return paths
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write a synthetic company / competitor dataset.")
+    parser.add_argument("--rows", type=int, default=100_000, help="Competitor rows (1k to 10M)")
+    parser.add_argument("--out", default="synthetic_data", help="Output directory")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--classifications", type=int, default=4)
+    parser.add_argument("--brands", type=int, default=200)
+    parser.add_argument("--company-rows", type=int, default=None, help="Default: about 2%% of --rows")
+    parser.add_argument("--zero-previous", type=float, default=0.08, help="Share of SKUs with no previous sales")
+    args = parser.parse_args(argv)
+
+    paths = write_dataset(args.out, args.rows, args.format, args.seed, args.classifications, args.brands,
+                          args.company_rows, args.zero_previous)
+    for path in paths.values():
+        print(f"{path}  {os.path.getsize(path) / 1e6:.1f} MB")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,33 @@
+"""batch.run_batch keeps going when a worker process dies."""
+import multiprocessing
+import os
+
+import pytest
+
+import batch
+import synthetic
+
+
+def _crash_or_run(market, out_dir, report_format="csv"):
+    if market["name"] == "crash":
+        os._exit(9)
+    return _run_market(market, out_dir, report_format)
+
+
+_run_market = batch.run_market
+
+
+@pytest.mark.skipif(multiprocessing.get_start_method() != "fork",
+                    reason="workers must inherit the patched run_market")
+def test_worker_death_fails_only_its_market(tmp_path, monkeypatch):
+    paths = synthetic.write_dataset(str(tmp_path / "data"), 2000, company_rows=50)
+    market = {**batch.DEFAULTS, "company": paths["company"], "competitor": paths["competitor"]}
+    markets = [{**market, "name": name} for name in ["a", "crash", "b", "c"]]
+    markets.append({**market, "name": "streamed", "stream_competitor": True})
+    monkeypatch.setattr(batch, "run_market", _crash_or_run)
+
+    statuses = batch.run_batch(markets, str(tmp_path / "out"), workers=2)
+
+    assert [s["name"] for s in statuses] == [m["name"] for m in markets]
+    assert {s["name"] for s in statuses if s["status"] != "ok"} == {"crash"}
+    assert "BrokenProcessPool" in statuses[1]["error"]
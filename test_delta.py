@@ -0,0 +1,140 @@
+"""Patched datasets (delta.py) against a full recompute of the same rows."""
+import numpy as np
+import pandas as pd
+import pytest
+
+import delta
+import engine
+import synthetic
+import tier_index
+import validation
+
+
+THRESHOLDS = [engine.default_thresholds(), engine.default_thresholds(.11, .2, .9)]
+
+
+def _validated(raw, kind):
+    frame, problems = validation.validate(raw, kind)
+    assert not len(validation.errors(problems))
+    return frame
+
+
+def _delta(kind, raw):
+    upserts, deletes, problems = validation.validate_delta(raw.reset_index(drop=True), kind)
+    assert not len(validation.errors(problems)), problems
+    return delta.Delta(kind, upserts, deletes)
+
+
+def _assert_matches_recompute(patched):
+    for thresholds in THRESHOLDS:
+        assert delta.verify(patched, thresholds) == {}
+
+
+@pytest.fixture(scope="module")
+def market():
+    m = synthetic.Market(3, classifications=4, brands=30)
+    company = _validated(m.company(300), "company")
+    competitor = _validated(m.competitor(3000), "competitor")
+    return delta.apply(company, competitor)
+
+
+def _updates(frame, rng, n):
+    rows = frame.iloc[rng.choice(len(frame), n, replace=False)].drop(columns="Price per Wash")
+    return rows.assign(Price=rows["Price"] * rng.uniform(.5, 2, n),
+                       **{"Present Net Sales": rows["Present Net Sales"] * 1.1, "Action": "update"})
+
+
+def _inserts(frame, rng, n, tag):
+    rows = frame.iloc[rng.choice(len(frame), n, replace=False)].drop(columns="Price per Wash")
+    return rows.assign(SKU=[f"NEW-{tag}-{i}" for i in range(n)], Action="insert")
+
+
+def _deletes(frame, rng, n):
+    return frame.iloc[rng.choice(len(frame), n, replace=False)][["SKU"]].assign(Action="delete")
+
+
+def test_insert_matches_recompute(market):
+    rng = np.random.default_rng(0)
+    patched = delta.Patched(market.company_df, market.competitor_df, market.combined_df, market.index,
+                            _delta("company", _inserts(market.company_df, rng, 5, "c")),
+                            _delta("competitor", _inserts(market.competitor_df, rng, 40, "k")))
+    assert len(patched.competitor_df) == len(market.competitor_df) + 40
+    _assert_matches_recompute(patched)
+
+
+def test_update_matches_recompute(market):
+    rng = np.random.default_rng(1)
+    patched = delta.Patched(market.company_df, market.competitor_df, market.combined_df, market.index,
+                            _delta("company", _updates(market.company_df, rng, 10)),
+                            _delta("competitor", _updates(market.competitor_df, rng, 60)))
+    _assert_matches_recompute(patched)
+
+
+def test_delete_matches_recompute(market):
+    rng = np.random.default_rng(2)
+    patched = delta.Patched(market.company_df, market.competitor_df, market.combined_df, market.index,
+                            _delta("company", _deletes(market.company_df, rng, 8)),
+                            _delta("competitor", _deletes(market.competitor_df, rng, 50)))
+    assert len(patched.company_df) == len(market.company_df) - 8
+    _assert_matches_recompute(patched)
+
+
+def test_patched_rows_are_the_corrected_file(market):
+    rng = np.random.default_rng(3)
+    updates = _updates(market.competitor_df, rng, 20)
+    patched = delta.Patched(market.company_df, market.competitor_df, market.combined_df, market.index,
+                            competitor_delta=_delta("competitor", updates))
+    got = patched.competitor_df.set_index("SKU").loc[updates["SKU"], "Price"].to_numpy()
+    np.testing.assert_allclose(got, updates["Price"].to_numpy())
+    assert list(patched.competitor_df["SKU"]) == list(market.competitor_df["SKU"])
+
+
+def _small_company():
+    n = 20
+    return _validated(pd.DataFrame({
+        "SKU": [f"S{i}" for i in range(n)], "Pack Size": "1kg", "Price": np.arange(1, n + 1, dtype=float),
+        "Number of Washes": 10.0, "Classification": "Powder", "Price Tier": "Value", "Parent Brand": "Ours",
+        "Previous Volume": 1.0, "Present Volume": 1.0, "Previous Net Sales": 100.0, "Present Net Sales": 100.0,
+        "Shelf Row": 1,
+    }), "company")
+
+
+def test_correcting_a_sku_twice_removes_its_own_entry():
+    company = _small_company()
+    competitor = _validated(company.drop(columns="Price per Wash").assign(
+        SKU=lambda f: "K" + f["SKU"], **{"Parent Brand": "Rival"}), "competitor")
+    first = delta.apply(company, competitor)
+    # S1 takes S0's PPW with other sums: two sorted entries now tie on (group, PPW)
+    s1 = company.loc[company["SKU"] == "S1"].drop(columns="Price per Wash")
+    once = delta.Patched(first.company_df, first.competitor_df, first.combined_df, first.index,
+                         _delta("company", s1.assign(Price=1.0, **{"Present Net Sales": 500.0}, Action="update")))
+    _assert_matches_recompute(once)
+    twice = delta.Patched(once.company_df, once.competitor_df, once.combined_df, once.index,
+                          _delta("company", s1.assign(Price=3.0, Action="update")))
+    _assert_matches_recompute(twice)
+
+
+def test_chained_patches_match_recompute(market):
+    rng = np.random.default_rng(4)
+    patched = market
+    for step in range(8):
+        frame = patched.competitor_df
+        raw = pd.concat([_updates(frame, rng, 15), _inserts(frame, rng, 5, f"chain{step}")])
+        others = frame[~frame["SKU"].isin(raw["SKU"])]
+        raw = pd.concat([raw, _deletes(others, rng, 5)])
+        patched = delta.Patched(patched.company_df, patched.competitor_df, patched.combined_df, patched.index,
+                                competitor_delta=_delta("competitor", raw))
+        _assert_matches_recompute(patched)
+
+
+def test_patches_across_compaction(market):
+    rng = np.random.default_rng(5)
+    patched = market
+    steps = int(tier_index.COMPACT_FRACTION * len(market.combined_df) / 200) + 2
+    compacted = False
+    for _ in range(steps):
+        patched = delta.Patched(patched.company_df, patched.competitor_df, patched.combined_df, patched.index,
+                                competitor_delta=_delta("competitor", _updates(patched.competitor_df, rng, 200)))
+        compacted |= not len(patched.index.removed)
+    assert compacted
+    _assert_matches_recompute(patched)
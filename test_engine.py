@@ -0,0 +1,170 @@
+"""engine.compute_ppa against the page's original loop-and-mask computations."""
+import numpy as np
+import pandas as pd
+import pytest
+
+import engine
+import synthetic
+import validation
+
+
+THRESHOLDS = engine.default_thresholds(.13, .17, .3)
+TIERS = ["Premium", "Mainstream", "Value"]
+
+
+def _validated(raw, kind):
+    frame, problems = validation.validate(raw, kind)
+    assert not len(validation.errors(problems))
+    return frame
+
+
+@pytest.fixture(scope="module")
+def frames():
+    market = synthetic.Market(3, classifications=4, brands=30)
+    return _validated(market.company(200), "company"), _validated(market.competitor(2000), "competitor")
+
+
+def _assign_tier(ppw, thresholds):
+    for tier in ("Value", "Mainstream", "Premium"):
+        if ppw <= thresholds[tier][1]:
+            return tier
+    return "Others"
+
+
+def _growth(curr, prev):
+    return (curr - prev) / prev * 100 if prev else 0
+
+
+def _share(part, total):
+    return part / total * 100 if total else 0
+
+
+def _baseline(company_df, competitor_df, thresholds):
+    """The metrics as the page computed them before the engine, one boolean mask per group."""
+    company_df = company_df.assign(**{
+        "Calculated Price Tier": company_df["Price per Wash"].apply(lambda x: _assign_tier(x, thresholds)),
+        "Is Competitor": False,
+    })
+    competitor_df = competitor_df.assign(**{
+        "Calculated Price Tier": competitor_df["Price per Wash"].apply(lambda x: _assign_tier(x, thresholds)),
+        "Is Competitor": True,
+    })
+    valid_company_df = company_df[
+        ~((company_df["Previous Volume"].fillna(0) == 0) & (company_df["Previous Net Sales"].fillna(0) == 0))
+    ]
+    full_df = pd.concat([company_df, competitor_df], ignore_index=True)
+    classifications = sorted(full_df["Classification"].unique())
+    total_prev = full_df["Previous Net Sales"].sum()
+    total_curr = full_df["Present Net Sales"].sum()
+    out = {"classification_metrics": {}, "tier_metrics": {}, "classification_summary": {}, "tier_summary": {},
+           "tier_class_matrix": {}, "brand_summary": {}, "api": []}
+
+    for key, names, store in (("Classification", classifications, "classification_metrics"),
+                              ("Calculated Price Tier", TIERS, "tier_metrics")):
+        for name in names:
+            group = full_df[full_df[key] == name]
+            prev = valid_company_df[valid_company_df[key] == name]["Previous Net Sales"].sum()
+            curr = group["Present Net Sales"].sum()
+            out[store][name] = (_growth(curr, prev), _share(curr, total_curr),
+                                group["Price per Wash"].min(), group["Price per Wash"].max())
+
+    for key, names, store in (("Classification", classifications, "classification_summary"),
+                              ("Calculated Price Tier", TIERS, "tier_summary")):
+        for name in names:
+            group = full_df[full_df[key] == name]
+            prev, curr = group["Previous Net Sales"].sum(), group["Present Net Sales"].sum()
+            out[store][name] = (_growth(curr, prev), _share(curr, total_curr))
+
+    for tier in TIERS:
+        for cls in classifications:
+            cell = full_df[(full_df["Calculated Price Tier"] == tier) & (full_df["Classification"] == cls)]
+            if not cell.empty:
+                present, previous = cell["Present Net Sales"].sum(), cell["Previous Net Sales"].sum()
+                ours = cell[cell["Is Competitor"] == False]["Present Net Sales"].sum()  # noqa: E712
+                out["tier_class_matrix"][(tier, cls)] = (present, _share(ours, present), _growth(present, previous))
+
+    for brand in sorted(full_df["Parent Brand"].dropna().unique()):
+        brand_df = full_df[full_df["Parent Brand"] == brand]
+        prev_share = _share(brand_df["Previous Net Sales"].sum(), total_prev)
+        curr_share = _share(brand_df["Present Net Sales"].sum(), total_curr)
+        out["brand_summary"][brand] = (prev_share, curr_share, (curr_share - prev_share) * 100)
+
+    for cls in classifications:
+        for tier in TIERS:
+            segment = full_df[(full_df["Classification"] == cls) & (full_df["Calculated Price Tier"] == tier)]
+            ours, comp = segment[~segment["Is Competitor"]], segment[segment["Is Competitor"]]
+            if not comp.empty:
+                avg = comp["Price per Wash"].mean()
+                out["api"] += [(cls, tier, row["SKU"], row["Price per Wash"], avg, row["Price per Wash"] / avg)
+                               for _, row in ours.iterrows()]
+
+    out["sku_matrix"] = {tier: {cls: [] for cls in classifications} for tier in TIERS}
+    for _, row in company_df.iterrows():
+        if row["Calculated Price Tier"] in out["sku_matrix"]:
+            out["sku_matrix"][row["Calculated Price Tier"]][row["Classification"]].append(row["SKU"])
+    return out
+
+
+@pytest.fixture(scope="module")
+def both(frames):
+    return engine.compute_ppa(*frames, THRESHOLDS), _baseline(*frames, THRESHOLDS)
+
+
+def _close(actual, expected):
+    np.testing.assert_allclose(np.asarray(actual, dtype="float64"), np.asarray(expected, dtype="float64"),
+                               rtol=1e-9, atol=1e-9)
+
+
+@pytest.mark.parametrize("name", ["classification_metrics", "tier_metrics"])
+def test_metrics_match_baseline(both, name):
+    results, baseline = both
+    table = results[name]
+    assert list(table.index) == list(baseline[name])
+    _close(table[["Growth", "Share", "PPW Min", "PPW Max"]].to_numpy(), list(baseline[name].values()))
+
+
+@pytest.mark.parametrize("name, key", [("classification_summary", "Classification"), ("tier_summary", "Price Tier")])
+def test_summaries_match_baseline(both, name, key):
+    results, baseline = both
+    table = results[name]
+    assert list(table[key]) == list(baseline[name])
+    _close(table[["Sales Value Growth %", "Value Share %"]].to_numpy(), list(baseline[name].values()))
+
+
+def test_tier_class_matrix_matches_baseline(both):
+    results, baseline = both
+    cells = results["tier_class_matrix"]
+    cells = cells[cells["Has SKUs"]].set_index(["Calculated Price Tier", "Classification"])
+    assert list(cells.index) == list(baseline["tier_class_matrix"])
+    _close(cells[["Present Net Sales", "Share %", "Growth %"]].to_numpy(),
+           list(baseline["tier_class_matrix"].values()))
+
+
+def test_brand_summary_matches_baseline(both):
+    results, baseline = both
+    brands = results["brand_summary"].set_index("Parent Brand").sort_index()
+    assert list(brands.index) == list(baseline["brand_summary"])
+    _close(brands[["Previous Share %", "Current Share %", "BPS Change"]].to_numpy(),
+           list(baseline["brand_summary"].values()))
+    assert results["brand_summary"]["Current Share %"].is_monotonic_decreasing
+
+
+def test_api_and_sku_matrix_match_baseline(both):
+    results, baseline = both
+    api = results["api"]
+    expected = pd.DataFrame(baseline["api"], columns=list(api.columns))
+    assert api[["Classification", "Price Tier", "Our SKU"]].astype(str).values.tolist() == \
+        expected[["Classification", "Price Tier", "Our SKU"]].astype(str).values.tolist()
+    _close(api.iloc[:, 3:].to_numpy(), expected.iloc[:, 3:].to_numpy())
+    filled = {tier: {cls: skus for cls, skus in cells.items() if skus}
+              for tier, cells in baseline["sku_matrix"].items()}
+    assert results["sku_matrix"] == {tier: cells for tier, cells in filled.items() if cells}
+
+
+def test_segment_table_merges_like_one_pass(frames):
+    full_df = engine.classify(engine.combine(*frames), THRESHOLDS)
+    whole = engine.segment_table(full_df)
+    merged = engine.merge_segments(engine.segment_table(full_df.iloc[:700]), engine.segment_table(full_df.iloc[700:]))
+    key = engine.SEGMENT_KEYS
+    order = lambda t: t.astype({col: str for col in key}).sort_values(key).reset_index(drop=True)
+    pd.testing.assert_frame_equal(order(merged), order(whole), check_exact=False, rtol=1e-12)
@@ -0,0 +1,133 @@
+"""Streamed aggregates (ingest.stream_*) against the in-memory engine on the same files."""
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import engine
+import ingest
+import validation
+
+
+THRESHOLDS = engine.default_thresholds(.13, .17, 1)
+
+
+def _raw(n, seed, prefix):
+    # Whole prices, power-of-two wash counts and whole sales: every sum is exact in
+    # any order, so streamed and in-memory results can be compared exactly
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "SKU": [f"{prefix}{i}" for i in range(n)],
+        "Pack Size": "1kg",
+        "Price": rng.integers(1, 40, n).astype(float),
+        "Number of Washes": rng.choice([4.0, 8.0, 16.0, 32.0, 64.0], n),
+        "Classification": rng.choice(["Powder", "Liquid", "Bar"], n),
+        "Price Tier": "Value",
+        "Parent Brand": rng.choice([f"Brand {i}" for i in range(12)], n),
+        "Previous Volume": rng.integers(0, 500, n).astype(float),
+        "Present Volume": rng.integers(0, 500, n).astype(float),
+        "Previous Net Sales": rng.integers(0, 10_000, n).astype(float),
+        "Present Net Sales": rng.integers(0, 10_000, n).astype(float),
+        "Shelf Row": rng.integers(1, 4, n),
+    })
+
+
+def _file(raw, fmt):
+    buffer = io.BytesIO()
+    if fmt == "csv":
+        raw.to_csv(buffer, index=False)
+    else:
+        getattr(raw, f"to_{fmt}")(buffer)
+    return buffer.getvalue()
+
+
+def _plain(table):
+    # The in-memory path keeps grouping keys categorical; compare values, not dtypes
+    return table.astype({col: str for col in table.columns if isinstance(table[col].dtype, pd.CategoricalDtype)})
+
+
+def _assert_same_results(expected, actual):
+    for name, table in expected.items():
+        if isinstance(table, pd.DataFrame) and name not in ("full_df", "segments"):
+            pd.testing.assert_frame_equal(_plain(actual[name]), _plain(table), check_exact=True, obj=name)
+    assert actual["sku_matrix"] == expected["sku_matrix"]
+
+
+@pytest.mark.parametrize("fmt", ["csv", "parquet", "feather"])
+def test_streamed_ppa_equals_in_memory(fmt):
+    company = validation.check(_raw(40, 1, "OWN-"), "company")
+    competitor_raw = _raw(2000, 2, "K-")
+    expected = engine.compute_ppa(company, validation.check(competitor_raw, "competitor"), THRESHOLDS)
+    actual = ingest.stream_ppa(company, _file(competitor_raw, fmt), THRESHOLDS, chunksize=177)
+    _assert_same_results(expected, actual)
+
+
+def test_streamed_segments_equal_segment_table():
+    raw = _raw(1500, 3, "K-")
+    full_df = engine.classify(engine.combine(validation.check(raw.head(0), "company"),
+                                             validation.check(raw, "competitor")), THRESHOLDS)
+    key = engine.SEGMENT_KEYS
+    expected = engine.segment_table(full_df).astype({col: object for col in key})
+    actual = ingest.stream_segments(_file(raw, "csv"), THRESHOLDS, chunksize=100).astype({col: object for col in key})
+    order = lambda t: t.sort_values(key, key=lambda s: s.astype(str)).reset_index(drop=True)
+    pd.testing.assert_frame_equal(order(actual), order(expected), check_exact=True, check_dtype=False)
+
+
+def test_missing_optional_columns_stream():
+    raw = _raw(600, 4, "K-").drop(columns=["Previous Volume", "Present Volume", "Shelf Row"])
+    company = validation.check(_raw(20, 5, "OWN-"), "company")
+    expected = engine.compute_ppa(company, validation.check(raw, "competitor"), THRESHOLDS)
+    _assert_same_results(expected, ingest.stream_ppa(company, _file(raw, "csv"), THRESHOLDS, chunksize=150))
+
+
+@pytest.mark.parametrize("fmt", ["csv", "parquet"])
+def test_dirty_file_is_rejected_like_in_memory(fmt):
+    raw = _raw(900, 6, "K-").astype({"Price": str})
+    raw.loc[450, "Price"] = "twelve"
+    raw.loc[700, "Number of Washes"] = 0.0
+    data = _file(raw, fmt)
+    _, in_memory = ingest.parse_upload(data, kind="competitor")
+    with pytest.raises(validation.ValidationError) as streamed:
+        ingest.stream_aggregates(data, THRESHOLDS, chunksize=200)
+    errors = lambda problems: validation.errors(problems)[["Row", "SKU", "Column", "Problem"]].reset_index(drop=True)
+    assert len(errors(in_memory)) == 2
+    pd.testing.assert_frame_equal(errors(streamed.value.problems).astype(str), errors(in_memory).astype(str))
+
+
+def test_duplicate_sku_across_chunks_is_rejected():
+    raw = _raw(500, 7, "K-")
+    raw.loc[400, "SKU"] = raw.loc[10, "SKU"]
+    with pytest.raises(validation.ValidationError, match="duplicate SKU"):
+        ingest.stream_aggregates(_file(raw, "csv"), THRESHOLDS, chunksize=100)
+
+
+def test_missing_required_column_is_rejected():
+    with pytest.raises(validation.ValidationError, match="required column is missing"):
+        ingest.stream_aggregates(_file(_raw(50, 8, "K-").drop(columns="Price"), "csv"), THRESHOLDS)
+
+
+@pytest.mark.parametrize("fmt, expected", [("csv", "csv"), ("parquet", "parquet"), ("feather", "arrow")])
+def test_detect_format_peeks_open_handles(fmt, expected):
+    handle = io.BytesIO(_file(_raw(30, 9, "K-"), fmt))
+    handle.seek(5)
+    assert ingest.detect_format(data=handle) == expected
+    assert handle.tell() == 5
+    handle.seek(0)
+    assert len(ingest.read_columnar(handle) if fmt != "csv" else pd.read_csv(handle)) == 30
+
+
+@pytest.mark.parametrize("fmt", ["csv", "parquet", "feather"])
+def test_streamed_handle_equals_bytes(fmt):
+    data = _file(_raw(400, 10, "K-"), fmt)
+    expected = ingest.stream_segments(data, THRESHOLDS, chunksize=64)
+    pd.testing.assert_frame_equal(ingest.stream_segments(io.BytesIO(data), THRESHOLDS, chunksize=64), expected)
+
+
+@pytest.mark.parametrize("fmt", ["csv", "parquet", "feather"])
+def test_unknown_price_tier_is_reported_for_every_format(fmt):
+    raw = _raw(30, 11, "K-")
+    raw.loc[3, "Price Tier"] = "Luxury"
+    _, problems = ingest.parse_upload(_file(raw, fmt), kind="competitor")
+    unknown = problems[problems["Column"] == "Price Tier"]
+    assert list(unknown["Row"]) == [4] and set(unknown["Severity"]) == {"warning"}
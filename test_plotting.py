@@ -0,0 +1,50 @@
+"""Scatter labels: placed on the final layout, collision-free, and dropped when out of time."""
+import numpy as np
+import pytest
+
+import engine
+import plotting
+import synthetic
+import validation
+
+
+@pytest.fixture(scope="module")
+def plot_df():
+    market = synthetic.Market(17, classifications=3, brands=40)
+    company, _ = validation.validate(market.company(40), "company")
+    competitor, _ = validation.validate(market.competitor(800), "competitor")
+    return engine.combine(company, competitor)
+
+
+def _label_boxes(fig):
+    renderer = fig.canvas.get_renderer()
+    return [text.get_window_extent(renderer) for text in fig.axes[0].texts]
+
+
+def test_grid_labels_do_not_overlap_once_rendered(plot_df):
+    # A budget too small for adjustText, large enough for every grid label
+    fig = plotting.scatter_figure(plot_df, label_mode="all", budget_ms=60_000)
+    before = fig.axes[0].transData.frozen()
+    plotting.render_png(fig)
+    np.testing.assert_allclose(fig.axes[0].transData.get_matrix(), before.get_matrix())
+
+    boxes = _label_boxes(fig)
+    assert len(boxes) > 20
+    # place_labels reserves whole grid cells, so boxes may share an edge cell at most
+    overlaps = [(a, b) for i, a in enumerate(boxes) for b in boxes[i + 1:]
+                if min(a.x1, b.x1) - max(a.x0, b.x0) > 2 and min(a.y1, b.y1) - max(a.y0, b.y0) > 2]
+    assert not overlaps
+
+
+def test_most_important_labels_come_first(plot_df):
+    fig = plotting.scatter_figure(plot_df, label_mode="all", budget_ms=60_000)
+    labelled = [text.get_text() for text in fig.axes[0].texts]
+    order = plotting.pick_labels(plot_df, "all")
+    rank = {sku: i for i, sku in enumerate(plot_df["SKU"].astype(str).to_numpy()[order])}
+    assert [rank[sku] for sku in labelled] == sorted(rank[sku] for sku in labelled)
+
+
+def test_no_labels_once_out_of_time(plot_df):
+    fig = plotting.scatter_figure(plot_df, label_mode="all", budget_ms=1)
+    assert not fig.axes[0].texts
+    assert plotting.render_png(fig).startswith(b"\x89PNG")
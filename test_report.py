@@ -0,0 +1,65 @@
+"""The Excel export read back with openpyxl: every section, as numbers, in order."""
+import io
+
+import numpy as np
+import pytest
+
+import engine
+import report
+import synthetic
+import validation
+
+
+openpyxl = pytest.importorskip("openpyxl")
+
+
+@pytest.fixture(scope="module")
+def results():
+    market = synthetic.Market(13, classifications=3, brands=15)
+    company, _ = validation.validate(market.company(60), "company")
+    competitor, _ = validation.validate(market.competitor(600), "competitor")
+    return engine.compute_ppa(company, competitor, engine.default_thresholds(.13, .17, .3))
+
+
+def _rows(workbook, sheet):
+    return list(workbook[sheet].iter_rows(values_only=True))
+
+
+@pytest.mark.parametrize("chunk_rows", [report.WRITE_CHUNK_ROWS, 7])
+def test_every_section_round_trips(results, monkeypatch, chunk_rows):
+    monkeypatch.setattr(report, "WRITE_CHUNK_ROWS", chunk_rows)
+    workbook = openpyxl.load_workbook(io.BytesIO(report.workbook_bytes(results, "$")))
+    assert workbook.sheetnames == [sheet for sheet, _, _ in report.SECTIONS]
+
+    for sheet, key, kinds in report.SECTIONS:
+        frame = report._section_frame(results, key)
+        rows = _rows(workbook, sheet)
+        assert list(rows[0]) == list(frame.columns), sheet
+        assert len(rows) == len(frame) + 1, sheet
+        for i, column in enumerate(frame.columns):
+            cells = [row[i] for row in rows[1:]]
+            values = frame[column]
+            if values.dtype.kind in "biuf":
+                expected = values.to_numpy(dtype="float64") / (100 if kinds.get(column) == "percent" else 1)
+                got = np.array([np.nan if cell is None else cell for cell in cells], dtype="float64")
+                np.testing.assert_allclose(got, expected, rtol=1e-12, err_msg=f"{sheet}: {column}")
+            else:
+                assert cells == [None if v is None else str(v) for v in values.astype(object)], f"{sheet}: {column}"
+
+
+def test_number_formats_follow_the_currency(results):
+    workbook = openpyxl.load_workbook(io.BytesIO(report.workbook_bytes(results, "€")))
+    growth = workbook["SKU Growth"]
+    header = [cell.value for cell in growth[1]]
+    assert growth.cell(2, header.index("Present Net Sales") + 1).number_format == '"€"#,##0'
+    assert growth.cell(2, header.index("Net Sales Growth %") + 1).number_format == "0.0%"
+    brands = workbook["Brand BPS"]
+    assert brands.cell(2, 4).number_format == '0 "BPS"'
+
+
+def test_sku_matrix_sheet_lists_every_sku(results):
+    table = report.sku_matrix_table(results["sku_matrix"])
+    listed = sorted(table["SKU"])
+    company = results["full_df"][~results["full_df"]["Is Competitor"]]
+    in_named_tiers = company[company["Calculated Price Tier"] != engine.OVERFLOW_TIER]
+    assert listed == sorted(in_named_tiers["SKU"].astype(str))
@@ -0,0 +1,92 @@
+"""Price scenarios against re-running the analysis on the repriced files."""
+import numpy as np
+import pandas as pd
+import pytest
+
+import engine
+import scenario
+import synthetic
+import tier_index
+import validation
+
+
+THRESHOLDS = engine.default_thresholds(.13, .17, .3)
+
+
+@pytest.fixture(scope="module")
+def frames():
+    market = synthetic.Market(11, classifications=3, brands=20)
+    company, _ = validation.validate(market.company(100), "company")
+    competitor, _ = validation.validate(market.competitor(1000), "competitor")
+    return company, competitor
+
+
+@pytest.fixture(scope="module")
+def base(frames):
+    # As the page builds it: the shared index answers the segments for the thresholds
+    combined = engine.combine(*frames)
+    index = tier_index.PPWIndex(combined)
+    context = engine.summary_context(engine.classify(combined, THRESHOLDS), index.segments(THRESHOLDS),
+                                     THRESHOLDS, sketch=index.sketch)
+    return scenario.ScenarioBase(context, THRESHOLDS)
+
+
+def _repriced(frame, changes):
+    price = frame["SKU"].map(changes).astype("float64").fillna(frame["Price"])
+    return frame.assign(Price=price, **{"Price per Wash": price / frame["Number of Washes"]})
+
+
+def _plain(table):
+    if isinstance(table, pd.DataFrame):
+        return table.astype({col: str for col in table.columns if isinstance(table[col].dtype, pd.CategoricalDtype)})
+    return table
+
+
+def _assert_same_tables(actual, expected):
+    for name in engine.SUMMARY_TABLES:
+        if name == "sku_matrix":
+            assert actual.table(name) == expected[name]
+        else:
+            pd.testing.assert_frame_equal(_plain(actual.table(name)), _plain(expected[name]),
+                                          check_exact=False, rtol=1e-9, check_dtype=False, obj=name)
+
+
+def _changes(frames, rng, ours, theirs):
+    company, competitor = frames
+    picked = list(company["SKU"].sample(ours, random_state=rng)) + list(competitor["SKU"].sample(theirs, random_state=rng))
+    prices = pd.concat([company, competitor]).set_index("SKU")["Price"]
+    # Halving or doubling moves most of them across a tier boundary
+    return {sku: float(prices[sku] * rng.choice([.5, 2.])) for sku in picked}
+
+
+@pytest.mark.parametrize("seed, ours, theirs", [(0, 3, 0), (1, 0, 12), (2, 5, 40)])
+def test_scenario_matches_recompute(frames, base, seed, ours, theirs):
+    changes = _changes(frames, np.random.RandomState(seed), ours, theirs)
+    evaluated = base.evaluate(changes)
+    assert (evaluated.placement["Old Tier"] != evaluated.placement["New Tier"]).any()
+    expected = engine.compute_ppa(*(_repriced(frame, changes) for frame in frames), THRESHOLDS)
+    _assert_same_tables(evaluated, expected)
+
+
+def test_no_changes_is_the_base(frames, base):
+    _assert_same_tables(base.evaluate({}), engine.compute_ppa(*frames, THRESHOLDS))
+
+
+def test_api_changes_and_side_by_side(frames, base):
+    company, _ = frames
+    sku = company["SKU"].iloc[0]
+    evaluated = base.evaluate({sku: float(company["Price"].iloc[0] * 2)})
+    changes = evaluated.api_changes()
+    assert list(changes["SKU"]) == [sku]
+    assert changes["New PPW"].iloc[0] == pytest.approx(2 * changes["Old PPW"].iloc[0])
+    table = scenario.side_by_side(base, {"Double": evaluated})
+    assert list(table["Scenario"].unique()) == ["Base", "Double"]
+    assert len(table) == 2 * len(base.table("tier_summary"))
+
+
+def test_bad_changes_are_rejected(frames, base):
+    company, _ = frames
+    with pytest.raises(KeyError, match="Unknown SKU"):
+        base.evaluate({"NO-SUCH-SKU": 1.0})
+    with pytest.raises(ValueError, match="greater than zero"):
+        base.evaluate({company["SKU"].iloc[0]: 0})
@@ -0,0 +1,14 @@
+"""The Streamlit page keeps its heavy imports lazy (timings: python startup_budget.py)."""
+import startup_budget
+
+
+def test_eager_modules_follow_app_imports():
+    eager = startup_budget.EAGER_MODULES
+    assert {"pandas", "numpy", "engine", "tier_index"} <= set(eager)
+    assert not any(name.split(".")[0] == "streamlit" for name in eager)
+    assert not set(eager) & set(startup_budget.LAZY_MODULES)
+
+
+def test_heavy_modules_stay_lazy():
+    result = startup_budget.measure()
+    assert startup_budget.violations(result, timings=False) == [], result
@@ -0,0 +1,87 @@
+"""Batch threshold scoring against classifying the rows once per candidate."""
+import itertools
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import engine
+import synthetic
+import threshold_sweep
+import tier_index
+import validation
+
+
+@pytest.fixture(scope="module")
+def combined():
+    market = synthetic.Market(7, classifications=3, brands=20)
+    company, _ = validation.validate(market.company(120), "company")
+    competitor, _ = validation.validate(market.competitor(1200), "competitor")
+    return engine.combine(company, competitor)
+
+
+@pytest.mark.parametrize("axes", [
+    ([.1, .2, .3], [.15, .2, .25, .4], [.2, .3, .5]),
+    ([.3, .1, .1], [.05, .3]),
+    ([.1, .2, .3],),
+    ([.5], [.1], [.9]),
+])
+def test_candidate_grid_is_every_increasing_combination(axes):
+    expected = [combo for combo in itertools.product(*(sorted(set(axis)) for axis in axes))
+                if all(a < b for a, b in zip(combo, combo[1:]))]
+    grid = threshold_sweep.candidate_grid(*axes)
+    assert grid.shape == (len(expected), len(axes))
+    assert grid.tolist() == [list(combo) for combo in expected]
+
+
+def test_candidate_grid_refuses_oversized_grids():
+    axis = np.linspace(0, 1, 60)
+    with pytest.raises(ValueError, match="too many"):
+        threshold_sweep.candidate_grid(axis, axis, axis, max_candidates=1000)
+
+
+def test_sweep_matches_classifying_each_candidate(combined):
+    index = tier_index.PPWIndex(combined)
+    cuts = threshold_sweep.candidate_grid([.08, .11, .14], [.12, .16, .2], [.18, .3, .6])
+    results = threshold_sweep.sweep(index, cuts)
+    assert len(results) == len(cuts)
+
+    total_present = combined["Present Net Sales"].sum()
+    for (_, row), (value, mainstream, premium) in zip(results.iterrows(), cuts):
+        full_df = engine.classify(combined, engine.default_thresholds(value, mainstream, premium))
+        by_tier = full_df.groupby("Calculated Price Tier", observed=True)
+        present = by_tier["Present Net Sales"].sum()
+        counts = by_tier.size()
+        ours = full_df[~full_df["Is Competitor"]].groupby("Calculated Price Tier", observed=True)
+        for name in threshold_sweep.TIER_NAMES + (engine.OVERFLOW_TIER,):
+            assert row[f"{name} Share %"] == pytest.approx(engine.pct_share(present.get(name, 0), total_present))
+            assert row[f"{name} SKUs"] == counts.get(name, 0)
+        for name in threshold_sweep.TIER_NAMES:
+            assert row[f"{name} Our SKUs"] == ours.size().get(name, 0)
+            our_present = ours["Present Net Sales"].sum().get(name, 0)
+            expected = our_present / present[name] * 100 if present.get(name, 0) else 0
+            assert row[f"{name} Our Share %"] == pytest.approx(expected)
+    assert results["Balance"].between(0, 1).all()
+
+
+def test_sweep_growth_is_the_live_tier_growth(combined):
+    index = tier_index.PPWIndex(combined)
+    cuts = threshold_sweep.candidate_grid([.08, .13], [.12, .17, .25], [.3, .6])
+    results = threshold_sweep.sweep(index, cuts)
+    for (_, row), (value, mainstream, premium) in zip(results.iterrows(), cuts):
+        live = index.tier_metrics(engine.default_thresholds(value, mainstream, premium))
+        for name in threshold_sweep.TIER_NAMES:
+            assert row[f"{name} Growth %"] == pytest.approx(live.loc[name, "Growth"])
+
+
+def test_pareto_front_keeps_exactly_the_undominated(combined):
+    index = tier_index.PPWIndex(combined)
+    cuts = threshold_sweep.candidate_grid(*[np.linspace(.05, .6, 12)] * 3)
+    results = threshold_sweep.sweep(index, cuts)
+    objectives = {"Balance": "max", "Others Share %": "min", "Premium Share %": "max"}
+    front = threshold_sweep.pareto_front(results, objectives, block=7)
+
+    scores = results[list(objectives)].to_numpy() * np.array([1, -1, 1])
+    dominated = [((scores >= s).all(axis=1) & (scores > s).any(axis=1)).any() for s in scores]
+    assert sorted(front.index) == list(results.index[~np.array(dominated)])
+    pd.testing.assert_frame_equal(front.loc[sorted(front.index)], results.loc[sorted(front.index)])
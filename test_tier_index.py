@@ -0,0 +1,56 @@
+"""PPWIndex answers (segments, tier metrics) against engine's grouped pass over the same rows."""
+import numpy as np
+import pandas as pd
+import pytest
+
+import engine
+import ppw_sketch
+import synthetic
+import tier_index
+import validation
+
+
+THRESHOLDS = [
+    engine.default_thresholds(),
+    engine.default_thresholds(.13, .17, .3),
+    engine.default_thresholds(.05, .5, .6),
+    # Cuts out of order: first match wins, as in engine.assign_tiers
+    {"Value": (0, .15), "Mainstream": (.15, .12), "Premium": (.12, .25)},
+    engine.thresholds_from_cuts({"Entry": .09, "Value": .12, "Core": .16, "Upper": .22, "Premium": .4}),
+]
+
+
+@pytest.fixture(scope="module")
+def combined():
+    market = synthetic.Market(5, classifications=3, brands=25)
+    company, _ = validation.validate(market.company(150), "company")
+    competitor, _ = validation.validate(market.competitor(1500), "competitor")
+    # Rows the index keeps outside the sorted arrays: no PPW, or an infinite one
+    competitor.loc[:2, "Price per Wash"] = [np.nan, np.inf, np.nan]
+    competitor.loc[3, "Parent Brand"] = None
+    return engine.combine(company, competitor)
+
+
+def _ordered(table):
+    key = engine.SEGMENT_KEYS
+    table = table.astype({col: str for col in key}).astype({"PPW Count": "int64", "SKU Count": "int64"})
+    return table.sort_values(key).reset_index(drop=True)
+
+
+@pytest.mark.parametrize("thresholds", THRESHOLDS)
+def test_segments_match_segment_table(combined, thresholds):
+    index = tier_index.PPWIndex(combined)
+    expected = engine.segment_table(engine.classify(combined, thresholds))
+    pd.testing.assert_frame_equal(_ordered(index.segments(thresholds)), _ordered(expected),
+                                  check_exact=False, rtol=1e-9, check_dtype=False)
+
+
+@pytest.mark.parametrize("thresholds", THRESHOLDS)
+def test_tier_metrics_match_engine(combined, thresholds):
+    index = tier_index.PPWIndex(combined)
+    full_df = engine.classify(combined, thresholds)
+    segments = engine.segment_table(full_df)
+    tiers = list(reversed(engine.tier_ladder(thresholds)[0]))
+    quantiles = engine.ppw_quantiles(ppw_sketch.build(full_df), thresholds, ["Calculated Price Tier"])
+    expected = engine.tier_metrics(segments, tiers, float(segments["Present Net Sales"].sum()), quantiles)
+    pd.testing.assert_frame_equal(index.tier_metrics(thresholds), expected, check_exact=False, rtol=1e-9)
@@ -0,0 +1,109 @@
+"""Per-cell problem reports and typed frames from validation.validate / validate_delta."""
+import numpy as np
+import pandas as pd
+import pytest
+
+import validation
+
+
+def _raw(n=5):
+    return pd.DataFrame({
+        "SKU": [f"S{i}" for i in range(n)],
+        "Pack Size": "1kg",
+        "Price": [str(10 + i) for i in range(n)],
+        "Number of Washes": 20,
+        "Classification": "Powder",
+        "Price Tier": "Value",
+        "Parent Brand": "Ours",
+        "Previous Volume": 5.0,
+        "Present Volume": 6.0,
+        "Previous Net Sales": 100.0,
+        "Present Net Sales": 120.0,
+    })
+
+
+def _found(problems):
+    return set(zip(problems["Row"], problems["Column"], problems["Problem"], problems["Severity"]))
+
+
+def test_clean_file_is_typed():
+    frame, problems = validation.validate(_raw(), "company")
+    assert problems.empty
+    assert frame["Price"].dtype == "float64"
+    np.testing.assert_allclose(frame["Price per Wash"], (10 + np.arange(5)) / 20)
+    # Optional template columns are added, so both files share one schema
+    assert frame["Shelf Row"].isna().all()
+
+
+def test_each_bad_cell_is_one_problem_row():
+    raw = _raw(7).astype({"Number of Washes": object, "Present Net Sales": object})
+    raw.loc[0, "Price"] = "abc"
+    raw.loc[1, "Number of Washes"] = 0
+    raw.loc[2, "Present Net Sales"] = -5
+    raw.loc[3, "Classification"] = " "
+    raw.loc[4, "Parent Brand"] = None
+    raw.loc[5, "Price Tier"] = "Luxury"
+    raw.loc[6, "SKU"] = "S0"
+    frame, problems = validation.validate(raw, "company")
+    assert list(problems.columns) == validation.REPORT_COLS
+    assert _found(problems) == {
+        (1, "Price", "not a number", "error"),
+        (1, "SKU", "duplicate SKU", "error"),
+        (2, "Number of Washes", "must be greater than zero", "error"),
+        (3, "Present Net Sales", "negative value", "warning"),
+        (4, "Classification", "missing value", "error"),
+        (5, "Parent Brand", "missing value", "warning"),
+        (6, "Price Tier", "unknown tier (expected one of Value, Mainstream, Premium)", "warning"),
+        (7, "SKU", "duplicate SKU", "error"),
+    }
+    assert np.isnan(frame.loc[0, "Price"])
+    assert len(validation.errors(problems)) == 5
+
+
+def test_required_columns_depend_on_the_file():
+    raw = _raw().drop(columns=["Previous Volume", "Present Volume"])
+    _, problems = validation.validate(raw, "competitor")
+    assert problems.empty
+    _, problems = validation.validate(raw, "company")
+    assert problems["Row"].isna().all()
+    assert set(problems["Column"]) == {"Previous Volume", "Present Volume"}
+    assert set(problems["Problem"]) == {"required column is missing"}
+
+
+def test_check_raises_with_the_report():
+    raw = _raw()
+    raw.loc[2, "Price"] = "-"
+    with pytest.raises(validation.ValidationError, match="row 3 Price") as error:
+        validation.check(raw, "company", label="company.csv")
+    assert str(error.value).startswith("company.csv has 1 problem(s)")
+    assert len(error.value.problems) == 1
+
+
+def test_delta_splits_upserts_and_deletes():
+    raw = _raw(4).assign(Action=["insert", "delete", None, " UPDATE "])
+    raw.loc[1, ["Price", "Number of Washes"]] = [None, None]  # a delete only needs its SKU
+    upserts, deletes, problems = validation.validate_delta(raw, "company")
+    assert problems.empty
+    assert list(upserts.index) == [0, 2, 3]
+    assert list(upserts["Action"]) == ["insert", "upsert", "update"]
+    assert list(deletes["SKU"]) == ["S1"] and list(deletes.index) == [1]
+
+
+def test_delta_problems_refer_to_delta_rows():
+    raw = _raw(5).assign(Action=["insert", "delete", "rename", "update", "delete"])
+    raw.loc[3, "Price"] = "x"
+    raw.loc[4, "SKU"] = "S0"
+    _, _, problems = validation.validate_delta(raw, "company")
+    assert _found(problems) == {
+        (1, "SKU", "duplicate SKU", "error"),
+        (3, "Action", "unknown action (expected one of upsert, insert, update, delete)", "error"),
+        (4, "Price", "not a number", "error"),
+        (5, "SKU", "duplicate SKU", "error"),
+    }
+
+
+def test_deletes_only_delta_needs_only_sku():
+    upserts, deletes, problems = validation.validate_delta(
+        pd.DataFrame({"SKU": ["S1", "S2"], "Action": "delete"}), "competitor")
+    assert problems.empty and upserts.empty
+    assert list(deletes["SKU"]) == ["S1", "S2"]
@@ -0,0 +1,158 @@
+"""Batch evaluation and Pareto selection of price tier cut points.
+
+Every candidate threshold set is scored at once: the pooled, sorted PPW
+arrays from tier_index are binary-searched with the whole (candidates ×
+tiers) cut matrix, so a dense grid costs a few vectorized numpy calls
+rather than one rerun per candidate.
+"""
+import numpy as np
+import pandas as pd
+
+import engine
+from tier_index import SUM_COLS
+
+
+TIER_NAMES = ('Value', 'Mainstream', 'Premium')
+
+# Objectives offered in the app, with the direction that counts as better
+OBJECTIVES = {
+    "Balance": "max",
+    "Others Share %": "min",
+    "Premium Share %": "max",
+    "Premium Growth %": "max",
+    "Mainstream Growth %": "max",
+    "Value Growth %": "max",
+}
+
+PREV_SALES = SUM_COLS.index("Previous Net Sales")
+PRES_SALES = SUM_COLS.index("Present Net Sales")
+
+
+def candidate_grid(*axes, max_candidates=250_000):
+    """All strictly increasing combinations of one value per axis, shape (K, tiers),
+    in lexicographic order; refuses grids of more than ``max_candidates``.
+
+    Built axis by axis with index arithmetic: each partial row is repeated
+    once per larger value of the next axis, so only valid rows are ever
+    materialized. They are counted first (completions per value, as suffix
+    sums), so an oversized grid fails before anything is allocated.
+    """
+    axes = [np.unique(np.asarray(axis, dtype="float64")) for axis in axes]
+    if not axes:
+        return np.empty((0, 0))
+    ways = np.ones(len(axes[-1]), dtype=np.int64)
+    for axis, following in zip(axes[-2::-1], axes[:0:-1]):
+        suffix = np.concatenate([np.cumsum(ways[::-1])[::-1], [0]])
+        ways = suffix[np.searchsorted(following, axis, side="right")]
+    if ways.sum() > max_candidates:
+        raise ValueError(
+            f"{ways.sum():,} threshold candidates are too many to score at once (limit {max_candidates:,}); "
+            "use a larger step or a narrower range"
+        )
+
+    grid = axes[0][:, None]
+    for axis in axes[1:]:
+        start = np.searchsorted(axis, grid[:, -1], side="right")
+        counts = len(axis) - start
+        rows = np.repeat(np.arange(len(grid)), counts)
+        # Position of each new row within its parent's run, offset to the first larger value
+        offsets = np.arange(len(rows)) - np.repeat(np.cumsum(counts) - counts, counts)
+        grid = np.column_stack([grid[rows], axis[start[rows] + offsets]])
+    return grid
+
+
+def _tier_totals(pool, bounds):
+    """(K, tiers + 1, SUM_COLS) sums and (K, tiers + 1) counts; last slot is the overflow tier."""
+    ppw = pool["ppw"]
+    k = bounds.shape[0]
+    edges = np.concatenate([
+        np.zeros((k, 1), dtype=np.int64),
+        np.searchsorted(ppw, bounds, side="right"),
+        np.full((k, 1), len(ppw), dtype=np.int64),
+    ], axis=1)
+    at_edges = pool["prefix"][edges]
+    sums = np.diff(at_edges, axis=1)
+    counts = np.diff(edges, axis=1)
+    sums[:, -1] += pool["rest_sums"]
+    counts[:, -1] += pool["rest_rows"]
+    return sums, counts
+
+
+def sweep(index, cuts, tier_names=TIER_NAMES):
+    """Score every row of ``cuts`` (K candidates × one upper cut per tier).
+
+    For each tier reports value share of the whole market, sales growth as
+    the page's tier metrics define it (the tier's present sales over our
+    previous sales in it), SKU counts (all and ours) and our value share
+    within the tier, plus the share landing above the last cut and a 0-1
+    balance score (normalized entropy of SKU counts over the named tiers;
+    1 means evenly spread).
+    """
+    cuts = np.atleast_2d(np.asarray(cuts, dtype="float64"))
+    tier_names = list(tier_names)
+    if cuts.shape[1] != len(tier_names):
+        raise ValueError("Need one cut per tier for every candidate")
+    # Same first-match-wins semantics as engine.assign_tiers
+    bounds = np.maximum.accumulate(cuts, axis=1)
+
+    all_sums, all_counts = _tier_totals(index.pooled(), bounds)
+    our_sums, our_counts = _tier_totals(index.pooled(is_competitor=False), bounds)
+    total_present = all_sums[0, :, PRES_SALES].sum()
+
+    present = all_sums[:, :, PRES_SALES]
+    our_previous = our_sums[:, :, PREV_SALES]
+    our_present = our_sums[:, :, PRES_SALES]
+
+    columns = {f"{name} Max": cuts[:, i] for i, name in enumerate(tier_names)}
+    for i, name in enumerate(tier_names):
+        columns[f"{name} Share %"] = engine.pct_share(present[:, i], total_present)
+        columns[f"{name} Growth %"] = engine.pct_change(present[:, i], our_previous[:, i])
+        columns[f"{name} SKUs"] = all_counts[:, i]
+        columns[f"{name} Our SKUs"] = our_counts[:, i]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            columns[f"{name} Our Share %"] = np.where(present[:, i] != 0, our_present[:, i] / present[:, i] * 100, 0.0)
+    columns[f"{engine.OVERFLOW_TIER} Share %"] = engine.pct_share(present[:, -1], total_present)
+    columns[f"{engine.OVERFLOW_TIER} SKUs"] = all_counts[:, -1]
+
+    named = all_counts[:, :-1].astype("float64")
+    with np.errstate(divide="ignore", invalid="ignore"):
+        p = named / named.sum(axis=1, keepdims=True)
+        entropy = -np.nansum(np.where(p > 0, p * np.log(p), 0.0), axis=1)
+    columns["Balance"] = entropy / np.log(len(tier_names)) if len(tier_names) > 1 else np.ones(len(cuts))
+    return pd.DataFrame(columns)
+
+
+def _dominated(points, by):
+    """Rows of ``points`` that some row of ``by`` is no worse than everywhere and better somewhere."""
+    if not len(by):
+        return np.zeros(len(points), dtype=bool)
+    no_worse = (by[None, :, :] >= points[:, None, :]).all(axis=2)
+    better = (by[None, :, :] > points[:, None, :]).any(axis=2)
+    return (no_worse & better).any(axis=1)
+
+
+def pareto_front(results: pd.DataFrame, objectives, block=1024) -> pd.DataFrame:
+    """Candidates not dominated on ``objectives`` ({column: 'max' | 'min'}).
+
+    Candidates are visited best-first in lexicographic order, so a candidate
+    can only be dominated by one visited before it; each block is checked
+    against the front found so far and then against itself.
+    """
+    if not objectives:
+        return results
+    signs = np.array([1.0 if direction == "max" else -1.0 for direction in objectives.values()])
+    scores = results[list(objectives)].to_numpy(dtype="float64") * signs
+    scores = np.where(np.isnan(scores), -np.inf, scores)
+
+    order = np.lexsort(-scores.T[::-1])
+    front = np.empty((0, scores.shape[1]))
+    keep = []
+    for start in range(0, len(order), block):
+        rows = order[start:start + block]
+        rows = rows[~_dominated(scores[rows], front)]
+        rows = rows[~_dominated(scores[rows], scores[rows])]
+        front = np.vstack([front, scores[rows]])
+        keep.extend(rows)
+    return results.iloc[np.sort(np.asarray(keep, dtype=np.int64))].sort_values(
+        list(objectives), ascending=[d != "max" for d in objectives.values()]
+    )
@@ -0,0 +1,370 @@
+"""Prefix-sum index over Price per Wash for instant threshold re-evaluation.
+
+SKUs are sorted by PPW once per dataset within each (Classification,
+Is Competitor, Parent Brand) group, with running totals of sales, volume
+and PPW. Any threshold set then maps to tier aggregates with one binary
+search per cut point per group instead of re-tiering every row.
+A ppw_sketch sketch built alongside gives PPW quantiles the same way.
+
+Edits (see delta.py) never rewrite the sorted arrays. ``patched`` returns
+an index that shares them and records the edit in two small layers: the
+sorted positions taken out and a sorted run of the entries put in. Tier
+aggregates are the shared arrays' minus the first layer's plus the
+second's, so an edit costs time in proportion to the rows it touches.
+"""
+import numpy as np
+import pandas as pd
+
+import engine
+import ppw_sketch
+
+
+INDEX_GROUP_KEYS = ["Classification", "Is Competitor", "Parent Brand"]
+SUM_COLS = ["Previous Net Sales", "Present Net Sales", "Previous Volume", "Present Volume"]
+
+# Layers holding more than this share of the sorted entries are merged back into them
+COMPACT_FRACTION = 0.25
+
+
+def _prefix(values):
+    return np.concatenate([np.zeros((1,) + values.shape[1:]), np.cumsum(values, axis=0)])
+
+
+def _composite(gid, ppw):
+    """(group, PPW) as one complex key: numpy orders complex numbers by real, then imaginary part."""
+    key = np.empty(np.broadcast(gid, ppw).shape, dtype=complex)
+    key.real, key.imag = gid, ppw  # not gid + 1j * ppw: 1j * inf is nan + inf j
+    return key
+
+
+def _group_key(values):
+    # NaN keys (a blank brand) must compare equal inside dict lookups
+    return tuple(None if isinstance(v, float) and np.isnan(v) else v for v in values)
+
+
+def _per_group(values, gid, n_groups):
+    """Per-group totals of a 1-D array (bincount keeps NaN / inf semantics of a sum)."""
+    return np.bincount(gid, weights=values, minlength=n_groups) if len(gid) else np.zeros(n_groups)
+
+
+def _entries(frame):
+    """(PPW, SUM_COLS with NaN as 0) of index rows."""
+    sums = frame[SUM_COLS].to_numpy(dtype="float64")
+    return frame["Price per Wash"].to_numpy(dtype="float64"), np.where(np.isnan(sums), 0.0, sums)
+
+
+class _Sorted:
+    """Entries sorted by (group, PPW) with running totals; each group is one contiguous slice."""
+
+    def __init__(self, gid, ppw, sums):
+        order = np.lexsort((ppw, gid))
+        self.gid = gid[order]
+        self.ppw = ppw[order]
+        self.key = _composite(self.gid, self.ppw)
+        self.ppw_prefix = _prefix(self.ppw)
+        self.prefix = _prefix(sums[order])
+        # An entry's sums read back from the running totals (a difference of two
+        # of them) are off by a few units in the last place of the totals at most
+        self.tolerance = 4 * np.finfo(float).eps * np.abs(self.prefix).max(axis=0)
+
+    @classmethod
+    def empty(cls):
+        return cls(np.empty(0, dtype=np.int64), np.empty(0), np.empty((0, len(SUM_COLS))))
+
+    def __len__(self):
+        return len(self.ppw)
+
+    def sums(self, positions=None):
+        """SUM_COLS of the entries at ``positions`` (all entries if None)."""
+        if positions is None:
+            return np.diff(self.prefix, axis=0)
+        return self.prefix[positions + 1] - self.prefix[positions]
+
+    def edges(self, bounds, n_groups):
+        """Positions per group and cut: columns i and i + 1 bound each group's entries in tier i.
+
+        Searching (g, bound) lands inside group g's own slice, so each cut
+        is one binary search per group.
+        """
+        groups = np.arange(n_groups)
+        return np.column_stack(
+            [np.searchsorted(self.gid, groups, side="left")]
+            + [np.searchsorted(self.key, _composite(groups, bound), side="right") for bound in bounds]
+            + [np.searchsorted(self.gid, groups, side="right")]
+        )
+
+    def matches(self, positions, sums):
+        """Whether the entries at ``positions`` hold ``sums`` (up to prefix-sum rounding)."""
+        return (np.abs(self.sums(positions) - sums) <= self.tolerance).all(axis=1)
+
+    def ties(self, gid, ppw):
+        """Positions of the entries equal to (gid, ppw)."""
+        key = _composite(gid, ppw)
+        return np.arange(np.searchsorted(self.key, key, side="left"), np.searchsorted(self.key, key, side="right"))
+
+
+def _matching(sorted_, candidates, sums):
+    """The one of ``candidates`` holding ``sums`` (the nearest, if rounding leaves several), or None."""
+    found = candidates[sorted_.matches(candidates, sums)] if len(candidates) else candidates
+    if not len(found):
+        return None
+    return int(found[np.argmin(np.abs(sorted_.sums(found) - sums).sum(axis=1))])
+
+
+class PPWIndex:
+    """PPW sorted within each group plus running totals, as flat arrays; see ``segments``.
+
+    Rows with finite PPW are sorted once by (group, PPW), so each group owns
+    one slice of one PPW array and one prefix-sum matrix. Storage is
+    proportional to rows, not to groups × tiers, and a threshold set costs
+    O(groups × log rows): each cut is one vectorized binary search over the
+    composite (group, PPW) key.
+    """
+
+    def __init__(self, full_df: pd.DataFrame):
+        """``full_df`` is a combined frame from engine.combine (tiers not needed)."""
+        grouped = full_df.groupby(INDEX_GROUP_KEYS, dropna=False, sort=False, observed=True)
+        gid = grouped.ngroup().to_numpy()
+        keys = grouped.size().index.to_frame(index=False)
+        self.keys = {col: keys[col].to_numpy(dtype=object) for col in INDEX_GROUP_KEYS}
+        self.is_competitor = keys["Is Competitor"].to_numpy(dtype=bool)
+
+        ppw, sums = _entries(full_df)
+        finite = np.isfinite(ppw)
+        self.sorted = _Sorted(gid[finite], ppw[finite], sums[finite])
+        self.added = _Sorted.empty()
+        self._take_out(np.empty(0, dtype=np.int64))
+        # NaN / ±inf PPW rows always land in the overflow tier
+        self._set_rest(gid[~finite], ppw[~finite], sums[~finite])
+        self.sketch = ppw_sketch.build(full_df)
+
+    def _take_out(self, removed):
+        """Mark sorted positions ``removed`` (ascending, unique) as no longer in the index."""
+        self.removed = removed
+        self.removed_prefix = _prefix(self.sorted.sums(removed))
+        self.removed_ppw_prefix = _prefix(self.sorted.ppw[removed])
+        # Each removed position's run of consecutive removed ones, to step over it
+        new_run = np.diff(removed, prepend=-2) != 1
+        run = np.cumsum(new_run) - 1
+        run_ends = np.append(np.flatnonzero(new_run)[1:], len(removed)) - 1 if len(removed) else removed
+        self.live_after = removed[run_ends][run] + 1
+        self.live_before = removed[new_run][run] - 1
+
+    def _live(self, at, after):
+        """Nearest sorted position at or after (else before) each of ``at`` that was not taken out."""
+        if not len(self.removed):
+            return at
+        i = np.minimum(np.searchsorted(self.removed, at), len(self.removed) - 1)
+        return np.where(self.removed[i] == at, (self.live_after if after else self.live_before)[i], at)
+
+    def _is_removed(self, positions):
+        if not len(self.removed):
+            return np.zeros(len(positions), dtype=bool)
+        return self.removed[np.minimum(np.searchsorted(self.removed, positions), len(self.removed) - 1)] == positions
+
+    def _set_rest(self, rest_gid, rest_ppw, rest_sums):
+        n_groups = len(self.is_competitor)
+        self.rest_gid, self.rest_ppw, self.rest_values = rest_gid, rest_ppw, rest_sums
+        with np.errstate(invalid="ignore"):  # inf + -inf PPW sums to NaN, as in groupby
+            self.rest_sums = np.column_stack([_per_group(rest_sums[:, j], rest_gid, n_groups)
+                                              for j in range(len(SUM_COLS))])
+            self.rest_rows = np.bincount(rest_gid, minlength=n_groups)
+            signed = ~np.isnan(rest_ppw)
+            self.rest_ppw_count = np.bincount(rest_gid[signed], minlength=n_groups)
+            self.rest_ppw_sum = _per_group(rest_ppw[signed], rest_gid[signed], n_groups)
+        self.rest_ppw_min = np.full(n_groups, np.nan)
+        self.rest_ppw_max = np.full(n_groups, np.nan)
+        np.fmin.at(self.rest_ppw_min, rest_gid[signed], rest_ppw[signed])
+        np.fmax.at(self.rest_ppw_max, rest_gid[signed], rest_ppw[signed])
+
+    def patched(self, removed, added):
+        """This index with the rows of ``removed`` taken out and those of ``added`` put in.
+
+        Both are frames with the INDEX_GROUP_KEYS, Price per Wash and SUM_COLS
+        columns, such as the old and new versions of corrected rows. The
+        sorted arrays are shared, not copied: the work is proportional to
+        the rows given, plus one re-sort of all entries whenever the layers
+        outgrow COMPACT_FRACTION of them. Raises KeyError if a removed row
+        is not in the index.
+        """
+        index = PPWIndex.__new__(PPWIndex)
+        index.sorted = self.sorted
+        codes = {_group_key(key): g for g, key in enumerate(zip(*(self.keys[col] for col in INDEX_GROUP_KEYS)))}
+        added_gid = np.empty(len(added), dtype=np.int64)
+        new_keys = []
+        for i, key in enumerate(zip(*(added[col].to_numpy(dtype=object) for col in INDEX_GROUP_KEYS))):
+            code = codes.setdefault(_group_key(key), len(codes))
+            if code == len(self.is_competitor) + len(new_keys):
+                new_keys.append(key)
+            added_gid[i] = code
+        index.keys = {col: np.concatenate([self.keys[col], np.array([key[j] for key in new_keys], dtype=object)])
+                      for j, col in enumerate(INDEX_GROUP_KEYS)}
+        index.is_competitor = np.concatenate([self.is_competitor, [bool(key[1]) for key in new_keys]]).astype(bool)
+
+        removed_gid = np.array([codes.get(_group_key(key), -1) for key in
+                                zip(*(removed[col].to_numpy(dtype=object) for col in INDEX_GROUP_KEYS))], dtype=np.int64)
+        if (removed_gid < 0).any():
+            raise KeyError("A removed row's group is not in the index")
+        taken, layer_keep, rest_keep = self._locate(removed_gid, *_entries(removed))
+
+        added_ppw, added_sums = _entries(added)
+        finite = np.isfinite(added_ppw)
+        index.added = _Sorted(np.concatenate([self.added.gid[layer_keep], added_gid[finite]]),
+                              np.concatenate([self.added.ppw[layer_keep], added_ppw[finite]]),
+                              np.concatenate([self.added.sums()[layer_keep], added_sums[finite]]))
+        index._take_out(np.union1d(self.removed, taken))
+        index._set_rest(np.concatenate([self.rest_gid[rest_keep], added_gid[~finite]]),
+                        np.concatenate([self.rest_ppw[rest_keep], added_ppw[~finite]]),
+                        np.concatenate([self.rest_values[rest_keep], added_sums[~finite]]))
+        if len(index.removed) + len(index.added) > COMPACT_FRACTION * len(index.sorted):
+            index._compact()
+
+        index.sketch = ppw_sketch.merge(self.sketch, ppw_sketch.negate(ppw_sketch.build(removed)),
+                                        ppw_sketch.build(added))
+        return index
+
+    def _locate(self, gid, ppw, sums):
+        """Where entries are: (sorted positions, keep mask of the added layer, keep mask of the rest rows).
+
+        Entries with equal group, PPW and sums are interchangeable, so any of
+        them will do; one with other sums never is. Raises KeyError for an
+        entry that is not in the index.
+        """
+        key = _composite(gid, ppw)
+        lo = np.searchsorted(self.sorted.key, key, side="left")
+        hi = np.searchsorted(self.sorted.key, key, side="right")
+        # Most entries are the only one with their group and PPW: take those in one pass,
+        # unless that one is not them (it holds other sums; theirs is in the added layer)
+        direct = np.isfinite(ppw) & (hi - lo == 1)
+        direct[direct] = ~self._is_removed(lo[direct]) & self.sorted.matches(lo[direct], sums[direct])
+        unique, counts = np.unique(lo[direct], return_counts=True)
+        direct[direct] = np.isin(lo[direct], unique[counts == 1])
+        taken = set(lo[direct].tolist())
+
+        layer_keep = np.ones(len(self.added), dtype=bool)
+        rest_keep = np.ones(len(self.rest_gid), dtype=bool)
+        for i in np.flatnonzero(~direct):
+            if np.isfinite(ppw[i]):
+                ties = np.arange(lo[i], hi[i])
+                candidates = np.array([t for t in ties[~self._is_removed(ties)].tolist() if t not in taken],
+                                      dtype=np.int64)
+                at = _matching(self.sorted, candidates, sums[i])
+                if at is not None:
+                    taken.add(at)
+                    continue
+                ties = self.added.ties(gid[i], ppw[i])
+                at = _matching(self.added, ties[layer_keep[ties]], sums[i])
+                if at is not None:
+                    layer_keep[at] = False
+                    continue
+            else:
+                same = (self.rest_gid == gid[i]) & ((self.rest_ppw == ppw[i])
+                                                    | (np.isnan(self.rest_ppw) & np.isnan(ppw[i])))
+                candidates = np.flatnonzero(same & rest_keep & (self.rest_values == sums[i]).all(axis=1))
+                if len(candidates):
+                    rest_keep[candidates[0]] = False
+                    continue
+            raise KeyError(f"No index entry for group {self.keys['Parent Brand'][gid[i]]!r} at PPW {ppw[i]}")
+        return np.array(sorted(taken), dtype=np.int64), layer_keep, rest_keep
+
+    def _compact(self):
+        """Merge both layers into freshly sorted arrays."""
+        live = np.ones(len(self.sorted), dtype=bool)
+        live[self.removed] = False
+        self.sorted = _Sorted(np.concatenate([self.sorted.gid[live], self.added.gid]),
+                              np.concatenate([self.sorted.ppw[live], self.added.ppw]),
+                              np.concatenate([self.sorted.sums()[live], self.added.sums()]))
+        self.added = _Sorted.empty()
+        self._take_out(np.empty(0, dtype=np.int64))
+
+    def pooled(self, is_competitor=None):
+        """One sorted PPW array with prefix sums across all classifications and brands.
+
+        ``is_competitor`` picks ours (False), competitors (True) or both (None).
+        """
+        groups = (np.ones(len(self.is_competitor), dtype=bool) if is_competitor is None
+                  else self.is_competitor == is_competitor)
+        rows = groups[self.sorted.gid]
+        rows[self.removed] = False
+        layer = groups[self.added.gid]
+        ppw = np.concatenate([self.sorted.ppw[rows], self.added.ppw[layer]])
+        sums = np.concatenate([self.sorted.sums()[rows], self.added.sums()[layer]])
+        order = np.argsort(ppw, kind="stable")
+        return {
+            "ppw": ppw[order],
+            "prefix": _prefix(sums[order]),
+            "rest_sums": self.rest_sums[groups].sum(axis=0),
+            "rest_rows": int(self.rest_rows[groups].sum()),
+        }
+
+    @classmethod
+    def from_frames(cls, company_df, competitor_df):
+        return cls(engine.combine(company_df, competitor_df))
+
+    def segments(self, thresholds):
+        """Same table engine.segment_table would give for these thresholds."""
+        names, cuts = engine.tier_ladder(thresholds)
+        overflow = engine.OVERFLOW_TIER
+        categories = names + ([overflow] if overflow not in names else [])
+        bounds = np.maximum.accumulate(np.asarray(cuts, dtype="float64"))
+        n_groups = len(self.is_competitor)
+
+        # edges[:, i]:edges[:, i + 1] is each group's slice of sorted PPW in tier i
+        edges = self.sorted.edges(bounds, n_groups)
+        lo, hi = edges[:, :-1], edges[:, 1:]
+        count = hi - lo
+        sums = self.sorted.prefix[hi] - self.sorted.prefix[lo]
+        ppw_sum = self.sorted.ppw_prefix[hi] - self.sorted.ppw_prefix[lo]
+        if len(self.removed):
+            out_lo, out_hi = np.searchsorted(self.removed, lo), np.searchsorted(self.removed, hi)
+            count -= out_hi - out_lo
+            sums -= self.removed_prefix[out_hi] - self.removed_prefix[out_lo]
+            ppw_sum -= self.removed_ppw_prefix[out_hi] - self.removed_ppw_prefix[out_lo]
+        ppw = self.sorted.ppw
+        last = max(len(ppw) - 1, 0)
+        ppw_min = np.where(count > 0, ppw[np.clip(self._live(lo, True), 0, last)] if len(ppw) else np.nan, np.nan)
+        ppw_max = np.where(count > 0, ppw[np.clip(self._live(hi - 1, False), 0, last)] if len(ppw) else np.nan, np.nan)
+
+        if len(self.added):
+            edges = self.added.edges(bounds, n_groups)
+            lo, hi = edges[:, :-1], edges[:, 1:]
+            added = hi - lo
+            count += added
+            sums += self.added.prefix[hi] - self.added.prefix[lo]
+            ppw_sum += self.added.ppw_prefix[hi] - self.added.ppw_prefix[lo]
+            last = len(self.added) - 1
+            ppw_min = np.fmin(ppw_min, np.where(added > 0, self.added.ppw[np.minimum(lo, last)], np.nan))
+            ppw_max = np.fmax(ppw_max, np.where(added > 0, self.added.ppw[np.maximum(hi - 1, 0)], np.nan))
+        ppw_count = count.copy()
+
+        # The last column is the overflow tier, which also takes the rest rows
+        with np.errstate(invalid="ignore"):
+            sums[:, -1] += self.rest_sums
+            ppw_sum[:, -1] += self.rest_ppw_sum
+        count[:, -1] += self.rest_rows
+        ppw_count[:, -1] += self.rest_ppw_count
+        ppw_min[:, -1] = np.fmin(ppw_min[:, -1], self.rest_ppw_min)
+        ppw_max[:, -1] = np.fmax(ppw_max[:, -1], self.rest_ppw_max)
+
+        group, tier = np.nonzero(count)  # group-major, like iterating groups then tiers
+        tier_names = np.array(names + [overflow], dtype=object)
+        table = pd.DataFrame({
+            "Classification": self.keys["Classification"][group],
+            "Calculated Price Tier": pd.Categorical(tier_names[tier], categories=categories),
+            "Is Competitor": self.is_competitor[group],
+            "Parent Brand": self.keys["Parent Brand"][group],
+            **{col: sums[group, tier, j] for j, col in enumerate(SUM_COLS)},
+            "PPW Sum": ppw_sum[group, tier],
+            "PPW Count": ppw_count[group, tier],
+            "PPW Min": ppw_min[group, tier],
+            "PPW Max": ppw_max[group, tier],
+            "SKU Count": count[group, tier],
+        }, columns=engine.SEGMENT_KEYS + SUM_COLS + ["PPW Sum", "PPW Count", "PPW Min", "PPW Max", "SKU Count"])
+        return table
+
+    def tier_metrics(self, thresholds, tiers=None):
+        """Live tier metrics (growth, share, PPW range and quantiles) without touching any rows."""
+        segments = self.segments(thresholds)
+        tiers = list(tiers or reversed(engine.tier_ladder(thresholds)[0]))
+        quantiles = engine.ppw_quantiles(self.sketch, thresholds, ["Calculated Price Tier"])
+        return engine.tier_metrics(segments, tiers, float(segments["Present Net Sales"].sum()), quantiles)
@@ -0,0 +1,254 @@
+"""Schema checks and type coercion for uploaded company / competitor files.
+
+One vectorized pass per column: every numeric column is coerced exactly
+once and the coerced values are reused both for the checks and for the
+frame handed on to the engine. Problems come back as one row per bad cell
+(a per-row error report users can download and fix), instead of bad cells
+silently turning into NaN and failing deep inside a chart.
+
+Errors block the analysis; warnings (a blank brand or sales cell, negative
+sales, an unknown uploaded "Price Tier" label) are reported but the data
+is still usable.
+"""
+import numpy as np
+import pandas as pd
+
+import engine
+
+
+TEXT_COLS = ["SKU", "Classification", "Parent Brand"]
+REQUIRED_NUMERIC_COLS = {
+    "company": ["Price", "Number of Washes", "Previous Volume", "Present Volume",
+                "Previous Net Sales", "Present Net Sales"],
+    "competitor": ["Price", "Number of Washes", "Previous Net Sales", "Present Net Sales"],
+}
+# Template columns a file may leave out; they are added empty so every later
+# stage sees the same schema for both files
+OPTIONAL_TEXT_COLS = ["Pack Size", "Price Tier"]
+OPTIONAL_NUMERIC_COLS = ["Previous Volume", "Present Volume", "Shelf Row"]
+# Rows without these cannot be placed at all; other blanks only drop out of sums
+MUST_HAVE_VALUE_COLS = ["SKU", "Classification", "Price", "Number of Washes"]
+POSITIVE_COLS = ["Price", "Number of Washes"]
+NON_NEGATIVE_COLS = ["Previous Volume", "Present Volume", "Previous Net Sales", "Present Net Sales"]
+
+REPORT_COLS = ["Row", "SKU", "Column", "Value", "Problem", "Severity"]
+
+# Delta (corrections) files: template rows plus an optional Action column
+DELTA_ACTION_COL = "Action"
+DELTA_ACTIONS = ["upsert", "insert", "update", "delete"]
+
+
+class ValidationError(ValueError):
+    """A file failed validation; ``problems`` is the per-row report."""
+
+    def __init__(self, message, problems):
+        super().__init__(message)
+        self.problems = problems
+
+
+def required_columns(kind):
+    return TEXT_COLS + REQUIRED_NUMERIC_COLS[kind]
+
+
+def _blank(raw):
+    if raw.dtype.kind in "biuf":
+        return raw.isna().to_numpy()
+    return (raw.isna() | raw.astype(str).str.strip().eq("")).to_numpy()
+
+
+def _coerce(raw):
+    """(float64 values, cells that held something that is not a number)."""
+    if raw.dtype.kind in "biuf":
+        return raw.to_numpy(dtype="float64", na_value=np.nan), np.zeros(len(raw), dtype=bool)
+    values = pd.to_numeric(raw, errors="coerce").to_numpy(dtype="float64")
+    return values, np.isnan(values) & ~_blank(raw)
+
+
+def _text(raw):
+    # Numeric-looking SKUs or brands read as numbers; keep every key column text
+    if raw.dtype == object or isinstance(raw.dtype, (pd.CategoricalDtype, pd.StringDtype)):
+        return raw
+    return raw.astype(str).where(raw.notna(), None)
+
+
+class _Problems:
+
+    def __init__(self, df):
+        self.df = df
+        self.parts = []
+
+    def add(self, mask, column, problem, severity="error"):
+        rows = np.flatnonzero(mask)
+        if not len(rows):
+            return
+        values = self.df[column].iloc[rows] if column in self.df.columns else pd.Series([None] * len(rows))
+        skus = self.df["SKU"].iloc[rows] if "SKU" in self.df.columns else pd.Series([None] * len(rows))
+        self.parts.append(pd.DataFrame({
+            "Row": rows + 1,
+            "SKU": skus.astype(object).to_numpy(),
+            "Column": column,
+            "Value": values.astype(object).to_numpy(),
+            "Problem": problem,
+            "Severity": severity,
+        }))
+
+    def missing_columns(self, columns):
+        self.parts.append(pd.DataFrame({
+            "Row": [None] * len(columns), "SKU": None, "Column": columns,
+            "Value": None, "Problem": "required column is missing", "Severity": "error",
+        }))
+
+    def report(self):
+        if not self.parts:
+            return pd.DataFrame(columns=REPORT_COLS)
+        return pd.concat(self.parts, ignore_index=True).sort_values(["Row", "Column"], kind="stable",
+                                                                     na_position="first").reset_index(drop=True)
+
+
+def validate(df, kind="company", tier_names=None):
+    """Check and type one uploaded frame.
+
+    Returns ``(frame, problems)``. ``frame`` has float64 numeric columns,
+    text key columns, every optional template column and Price per Wash;
+    ``problems`` lists one row per bad cell (``Row`` is the 1-based data row,
+    header excluded). A missing required column stops the checks early.
+    """
+    if kind not in REQUIRED_NUMERIC_COLS:
+        raise ValueError(f"kind must be one of {sorted(REQUIRED_NUMERIC_COLS)}")
+    tier_names = list(tier_names or engine.tier_ladder(engine.default_thresholds())[0])
+    df = df.reset_index(drop=True)
+    problems = _Problems(df)
+
+    missing = [col for col in required_columns(kind) if col not in df.columns]
+    if missing:
+        problems.missing_columns(missing)
+        return df, problems.report()
+
+    out = {}
+    for col in df.columns:
+        raw = df[col]
+        if col in engine.NUMERIC_COLS:
+            values, not_number = _coerce(raw)
+            problems.add(not_number, col, "not a number")
+            if col in REQUIRED_NUMERIC_COLS[kind]:
+                problems.add(np.isnan(values) & ~not_number, col, "missing value",
+                             "error" if col in MUST_HAVE_VALUE_COLS else "warning")
+            problems.add(np.isinf(values), col, "not a finite number")
+            if col in POSITIVE_COLS:
+                problems.add(values <= 0, col, "must be greater than zero")
+            elif col in NON_NEGATIVE_COLS:
+                problems.add(values < 0, col, "negative value", "warning")
+            out[col] = values
+        elif col in TEXT_COLS:
+            problems.add(_blank(raw), col, "missing value", "error" if col in MUST_HAVE_VALUE_COLS else "warning")
+            out[col] = _text(raw)
+        else:
+            out[col] = raw
+
+    sku = out["SKU"]
+    problems.add((sku.duplicated(keep=False) & sku.notna()).to_numpy(), "SKU", "duplicate SKU")
+    if "Price Tier" in df.columns:
+        labels = df["Price Tier"]
+        unknown = ~_blank(labels) & ~labels.isin(tier_names).to_numpy()
+        problems.add(unknown, "Price Tier", f"unknown tier (expected one of {', '.join(tier_names)})",
+                     "warning")
+
+    for col in OPTIONAL_TEXT_COLS:
+        out.setdefault(col, pd.Series([None] * len(df), dtype=object))
+    for col in OPTIONAL_NUMERIC_COLS:
+        out.setdefault(col, np.full(len(df), np.nan))
+    frame = pd.DataFrame(out)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        frame["Price per Wash"] = frame["Price"] / frame["Number of Washes"]
+    return frame, problems.report()
+
+
+def validate_delta(df, kind="company", tier_names=None):
+    """Check and type one delta file: only the inserted, updated or deleted SKU rows.
+
+    The optional Action column holds insert, update, upsert (insert or
+    update; also used for a blank or missing Action) or delete. Rows that
+    are not deletes are checked exactly like validate(); a delete only needs
+    its SKU. Each SKU may appear once. Returns ``(upserts, deletes,
+    problems)``: ``upserts`` is validate()'s typed frame plus Action,
+    ``deletes`` holds the deleted SKUs, both indexed by 0-based delta row,
+    and problem Rows refer to the delta file.
+    """
+    df = df.reset_index(drop=True)
+    problems = _Problems(df)
+    if DELTA_ACTION_COL in df.columns:
+        raw = df[DELTA_ACTION_COL]
+        action = raw.astype(object).where(~_blank(raw), "upsert").astype(str).str.strip().str.lower()
+        problems.add(~action.isin(DELTA_ACTIONS).to_numpy(), DELTA_ACTION_COL,
+                     f"unknown action (expected one of {', '.join(DELTA_ACTIONS)})")
+    else:
+        action = pd.Series("upsert", index=df.index)
+    deleting = (action == "delete").to_numpy()
+    sku = _text(df["SKU"]) if "SKU" in df.columns else pd.Series([None] * len(df), dtype=object)
+    if "SKU" in df.columns:
+        problems.add(deleting & _blank(df["SKU"]), "SKU", "missing value")
+        # Duplicates among the non-delete rows are reported by validate() below
+        duplicated = (sku.duplicated(keep=False) & sku.notna()).to_numpy()
+        problems.add(duplicated & sku.isin(sku[deleting]).to_numpy(), "SKU", "duplicate SKU")
+
+    upsert_rows = np.flatnonzero(~deleting)
+    template = df.drop(columns=[DELTA_ACTION_COL], errors="ignore")
+    if len(upsert_rows):
+        upserts, upsert_problems = validate(template.iloc[upsert_rows], kind, tier_names)
+        upsert_problems["Row"] = [row if pd.isna(row) else int(upsert_rows[int(row) - 1]) + 1
+                                  for row in upsert_problems["Row"]]
+    else:
+        # A deletes-only file needs no template columns besides SKU
+        upserts, upsert_problems = template.iloc[:0], pd.DataFrame(columns=REPORT_COLS)
+    problems = pd.concat([upsert_problems, problems.report()], ignore_index=True)
+    problems = problems.sort_values(["Row", "Column"], kind="stable", na_position="first").reset_index(drop=True)
+
+    upserts = upserts.set_axis(upsert_rows)
+    upserts[DELTA_ACTION_COL] = action.to_numpy()[upsert_rows]
+    deletes = pd.DataFrame({"SKU": sku.to_numpy()[deleting]}, index=np.flatnonzero(deleting))
+    return upserts, deletes, problems
+
+
+def errors(problems):
+    return problems[problems["Severity"] == "error"]
+
+
+def summary(problems):
+    """One line per (file, column, problem) with a count, most frequent first."""
+    keys = [col for col in ["File", "Column", "Problem", "Severity"] if col in problems.columns]
+    if problems.empty:
+        return pd.DataFrame(columns=keys + ["Rows"])
+    return (problems.groupby(keys, sort=False).size()
+            .rename("Rows").sort_values(ascending=False, kind="stable").reset_index())
+
+
+def duplicate_report(frame, mask):
+    """Rows ``mask`` of a typed ``frame`` as duplicate SKUs, for checks that span several frames."""
+    problems = _Problems(frame)
+    problems.add(mask, "SKU", "duplicate SKU")
+    return problems.report()
+
+
+def raise_for_errors(problems, label):
+    """Raise ValidationError, carrying ``problems``, if the report holds any error."""
+    bad = errors(problems)
+    if len(bad):
+        raise ValidationError(f"{label} has {len(bad):,} problem(s), first: row {bad['Row'].iloc[0]} "
+                              f"{bad['Column'].iloc[0]}: {bad['Problem'].iloc[0]}", problems)
+
+
+def check(df, kind="company", tier_names=None, label=None):
+    """validate() for scripts: the typed frame, or ValidationError on any error."""
+    frame, problems = validate(df, kind, tier_names)
+    raise_for_errors(problems, label or f"{kind} file")
+    return frame
+
+
+def combine_reports(reports):
+    """{file label: problems} as one report with a leading File column."""
+    return pd.concat([problems.assign(File=label)[["File"] + REPORT_COLS] for label, problems in reports.items()],
+                     ignore_index=True)
+
+
+def report_csv(problems):
+    return problems.to_csv(index=False).encode()